@@ -0,0 +1,40 @@
+import json
+import os
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, Optional
+
+
+@dataclass
+class AnnoyConfig:
+    n_trees: int = 1000  # trees of the index, changes need a rebuild
+    search_k: int = -1  # nodes inspected per query, -1 is n_trees * k
+    k: int = 10  # nearest frames per query frame used by search algorithms
+    backend: str = "annoy"  # "annoy", "exact" (brute-force search) or "mih" (multi-index hashing), n_trees and search_k are used only by annoy
+    metric: str = "hamming"  # metric of bit hashes, "euclidean" compares byte values as before, RadialVariance is always euclidean
+
+    def to_json(self) -> dict:
+        return {"n_trees": self.n_trees, "search_k": self.search_k, "k": self.k, "backend": self.backend, "metric": self.metric}
+
+    @staticmethod
+    def load(path: str, backend: Optional[str] = None, hash_names: Iterable[str] = (), metric: Optional[str] = None) -> Dict[str, "AnnoyConfig"]:
+        """
+        Configs by hash name from json file (written by scripts/tune_annoy.py), hash functions without config use defaults.
+        backend and metric (command line) replace the ones of hash_names
+        """
+        configs = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                configs = {hash_name: AnnoyConfig(**config) for hash_name, config in json.load(f).items()}
+
+        if backend:
+            configs.update({hash_name: replace(configs.get(hash_name, AnnoyConfig()), backend=backend) for hash_name in hash_names})
+
+        if metric:
+            configs.update({hash_name: replace(configs.get(hash_name, AnnoyConfig()), metric=metric) for hash_name in hash_names})
+
+        return configs
+
+    @staticmethod
+    def save(configs: Dict[str, "AnnoyConfig"], path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({hash_name: config.to_json() for hash_name, config in configs.items()}, f, indent=4)
@@ -1,9 +1,12 @@
 from dataclasses import dataclass
+from typing import List
 
-import annoy
+import numpy as np
+from frame_indexes.abstract_search_index import AbstractSearchIndex
 
 
 @dataclass
 class AnnoyDB:
-    db_index: list[list]
-    annoy_index: annoy.AnnoyIndex
+    db_index: np.ndarray  # (items,) structured array of DB_INDEX_DTYPE, row i describes annoy item i
+    filenames: List[str]  # filename by db_index["filename_id"]
+    frame_index: AbstractSearchIndex
@@ -0,0 +1,51 @@
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class BufferBenchmarkResult:
+    filename: str
+    width: int
+    height: int
+    keyframes_count: int
+    fresh_time: float  # a new array per decoded frame
+    ring_time: float  # frames decoded into preallocated buffers
+    fresh_page_faults: int  # minor page faults, every new large array is mapped and touched again
+    ring_page_faults: int
+    fresh_peak_bytes: int  # peak of memory allocated during processing (tracemalloc), preallocated buffers of the ring are not counted
+    ring_peak_bytes: int
+    same_hashes: bool
+
+    @staticmethod
+    def to_csv_header() -> List[str]:
+        return [
+            "filename",
+            "width",
+            "height",
+            "keyframes_count",
+            "fresh_time",
+            "ring_time",
+            "speedup",
+            "fresh_page_faults",
+            "ring_page_faults",
+            "fresh_peak_bytes",
+            "ring_peak_bytes",
+            "same_hashes",
+        ]
+
+    def to_csv(self) -> list:
+        speedup = self.fresh_time / self.ring_time if self.ring_time else 0.0
+        return [
+            self.filename,
+            self.width,
+            self.height,
+            self.keyframes_count,
+            self.fresh_time,
+            self.ring_time,
+            speedup,
+            self.fresh_page_faults,
+            self.ring_page_faults,
+            self.fresh_peak_bytes,
+            self.ring_peak_bytes,
+            self.same_hashes,
+        ]
@@ -0,0 +1,17 @@
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class HashCacheStats:
+    hash_name: str
+    hits: int  # videos whose hashes were read from the cache
+    misses: int  # videos hashed in this run
+
+    @staticmethod
+    def to_csv_header() -> List[str]:
+        return ["hash_name", "hits", "misses", "hit_rate"]
+
+    def to_csv(self) -> list:
+        hit_rate = self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0
+        return [self.hash_name, self.hits, self.misses, hit_rate]
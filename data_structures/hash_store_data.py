@@ -0,0 +1,20 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+@dataclass
+class HashStoreData:
+    keys: List[str]  # names of videos (names of the former json files)
+    filenames: List[str]
+    offsets: np.ndarray  # (videos + 1,) int64, frames of i-th video are offsets[i]:offsets[i + 1]
+    timecodes: np.ndarray  # (frames,) float64
+    vecs: np.ndarray  # (frames, vector_size) uint8
+
+    def to_frames(self, i: int) -> List[Dict[str, Any]]:
+        """
+        Frames of i-th video in the same format as "frames" of the former json files
+        """
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return [{"vec": vec, "timecode": timecode} for vec, timecode in zip(self.vecs[start:end], self.timecodes[start:end].tolist())]
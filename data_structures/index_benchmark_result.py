@@ -0,0 +1,22 @@
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class IndexBenchmarkResult:
+    hash_name: str
+    index_name: str
+    items: int
+    queries: int  # query frames
+    build_time: float
+    index_bytes: int
+    search_time: float  # batched search of all query frames
+    recall: float  # share of found neighbours within the exact k-th distance
+
+    @staticmethod
+    def to_csv_header() -> List[str]:
+        return ["hash_name", "index_name", "items", "queries", "build_time", "index_bytes", "search_time", "ms_per_query", "recall"]
+
+    def to_csv(self) -> list:
+        ms_per_query = 1000 * self.search_time / self.queries if self.queries else 0.0
+        return [self.hash_name, self.index_name, self.items, self.queries, self.build_time, self.index_bytes, self.search_time, ms_per_query, self.recall]
@@ -0,0 +1,21 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class IndexLoadStats:
+    hash_name: str
+    items: int
+    index_bytes: int  # index file, memory-mapped
+    db_index_bytes: int  # db_index.npy, memory-mapped
+    load_time: float
+    searchers: int  # number of search algorithms sharing the database
+
+    def to_json(self) -> dict:
+        return {
+            "hash_name": self.hash_name,
+            "items": self.items,
+            "index_bytes": self.index_bytes,
+            "db_index_bytes": self.db_index_bytes,
+            "load_time": self.load_time,
+            "searchers": self.searchers,
+        }
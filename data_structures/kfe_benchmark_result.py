@@ -0,0 +1,20 @@
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class KfeBenchmarkResult:
+    filename: str
+    frames_count: int
+    keyframes_count: int
+    dense_time: float
+    sparse_time: float
+    same_keyframes: bool
+
+    @staticmethod
+    def to_csv_header() -> List[str]:
+        return ["filename", "frames_count", "keyframes_count", "dense_time", "sparse_time", "speedup", "same_keyframes"]
+
+    def to_csv(self) -> list:
+        speedup = self.dense_time / self.sparse_time if self.sparse_time else 0.0
+        return [self.filename, self.frames_count, self.keyframes_count, self.dense_time, self.sparse_time, speedup, self.same_keyframes]
@@ -0,0 +1,12 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class LandmarkConfig:
+    bands: int = 4  # keys per frame (or per pair of frames), every band is a fixed subset of hash bits
+    band_bits: int = 16  # bits of one band, less if the hash is shorter than bands * band_bits
+    fan_out: int = 2  # pairs of an anchor frame with the next fan_out frames, 0 - keys of single frames
+    gap_step: float = 0.5  # seconds, time gap between frames of a pair is quantized to this step
+
+    def to_json(self) -> dict:
+        return {"bands": self.bands, "band_bits": self.band_bits, "fan_out": self.fan_out, "gap_step": self.gap_step}
@@ -0,0 +1,14 @@
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+from data_structures.landmark_config import LandmarkConfig
+
+
+@dataclass
+class LandmarkDB:
+    keys: np.ndarray  # (postings,) sorted uint64 landmark keys
+    items: np.ndarray  # (postings,) int32 db_index rows of anchor frames in order of keys
+    db_index: np.ndarray  # (frames,) structured array of DB_INDEX_DTYPE
+    filenames: List[str]  # filename by db_index["filename_id"]
+    config: LandmarkConfig  # settings the index was built with, queries use the same
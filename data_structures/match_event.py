@@ -0,0 +1,31 @@
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class MatchEvent:
+    stream_time: float  # timecode of the stream frame which made the match
+    filename: str
+    timestamp_delta: float  # timecode of the video - stream time
+    weight: float
+    confidence: float  # 1 - weight of the second file / weight of the best file in the window
+    window_frames: int  # stream frames in the sliding window
+    latency: float  # seconds from arrival of the stream frame to the event
+
+    def to_json(self) -> dict:
+        return {
+            "stream_time": self.stream_time,
+            "filename": self.filename,
+            "timestamp_delta": self.timestamp_delta,
+            "weight": self.weight,
+            "confidence": self.confidence,
+            "window_frames": self.window_frames,
+            "latency": self.latency,
+        }
+
+    @staticmethod
+    def to_csv_header() -> List[str]:
+        return ["stream_time", "filename", "timestamp_delta", "weight", "confidence", "window_frames", "latency"]
+
+    def to_csv(self) -> list:
+        return [self.stream_time, self.filename, self.timestamp_delta, self.weight, self.confidence, self.window_frames, self.latency]
@@ -0,0 +1,14 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+import numpy as np
+from PIL import Image
+
+
+@dataclass
+class PreprocessedFrame:
+    frame: np.ndarray  # BGR frame as decoded by opencv
+    gray: np.ndarray  # opencv grayscale (COLOR_BGR2GRAY), used by opencv img_hash hashers
+    image: Image.Image  # PIL grayscale (mode "L") of RGB frame, used by imagehash hashers
+    timecode: float
+    variants: Dict[tuple, Any] = field(default_factory=dict)  # downscaled variants shared by hashers
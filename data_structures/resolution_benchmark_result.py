@@ -0,0 +1,46 @@
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class ResolutionBenchmarkResult:
+    hash_name: str
+    resolution: int  # short side of downscaled keyframes
+    keyframes: int
+    changed_keyframes: int  # keyframes with a different hash
+    changed_bits: int  # bits of hamming hashes, components of other ones
+    bits: int
+    distance: float  # sum of distances between full and downscaled hashes of keyframes in the metric of the hasher
+    full_time: float  # hashing of full size keyframes
+    reduced_time: float
+
+    @staticmethod
+    def to_csv_header() -> List[str]:
+        return [
+            "hash_name",
+            "resolution",
+            "keyframes",
+            "changed_keyframes",
+            "changed_bits",
+            "bits",
+            "bit_flip_rate",
+            "mean_distance",
+            "full_time",
+            "reduced_time",
+        ]
+
+    def to_csv(self) -> list:
+        bit_flip_rate = self.changed_bits / self.bits if self.bits else 0.0
+        mean_distance = self.distance / self.keyframes if self.keyframes else 0.0
+        return [
+            self.hash_name,
+            self.resolution,
+            self.keyframes,
+            self.changed_keyframes,
+            self.changed_bits,
+            self.bits,
+            bit_flip_rate,
+            mean_distance,
+            self.full_time,
+            self.reduced_time,
+        ]
@@ -9,13 +9,15 @@ class SearchResult:
     filename_timestamp: str
     results: List[SearchItemResult]
     elapsed_time: float
+    frames: int = 0  # query frames
+    searched_frames: int = 0  # query frames searched before the result was found (less than frames if search stopped early)
 
     def to_json(self) -> dict:
         return {"filename_timestamp": self.filename_timestamp, "results": [result.to_json() for result in self.results]}
 
     @staticmethod
     def to_csv_header() -> List[str]:
-        return ["filename_timestamp", "elapsed_time"]
+        return ["filename_timestamp", "elapsed_time", "frames", "searched_frames"]
 
     def to_csv(self) -> list:
-        return [self.filename_timestamp, self.elapsed_time]
+        return [self.filename_timestamp, self.elapsed_time, self.frames, self.searched_frames]
@@ -0,0 +1,38 @@
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class TuningResult:
+    hash_name: str
+    n_trees: int
+    search_k: int
+    k: int
+    mrr: float
+    mp: float  # mAP
+    recall: float
+    build_time: float
+    index_bytes: int
+    mean_latency: float  # seconds per query video
+    p95_latency: float
+    pareto: bool = False  # no other settings are better or equal in quality, latency and index size
+
+    @staticmethod
+    def to_csv_header() -> List[str]:
+        return ["hash_name", "n_trees", "search_k", "k", "MRR", "mAP", "Recall", "build_time", "index_bytes", "mean_latency", "p95_latency", "pareto"]
+
+    def to_csv(self) -> list:
+        return [
+            self.hash_name,
+            self.n_trees,
+            self.search_k,
+            self.k,
+            self.mrr,
+            self.mp,
+            self.recall,
+            self.build_time,
+            self.index_bytes,
+            self.mean_latency,
+            self.p95_latency,
+            self.pareto,
+        ]
@@ -1,18 +1,19 @@
 from dataclasses import dataclass
 from typing import List
 
-from data_structures.frame_hash import FrameHash
+import numpy as np
 
 
 @dataclass
 class VideoHash:
     filename: str
-    frames: List[FrameHash]
+    vecs: np.ndarray  # (frames, vector_size) uint8
+    timecodes: np.ndarray  # (frames,) float64
     elapsed_time: float
     full_elapsed_time: float
 
     def to_json(self) -> dict:
-        return {"filename": self.filename, "frames": [frame.to_json() for frame in self.frames]}
+        return {"filename": self.filename, "frames": [{"vec": vec, "timecode": timecode} for vec, timecode in zip(self.vecs.tolist(), self.timecodes.tolist())]}
 
     @staticmethod
     def to_csv_header() -> List[str]:
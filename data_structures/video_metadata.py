@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Tuple
 
 
 @dataclass
@@ -11,6 +11,17 @@ class VideoMetadata:
     height: int
     frames_count: int
 
+    def keyframe_size(self, resolution: int) -> Tuple[int, int]:
+        """
+        (width, height) of keyframes downscaled to resolution pixels on the short side, 0 or a larger resolution keeps the size
+        """
+        short_side = min(self.width, self.height)
+        if not resolution or short_side <= resolution:
+            return self.width, self.height
+
+        scale = resolution / short_side
+        return max(1, round(self.width * scale)), max(1, round(self.height * scale))
+
     def to_csv(self) -> list:
         return [self.filename, self.fps, self.duration, self.width, self.height, self.frames_count]
 
@@ -2,24 +2,66 @@ import glob
 import json
 import logging
 import os
+import shutil
+import zlib
+from typing import Iterable, List, Optional, Tuple
 
-from annoy import AnnoyIndex
+import numpy as np
+from data_structures.annoy_config import AnnoyConfig
 from data_structures.annoy_db import AnnoyDB
+from data_structures.hash_store_data import HashStoreData
+from entities.hash_store import HashStore
 from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
+from frame_indexes.abstract_frame_index import AbstractFrameIndex
+from frame_indexes.annoy_frame_index import AnnoyFrameIndex, EUCLIDEAN_FILENAME
+from frame_indexes.exact_frame_index import ExactFrameIndex
+from frame_indexes.mih_frame_index import MIHFrameIndex
+from frame_indexes.segmented_frame_index import SegmentedFrameIndex
+
+DB_INDEX_DTYPE = np.dtype([("filename_id", "<i4"), ("frame", "<i4"), ("timecode", "<f8")])
+SEGMENTS_DIR = "segments"
+SHARDS_DIR = "shards"
 
 
 class AnnoyProcessor:
-    def __init__(self, hasher: AbstractFrameHasher, logger: logging.Logger, bucket: int, threads: int) -> None:
+    def __init__(self, hasher: AbstractFrameHasher, logger: logging.Logger, bucket: int, threads: int, config: Optional[AnnoyConfig] = None) -> None:
         self.hasher = hasher
+        self.config = config or AnnoyConfig()
         self.logger = logger
         self.bucket = bucket
         self.threads = threads
-        self.annoy_index = None
+        self.frame_index = None
         self.db_index = []
 
-    def annoy_init(self) -> None:
-        self.annoy_index = AnnoyIndex(self.hasher.vector_size, "euclidean")
-        self.annoy_index.set_seed(42)
+    @property
+    def metric(self) -> str:
+        """
+        Metric of the index: bit hashes use the metric of the config, other hashes the metric of the hasher
+        """
+        return self.config.metric if self.hasher.metric == "hamming" else self.hasher.metric
+
+    def annoy_init(self, metric: Optional[str] = None) -> None:
+        metric = metric or self.metric
+        if self.config.backend == "mih" and metric == "hamming":
+            self.frame_index = MIHFrameIndex(
+                vector_size=self.hasher.vector_size, metric=metric, binary=self.hasher.binary, threads=self.threads
+            )
+            return
+
+        if self.config.backend in ("exact", "mih"):  # multi-index hashing works only with hamming distance
+            self.frame_index = ExactFrameIndex(
+                vector_size=self.hasher.vector_size, metric=metric, binary=self.hasher.binary, threads=self.threads
+            )
+            return
+
+        self.frame_index = AnnoyFrameIndex(
+            vector_size=self.hasher.vector_size,
+            metric=metric,
+            binary=self.hasher.binary,
+            threads=self.threads,
+            n_trees=self.config.n_trees,
+            search_k=self.config.search_k,
+        )
 
     def index_json(self, json_path: str, annoy_indexing: bool = False) -> None:
         with open(json_path, "r") as f:
@@ -27,33 +69,344 @@ class AnnoyProcessor:
 
         for i, frame in enumerate(data["frames"]):
             if annoy_indexing:
-                self.annoy_index.add_item(len(self.db_index), frame["vec"])
+                self.frame_index.add(len(self.db_index), frame["vec"])
 
             self.db_index.append([data["filename"], i, frame["timecode"]])
 
+    def index_store(self, hashes_path: str, annoy_indexing: bool = False) -> None:
+        data = HashStore.load(hashes_path)
+        self.index_videos(data, self.by_filename(data, range(len(data.keys))), annoy_indexing)
+
+    @staticmethod
+    def by_filename(data: HashStoreData, videos: Iterable[int]) -> List[int]:
+        """
+        Videos in order of filenames: items are numbered by (filename, frame) in every index and shard,
+        so exact indexes order equal distances the same way and shards merge to the result of one index
+        """
+        return sorted(videos, key=lambda i: data.filenames[i])
+
+    def index_videos(self, data: HashStoreData, videos: Iterable[int], annoy_indexing: bool = False) -> None:
+        for i in videos:
+            for frame_number, frame in enumerate(range(data.offsets[i], data.offsets[i + 1])):
+                if annoy_indexing:
+                    self.frame_index.add(len(self.db_index), data.vecs[frame])
+
+                self.db_index.append([data.filenames[i], frame_number, float(data.timecodes[frame])])
+
     def json_indexing(self, hashes_path: str, annoy_indexing: bool = False) -> None:
-        json_paths = glob.glob(os.path.join(hashes_path, "*.json"))
+        if HashStore.exists(hashes_path):
+            self.index_store(hashes_path, annoy_indexing)
+            return
 
-        for json_path in json_paths:
+        for json_path in self.json_paths(hashes_path):
             self.index_json(json_path, annoy_indexing)
 
     def build_and_save_annoy_index(self, save_dir: str) -> None:
-        self.annoy_index.build(1000, n_jobs=self.threads)
-        self.annoy_index.save(os.path.join(save_dir, "annoy_index.ann"))
+        self.frame_index.build()
+        self.frame_index.save(save_dir)
 
-    def load_annoy_index(self, hashes_path: str) -> None:
-        self.annoy_index.load(os.path.join(hashes_path, "annoy_index.ann"))
+    def legacy_index(self, hashes_path: str) -> bool:
+        """
+        Only the euclidean annoy index of bit hashes built before the hamming metric exists in hashes_path
+        """
+        if not isinstance(self.frame_index, AnnoyFrameIndex) or self.frame_index.metric == "euclidean":
+            return False
 
-    def load_annoy_db_from_disk(self, hashes_path: str) -> AnnoyDB:
+        return not os.path.exists(os.path.join(hashes_path, self.frame_index.filename)) and os.path.exists(os.path.join(hashes_path, EUCLIDEAN_FILENAME))
+
+    def init_index(self, hashes_path: str) -> None:
+        """
+        annoy_init for the index saved in hashes_path: the old euclidean annoy index if only it exists
+        """
+        self.annoy_init()
+        if self.legacy_index(hashes_path):
+            self.logger.warning(
+                f"{hashes_path} has only {EUCLIDEAN_FILENAME}, it's searched with euclidean metric instead of {self.frame_index.filename}. "
+                f"Rebuild it by pre_search_process.py or set metric euclidean in annoy_config.json"
+            )
+            self.annoy_init(metric="euclidean")
+
+    def check_index(self, hashes_path: str) -> bool:
+        """
+        The index of the config (or the old euclidean annoy index) is built in hashes_path, otherwise logs how to build it
+        """
         self.annoy_init()
-        self.json_indexing(hashes_path)
+        if os.path.exists(os.path.join(hashes_path, self.frame_index.filename)) or self.legacy_index(hashes_path):
+            return True
+
+        self.logger.error(
+            f"{os.path.join(hashes_path, self.frame_index.filename)} doesn't exist, build it by pre_search_process.py "
+            f"--hash {os.path.basename(os.path.normpath(hashes_path))} --backend {self.frame_index.name} --metric {self.frame_index.metric}"
+        )
+        return False
+
+    def load_annoy_index(self, hashes_path: str) -> None:
+        self.frame_index.load(hashes_path)
+
+    def db_index_paths(self, save_dir: str) -> Tuple[str, str]:
+        """
+        Paths of db_index and its filenames of the current index. Every backend and metric has its own db_index,
+        so a build of one backend doesn't misalign items of the others. The euclidean annoy index keeps the old names
+        """
+        if isinstance(self.frame_index, AnnoyFrameIndex) and self.frame_index.metric == "euclidean":
+            return os.path.join(save_dir, "db_index.npy"), os.path.join(save_dir, "db_index_filenames.json")
+
+        name = f"db_index_{self.frame_index.name}_{self.frame_index.metric}"
+        return os.path.join(save_dir, f"{name}.npy"), os.path.join(save_dir, f"{name}_filenames.json")
+
+    def save_db_index(self, save_dir: str) -> Tuple[np.ndarray, List[str]]:
+        """
+        Save db_index next to the index (see db_index_paths): .npy with (filename_id, frame, timecode) of every item
+        and .json with filenames by filename_id
+        """
+        db_index, filenames = self.db_index_array()
+        db_index_path, filenames_path = self.db_index_paths(save_dir)
+
+        np.save(db_index_path, db_index)
+        with open(filenames_path, "w", encoding="utf-8") as f:
+            json.dump(filenames, f)
+
+        return db_index, filenames
+
+    def db_index_array(self) -> Tuple[np.ndarray, List[str]]:
+        filenames = list(dict.fromkeys(row[0] for row in self.db_index))
+        filename_ids = {filename: i for i, filename in enumerate(filenames)}
+        db_index = np.array([(filename_ids[filename], frame, timecode) for filename, frame, timecode in self.db_index], dtype=DB_INDEX_DTYPE)
+
+        return db_index, filenames
+
+    def load_db_index(self, hashes_path: str) -> Tuple[np.ndarray, List[str]]:
+        """
+        Memory-map db_index of the current index, if it doesn't exist (index built before) db_index is rebuilt from hashes and saved
+        """
+        db_index_path, filenames_path = self.db_index_paths(hashes_path)
+        if not os.path.exists(db_index_path):
+            self.logger.warning(f"{db_index_path} doesn't exist, db_index is rebuilt from hashes")
+            return self.rebuild_db_index(hashes_path)
+
+        with open(filenames_path, "r", encoding="utf-8") as f:
+            filenames = json.load(f)
+
+        return np.load(db_index_path, mmap_mode="r"), filenames
+
+    def rebuild_db_index(self, hashes_path: str) -> Tuple[np.ndarray, List[str]]:
+        """
+        db_index of an index built before its db_index was saved, items are in the order the index was built:
+        json files in glob order (as before hash stores), the hash store otherwise. It's saved only if the index has
+        as many items and sampled items have the same vectors, otherwise the index has to be rebuilt
+        """
         self.load_annoy_index(hashes_path)
+        self.db_index = []
+        json_paths = self.json_paths(hashes_path)
+        if json_paths:
+            vecs = []
+            for json_path in json_paths:
+                self.index_json(json_path)
+                with open(json_path, "r") as f:
+                    vecs.extend(frame["vec"] for frame in json.load(f)["frames"])
+
+            vecs = np.array(vecs, dtype=np.uint8).reshape(len(vecs), self.hasher.vector_size)
+        else:
+            data = HashStore.load(hashes_path)
+            self.index_videos(data, range(len(data.keys)))
+            vecs = data.vecs
+
+        sample = np.unique(np.linspace(0, len(vecs) - 1, num=min(len(vecs), 100)).astype(np.int64))
+        if self.frame_index.count() != len(vecs) or not self.frame_index.contains(sample, vecs[sample]):
+            raise ValueError(
+                f"{self.frame_index.filename} of {hashes_path} doesn't match its hashes (items={self.frame_index.count()}, hashes={len(vecs)}), "
+                f"rebuild it by pre_search_process.py"
+            )
+
+        return self.save_db_index(hashes_path)
 
-        return AnnoyDB(db_index=self.db_index, annoy_index=self.annoy_index)
+    def load_annoy_db_from_disk(self, hashes_path: str, incremental: bool = False) -> AnnoyDB:
+        if incremental:
+            return self.load_segmented_db(hashes_path)
+
+        self.init_index(hashes_path)
+        self.load_annoy_index(hashes_path)
+        db_index, filenames = self.load_db_index(hashes_path)
+
+        return AnnoyDB(db_index=db_index, filenames=filenames, frame_index=self.frame_index)
 
     def create_annoy_db(self, hashes_path: str) -> AnnoyDB:
         self.annoy_init()
         self.json_indexing(hashes_path, annoy_indexing=True)
         self.build_and_save_annoy_index(hashes_path)
+        db_index, filenames = self.save_db_index(hashes_path)
+
+        # the full index covers all videos of segments
+        shutil.rmtree(os.path.join(hashes_path, SEGMENTS_DIR), ignore_errors=True)
+
+        return AnnoyDB(db_index=db_index, filenames=filenames, frame_index=self.frame_index)
+
+    def segment_paths(self, hashes_path: str) -> List[str]:
+        """
+        Directories of immutable indexes: the full index in hashes_path (if built) and segments in order of creation
+        """
+        self.annoy_init()
+        full_index = [hashes_path] if os.path.exists(os.path.join(hashes_path, self.frame_index.filename)) or self.legacy_index(hashes_path) else []
+        return full_index + sorted(glob.glob(os.path.join(hashes_path, SEGMENTS_DIR, "segment_*")))
+
+    def new_videos(self, hashes_path: str, data: HashStoreData) -> List[int]:
+        """
+        Videos of the hash store which are not in the full index and segments
+        """
+        indexed = set()
+        for segment_path in self.segment_paths(hashes_path):
+            self.init_index(segment_path)
+            indexed.update(self.load_db_index(segment_path)[1])
+
+        return [i for i, filename in enumerate(data.filenames) if filename not in indexed]
+
+    def create_segment(self, hashes_path: str, max_segments: int = 8) -> int:
+        """
+        Index new videos of the hash store as a new immutable segment, cost depends only on the number of new videos.
+        When there are more than max_segments segments, they are merged into one (the full index is not rebuilt).
+        Returns number of new videos
+        """
+        data = HashStore.load(hashes_path)
+        videos = self.new_videos(hashes_path, data)
+        if videos:
+            segment_path = self.build_segment(hashes_path, data, videos)
+            self.logger.info(f"Segment {segment_path} is built, videos={len(videos)}")
+
+        segment_paths = sorted(glob.glob(os.path.join(hashes_path, SEGMENTS_DIR, "segment_*")))
+        if len(segment_paths) > max_segments:
+            self.merge_segments(hashes_path, data, segment_paths)
+
+        return len(videos)
+
+    def build_segment(self, hashes_path: str, data: HashStoreData, videos: List[int]) -> str:
+        segments_path = os.path.join(hashes_path, SEGMENTS_DIR)
+        os.makedirs(segments_path, exist_ok=True)
+
+        segment_paths = sorted(glob.glob(os.path.join(segments_path, "segment_*")))
+        number = int(segment_paths[-1].rsplit("_", 1)[1]) + 1 if segment_paths else 0
+        segment_path = os.path.join(segments_path, f"segment_{number:06d}")
+        tmp_path = os.path.join(segments_path, f".tmp_segment_{number:06d}")
+        os.makedirs(tmp_path, exist_ok=True)
+
+        self.build_index(tmp_path, data, videos)
+
+        os.rename(tmp_path, segment_path)  # readers see only complete segments
+        return segment_path
+
+    def build_index(self, save_dir: str, data: HashStoreData, videos: List[int]) -> None:
+        self.annoy_init()
+        self.db_index = []
+        self.index_videos(data, self.by_filename(data, videos), annoy_indexing=True)
+        self.build_and_save_annoy_index(save_dir)
+        self.save_db_index(save_dir)
+
+    def merge_segments(self, hashes_path: str, data: HashStoreData, segment_paths: List[str]) -> None:
+        filenames = set()
+        for segment_path in segment_paths:
+            self.init_index(segment_path)
+            filenames.update(self.load_db_index(segment_path)[1])
+
+        merged_path = self.build_segment(hashes_path, data, [i for i, filename in enumerate(data.filenames) if filename in filenames])
+
+        # indexes already loaded by readers stay valid: removed files are still memory-mapped
+        for segment_path in segment_paths:
+            shutil.rmtree(segment_path)
+
+        self.logger.info(f"Segments {len(segment_paths)} are merged to {merged_path}")
+
+    def load_segmented_db(self, hashes_path: str) -> AnnoyDB:
+        """
+        Full index, segments and exact index of new videos (not indexed yet) searched as one database
+        """
+        indexes: List[AbstractFrameIndex] = []
+        db_indexes: List[np.ndarray] = []
+        filenames: List[List[str]] = []
+
+        for segment_path in self.segment_paths(hashes_path):
+            self.init_index(segment_path)
+            self.load_annoy_index(segment_path)
+            db_index, segment_filenames = self.load_db_index(segment_path)
+            indexes.append(self.frame_index)
+            db_indexes.append(db_index)
+            filenames.append(segment_filenames)
+
+        data = HashStore.load(hashes_path)
+        indexed = {filename for segment_filenames in filenames for filename in segment_filenames}
+        videos = [i for i, filename in enumerate(data.filenames) if filename not in indexed]
+
+        if videos:
+            self.frame_index = ExactFrameIndex(
+                vector_size=self.hasher.vector_size, metric=self.metric, binary=self.hasher.binary, threads=self.threads
+            )
+            self.db_index = []
+            self.index_videos(data, videos, annoy_indexing=True)
+            self.frame_index.build()
+            db_index, delta_filenames = self.db_index_array()
+            indexes.append(self.frame_index)
+            db_indexes.append(db_index)
+            filenames.append(delta_filenames)
+
+        if not indexes:
+            raise ValueError(f"No index and no hashes in {hashes_path}")
+
+        self.logger.info(f"{hashes_path}: immutable indexes={len(indexes) - bool(videos)} new videos={len(videos)}")
+        return self.combine(indexes, db_indexes, filenames)
+
+    def create_shards(self, hashes_path: str, shards: int) -> List[str]:
+        """
+        Partition videos of the hash store to shards by crc32 of filename and build a separate index with its own db_index
+        for every shard (hashes_path/shards/shard_NNN), so shards can be loaded by different processes or nodes.
+        Previous shards are replaced, shards without videos are not created. Returns paths of shards
+        """
+        data = HashStore.load(hashes_path)
+        shard_of_video = [zlib.crc32(filename.encode("utf-8")) % shards for filename in data.filenames]
+
+        shards_path = os.path.join(hashes_path, SHARDS_DIR)
+        tmp_path = os.path.join(hashes_path, f".tmp_{SHARDS_DIR}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+        shard_paths = []
+        for shard in range(shards):
+            videos = [i for i, video_shard in enumerate(shard_of_video) if video_shard == shard]
+            if not videos:
+                self.logger.warning(f"Shard {shard}/{shards} of {hashes_path} has no videos, skipped")
+                continue
+
+            shard_path = os.path.join(tmp_path, f"shard_{shard:03d}")
+            os.makedirs(shard_path)
+            self.build_index(shard_path, data, videos)
+            shard_paths.append(os.path.join(shards_path, os.path.basename(shard_path)))
+            self.logger.info(f"Shard {shard}/{shards} of {hashes_path} is built, videos={len(videos)}")
+
+        shutil.rmtree(shards_path, ignore_errors=True)
+        os.rename(tmp_path, shards_path)
+        return shard_paths
+
+    @staticmethod
+    def json_paths(hashes_path: str) -> List[str]:
+        """
+        Hashes saved before hash store was introduced, filenames of db_index are saved as json too
+        """
+        return [path for path in glob.glob(os.path.join(hashes_path, "*.json")) if not os.path.basename(path).startswith("db_index")]
+
+    @staticmethod
+    def shard_paths(hashes_path: str) -> List[str]:
+        return sorted(glob.glob(os.path.join(hashes_path, SHARDS_DIR, "shard_*")))
+
+    @staticmethod
+    def combine(indexes: List[AbstractFrameIndex], db_indexes: List[np.ndarray], filenames: List[List[str]]) -> AnnoyDB:
+        parts = []
+        filenames_offset = 0
+        for db_index, segment_filenames in zip(db_indexes, filenames):
+            part = np.array(db_index, dtype=DB_INDEX_DTYPE)
+            part["filename_id"] += filenames_offset
+            parts.append(part)
+            filenames_offset += len(segment_filenames)
+
+        item_offsets = np.cumsum([0] + [len(db_index) for db_index in db_indexes[:-1]]).tolist()
 
-        return AnnoyDB(db_index=self.db_index, annoy_index=self.annoy_index)
+        return AnnoyDB(
+            db_index=np.concatenate(parts),
+            filenames=[filename for segment_filenames in filenames for filename in segment_filenames],
+            frame_index=SegmentedFrameIndex(indexes, item_offsets),
+        )
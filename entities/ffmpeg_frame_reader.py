@@ -0,0 +1,128 @@
+import json
+import logging
+import math
+import subprocess
+from fractions import Fraction
+from itertools import count
+from typing import Iterator, Optional, Tuple
+
+from data_structures.video_keyframe import VideoKeyframe
+from data_structures.video_metadata import VideoMetadata
+from entities.frame_buffer_ring import FrameBufferRing
+
+
+class FFmpegFrameReader:
+    """
+    Keyframes of any container ffmpeg decodes (flv and others OpenCV can't open) without an intermediate file:
+    ffmpeg converts the video to its constant frame rate with the fps filter (as the former conversion to mp4 did),
+    keeps every int(fps * interval)-th frame with the select filter and writes them as raw bgr24 frames to a pipe.
+    Frames are read straight into numpy arrays, sampled frames and timecodes are the same as of VideoKeyframeExtractor
+    """
+
+    def __init__(self, logger: logging.Logger, threads: int = 1) -> None:
+        self.logger = logger
+        self.threads = threads
+
+    def probe(self, filepath: str) -> Tuple[int, int, Fraction, float, int]:
+        """
+        Width, height, frame rate, duration and number of frames (estimated from duration if the container doesn't store it)
+        """
+        cmd = [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "stream=width,height,r_frame_rate,nb_frames:format=duration",
+            "-of",
+            "json",
+            filepath,
+        ]
+        info = json.loads(subprocess.run(cmd, capture_output=True, check=True).stdout)
+        stream = info["streams"][0]
+
+        rate = Fraction(stream["r_frame_rate"])
+        duration = float(info.get("format", {}).get("duration", 0.0))
+        frames_count = int(stream["nb_frames"]) if str(stream.get("nb_frames", "")).isdigit() else int(round(duration * rate))
+
+        return int(stream["width"]), int(stream["height"]), rate, duration, frames_count
+
+    def extract_stream(
+        self,
+        filepath: str,
+        original_filepath: str,
+        interval: float = 0.5,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        ring: Optional[FrameBufferRing] = None,
+        resolution: int = 0,
+    ) -> Optional[Tuple[VideoMetadata, Iterator[VideoKeyframe]]]:
+        """
+        Metadata and lazy iterator of keyframes of the video or of its segment [start_time, end_time), timecodes start from 0.
+        If ring is set, frames are read into its preallocated arrays.
+        If resolution is set, sampled frames are downscaled by ffmpeg (scale filter, area) before they are written to the pipe
+        """
+        try:
+            width, height, rate, duration, frames_count = self.probe(filepath)
+        except (OSError, subprocess.CalledProcessError, ValueError, KeyError, IndexError) as e:
+            self.logger.error(f"Cannot probe video file {original_filepath}: {e}")
+            return None
+
+        fps = float(rate)
+        segment = []
+        if start_time is not None and end_time is not None:
+            segment = ["-ss", str(start_time), "-t", str(max(0.0, end_time - start_time))]
+            frames_count = max(0, min(frames_count, math.ceil(end_time * fps - 1e-6)) - math.ceil(start_time * fps - 1e-6))
+            duration = frames_count / fps
+
+        metadata = VideoMetadata(filename=original_filepath, fps=fps, duration=duration, width=width, height=height, frames_count=frames_count)
+        frame_interval = max(1, int(fps * interval))
+        size = metadata.keyframe_size(resolution)
+        scale = f",scale={size[0]}:{size[1]}:flags=area" if size != (width, height) else ""
+
+        cmd = [
+            "ffmpeg",
+            "-loglevel",
+            "error",
+            *segment[:2],
+            "-i",
+            filepath,
+            *segment[2:],
+            "-map",
+            "0:v:0",
+            "-vf",
+            f"fps={rate},select='not(mod(n\\,{frame_interval}))'{scale}",
+            "-vsync",
+            "passthrough",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "bgr24",
+            "-threads",
+            str(self.threads),
+            "pipe:1",
+        ]
+
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            self.logger.error(f"Cannot run ffmpeg for {original_filepath}: {e}")
+            return None
+
+        return metadata, self.__iter_frames(process, (size[1], size[0], 3), frame_interval, fps, ring or FrameBufferRing(0))
+
+    def __iter_frames(
+        self, process: subprocess.Popen, shape: Tuple[int, int, int], frame_interval: int, fps: float, ring: FrameBufferRing
+    ) -> Iterator[VideoKeyframe]:
+        try:
+            for frame_count in count(0, frame_interval):
+                frame = ring.take(shape)
+                if process.stdout.readinto(memoryview(frame).cast("B")) < frame.nbytes:
+                    break
+
+                yield VideoKeyframe(frame=frame, timecode=round(2 * frame_count / fps, 2) / 2)
+        finally:
+            process.stdout.close()
+            process.kill()
+            process.wait()
@@ -0,0 +1,32 @@
+from typing import List, Tuple
+
+import numpy as np
+
+
+class FrameBufferRing:
+    """
+    Ring of size preallocated arrays frames are decoded into instead of a new array per frame.
+    An array taken from the ring is valid until size more arrays are taken, so size must be
+    at least the number of frames held at once (batch_size of VideoProcessor).
+    size=0 allocates a new array on every take, as without the ring
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.buffers: List[np.ndarray] = []
+        self.position = 0
+
+    def take(self, shape: Tuple[int, ...], dtype: type = np.uint8) -> np.ndarray:
+        if not self.size:
+            return np.empty(shape, dtype=dtype)
+
+        if self.buffers and (self.buffers[0].shape != tuple(shape) or self.buffers[0].dtype != dtype):  # next video has another resolution
+            self.buffers, self.position = [], 0
+
+        if len(self.buffers) < self.size:
+            self.buffers.append(np.empty(shape, dtype=dtype))
+            return self.buffers[-1]
+
+        buffer = self.buffers[self.position]
+        self.position = (self.position + 1) % self.size
+        return buffer
@@ -0,0 +1,53 @@
+from typing import Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+from data_structures.preprocessed_frame import PreprocessedFrame
+from data_structures.video_keyframe import VideoKeyframe
+from entities.frame_buffer_ring import FrameBufferRing
+
+
+class FramePreprocessor:
+    """
+    Grayscale conversion and downscaling of a keyframe shared by all hashers.
+    Every variant is computed once per keyframe and is bit-exact with what the hasher computes internally.
+    If buffers > 0, grayscale frames are converted into a ring of buffers preallocated arrays
+    and the temporary RGB frame into one reused array (PIL copies it)
+    """
+
+    def __init__(self, buffers: int = 0) -> None:
+        self.rgb = FrameBufferRing(min(1, buffers))
+        self.gray = FrameBufferRing(buffers)
+
+    def process(self, keyframe: VideoKeyframe) -> PreprocessedFrame:
+        shape = keyframe.frame.shape
+        x = cv2.cvtColor(keyframe.frame, cv2.COLOR_BGR2RGB, dst=self.rgb.take(shape))  # imagehash works with RGB PIL images
+
+        return PreprocessedFrame(
+            frame=keyframe.frame,
+            gray=cv2.cvtColor(keyframe.frame, cv2.COLOR_BGR2GRAY, dst=self.gray.take(shape[:2])),
+            image=Image.fromarray(x).convert("L"),
+            timecode=keyframe.timecode,
+        )
+
+    def resized_gray(self, frame: PreprocessedFrame, size: Tuple[int, int]) -> np.ndarray:
+        """
+        BGR frame resized to size=(width, height) and converted to grayscale, the same way as BlockMeanHash does
+        """
+        key = ("gray", size)
+        if key not in frame.variants:
+            x = cv2.resize(frame.frame, size, interpolation=cv2.INTER_LINEAR_EXACT)
+            frame.variants[key] = cv2.cvtColor(x, cv2.COLOR_BGR2GRAY)
+
+        return frame.variants[key]
+
+    def resized_image(self, frame: PreprocessedFrame, size: Tuple[int, int]) -> Image.Image:
+        """
+        PIL grayscale image resized to size=(width, height) the same way as imagehash does
+        """
+        key = ("image", size)
+        if key not in frame.variants:
+            frame.variants[key] = frame.image.resize(size, Image.Resampling.LANCZOS)
+
+        return frame.variants[key]
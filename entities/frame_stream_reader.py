@@ -0,0 +1,74 @@
+import logging
+import time
+from typing import BinaryIO, Iterator
+
+import cv2
+import numpy as np
+from data_structures.video_keyframe import VideoKeyframe
+
+
+class FrameStreamReader:
+    """
+    Keyframes of an unbounded source: raw BGR frames from a pipe (e.g. ffmpeg -f rawvideo -pix_fmt bgr24 -) or any source
+    opened by OpenCV (file, url). Frames are sampled every interval seconds of stream time as VideoKeyframeExtractor does,
+    only one frame is held in memory at once
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float = 0.5) -> None:
+        self.logger = logger
+        self.interval = interval
+
+    def read_raw(self, stream: BinaryIO, width: int, height: int, fps: float) -> Iterator[VideoKeyframe]:
+        """
+        Frames of width * height * 3 bytes until the end of the stream, an incomplete last frame is dropped
+        """
+        frame_bytes = width * height * 3
+        frame_interval = max(1, int(fps * self.interval))
+        frame_count = 0
+
+        while True:
+            buffer = stream.read(frame_bytes)
+            if len(buffer) < frame_bytes:
+                break
+
+            if frame_count % frame_interval == 0:
+                frame = np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 3)
+                yield VideoKeyframe(frame=frame, timecode=round(2 * frame_count / fps, 2) / 2)
+
+            frame_count += 1
+
+    def read_capture(self, source: str, realtime: bool = False) -> Iterator[VideoKeyframe]:
+        """
+        Frames of an OpenCV source until it ends, number of frames isn't needed.
+        If realtime, frames are read not faster than fps, so a file stands in for a live feed
+        """
+        video = cv2.VideoCapture(source)
+        if not video.isOpened():
+            self.logger.error(f"Cannot open video source {source}")
+            return
+
+        try:
+            fps = video.get(cv2.CAP_PROP_FPS)
+            frame_interval = max(1, int(fps * self.interval))
+            start_timer = time.perf_counter()
+            frame_count = 0
+
+            while True:
+                if frame_count % frame_interval != 0:
+                    if not video.grab():
+                        break
+
+                    frame_count += 1
+                    continue
+
+                if realtime:
+                    time.sleep(max(0.0, start_timer + frame_count / fps - time.perf_counter()))
+
+                ret, frame = video.read()
+                if not ret:
+                    break
+
+                yield VideoKeyframe(frame=frame, timecode=round(2 * frame_count / fps, 2) / 2)
+                frame_count += 1
+        finally:
+            video.release()
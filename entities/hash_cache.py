@@ -0,0 +1,165 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import shutil
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from data_structures.hash_cache_stats import HashCacheStats
+from data_structures.video_hash import VideoHash
+from data_structures.video_metadata import VideoMetadata
+from data_structures.video_query_metadata import VideoQueryMetadata
+from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
+
+CHUNK_SIZE = 1 << 20  # bytes of a video read at once for its digest
+METADATA_FILE = "metadata.json"
+
+
+class HashCache:
+    """
+    Persistent cache of video hashes addressed by content, so re-runs, resumes of crashed runs and new hashers
+    process only what is missing.
+
+    An entry <cache_dir>/<key[:2]>/<key>/ is keyed by the video digest (size and blake2b of the whole file, so renamed and copied
+    videos hit too and a video edited in place misses), the segment, the sampling interval and the resolution of keyframes.
+    It stores metadata.json and <hasher name>_<digest of hasher parameters>.npz per hasher.
+    Entries are evicted least recently used first (mtime of the entry directory is updated on a hit)
+    when the cache grows over max_bytes. Several processes may share a cache: files are written atomically,
+    the size limit is kept by every process for the entries it knows
+    """
+
+    def __init__(
+        self, cache_dir: str, logger: logging.Logger, hashers: List[AbstractFrameHasher], max_bytes: int, interval: float = 0.5, resolution: int = 0
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.logger = logger
+        self.max_bytes = max_bytes
+        self.params = {"interval": interval, "resolution": resolution}
+        self.hash_names = [hasher.name for hasher in hashers]
+        self.hasher_files = {hasher.name: f"{hasher.name}_{self.hasher_digest(hasher)}.npz" for hasher in hashers}
+        self.stats = {hasher.name: HashCacheStats(hash_name=hasher.name, hits=0, misses=0) for hasher in hashers}
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.entries: Dict[str, Tuple[float, int]] = {}  # entry directory -> (last use, bytes)
+        for prefix in os.scandir(cache_dir):
+            for entry in os.scandir(prefix.path) if prefix.is_dir() else []:
+                self.entries[entry.path] = (entry.stat().st_mtime, sum(f.stat().st_size for f in os.scandir(entry.path)))
+
+        self.size = sum(size for _, size in self.entries.values())
+
+    @staticmethod
+    def hasher_digest(hasher: AbstractFrameHasher) -> str:
+        """
+        Digest of scalar parameters of the hasher (hash_size, mode, vector_size...), changed parameters miss the cache
+        """
+        params = {name: value for name, value in vars(hasher).items() if isinstance(value, (bool, int, float, str))}
+        return hashlib.blake2b(f"{type(hasher).__name__}{sorted(params.items())}".encode("utf-8"), digest_size=8).hexdigest()
+
+    def entry_dir(self, video_path: str, start_time: Optional[str] = None, end_time: Optional[str] = None) -> Optional[str]:
+        try:
+            size = os.path.getsize(video_path)
+            digest = hashlib.blake2b(f"{size}{start_time}{end_time}{sorted(self.params.items())}".encode("utf-8"), digest_size=20)
+
+            with open(video_path, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+        except OSError as e:
+            self.logger.error(f"Cannot read {video_path} for hash cache: {e}")
+            return None
+
+        key = digest.hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, video_path: str, start_time: Optional[str] = None, end_time: Optional[str] = None) -> Tuple[Optional[VideoMetadata], Dict[str, VideoHash]]:
+        """
+        Cached metadata and hashes of the video (or its segment) by hasher name, only found hashers are returned
+        """
+        entry_dir = self.entry_dir(video_path, start_time, end_time)
+        metadata, hashes = None, {}
+
+        if entry_dir is not None and os.path.exists(os.path.join(entry_dir, METADATA_FILE)):
+            try:
+                metadata = self.__load_metadata(entry_dir, video_path)
+                for name, filename in self.hasher_files.items():
+                    if os.path.exists(os.path.join(entry_dir, filename)):
+                        hashes[name] = self.__load_hash(os.path.join(entry_dir, filename), video_path)
+
+                os.utime(entry_dir)
+                self.entries[entry_dir] = (os.path.getmtime(entry_dir), self.entries.get(entry_dir, (0.0, 0))[1])
+            except (OSError, ValueError, KeyError, TypeError) as e:  # evicted by another process or broken entry
+                self.logger.warning(f"Broken hash cache entry {entry_dir} of {video_path}: {e}")
+                metadata, hashes = None, {}
+
+        for name, stats in self.stats.items():
+            if name in hashes:
+                stats.hits += 1
+            else:
+                stats.misses += 1
+
+        return metadata, hashes
+
+    def put(self, video_path: str, start_time: Optional[str], end_time: Optional[str], metadata: VideoMetadata, name2hash: Dict[str, VideoHash]) -> None:
+        entry_dir = self.entry_dir(video_path, start_time, end_time)
+        if entry_dir is None:
+            return
+
+        os.makedirs(entry_dir, exist_ok=True)
+        self.__write_atomic(os.path.join(entry_dir, METADATA_FILE), json.dumps(metadata.__dict__).encode("utf-8"))
+
+        for name, video_hash in name2hash.items():
+            with open(os.path.join(entry_dir, f"{self.hasher_files[name]}.tmp{os.getpid()}"), "wb") as f:
+                np.savez(f, vecs=video_hash.vecs, timecodes=video_hash.timecodes)
+
+            os.replace(f.name, os.path.join(entry_dir, self.hasher_files[name]))
+
+        entry_size = sum(f.stat().st_size for f in os.scandir(entry_dir))
+        self.size += entry_size - self.entries.get(entry_dir, (0.0, 0))[1]
+        self.entries[entry_dir] = (os.path.getmtime(entry_dir), entry_size)
+        self.__evict(keep=entry_dir)
+
+    def report(self, path: str) -> List[HashCacheStats]:
+        """
+        Write hit and miss counts per hasher to csv
+        """
+        with open(path, "w", newline="") as f:
+            csv_writer = csv.writer(f, delimiter=",")
+            csv_writer.writerow(HashCacheStats.to_csv_header())
+            for stats in self.stats.values():
+                csv_writer.writerow(stats.to_csv())
+
+        return list(self.stats.values())
+
+    def __evict(self, keep: str) -> None:
+        for entry_dir, _ in sorted(self.entries.items(), key=lambda item: item[1][0]):
+            if self.size <= self.max_bytes:
+                break
+
+            if entry_dir == keep:
+                continue
+
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            self.size -= self.entries.pop(entry_dir)[1]
+            self.evictions += 1
+
+    @staticmethod
+    def __write_atomic(path: str, data: bytes) -> None:
+        with open(f"{path}.tmp{os.getpid()}", "wb") as f:
+            f.write(data)
+
+        os.replace(f.name, path)
+
+    @staticmethod
+    def __load_metadata(entry_dir: str, video_path: str) -> VideoMetadata:
+        with open(os.path.join(entry_dir, METADATA_FILE), "r", encoding="utf-8") as f:
+            fields = json.load(f)
+
+        fields["filename"] = video_path  # the same content may be cached under another path
+        return VideoQueryMetadata(**fields) if "start_time" in fields else VideoMetadata(**fields)
+
+    @staticmethod
+    def __load_hash(path: str, video_path: str) -> VideoHash:
+        with np.load(path) as data:  # nothing is computed for a cached hash, time*.csv gets zero time
+            return VideoHash(filename=video_path, vecs=data["vecs"], timecodes=data["timecodes"], elapsed_time=0.0, full_elapsed_time=0.0)
@@ -0,0 +1,163 @@
+import glob
+import json
+import os
+import struct
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from data_structures.hash_store_data import HashStoreData
+from data_structures.video_hash import VideoHash
+
+MAGIC = b"VHS1"
+HEADER = struct.Struct("<4sIB")  # magic, vector_size, packed
+RECORD = struct.Struct("<HHI")  # length of key, length of filename, number of frames
+
+
+class HashStore:
+    """
+    Compact appendable binary storage of video hashes of one hash function, replaces one json file per video.
+
+    File hash_store{suffix}.bin starts with a header (magic, vector_size, packed) followed by one record per video:
+    key and filename (utf-8), float64 timecodes, uint8 vectors (bits are packed with np.packbits if packed).
+    Every writer (bucket, worker pool) appends to its own file, all files of a directory are read together.
+    If a video is stored several times (re-run), the last record wins, compact() drops older records of a file after a run
+    """
+
+    def __init__(self, hashes_dir: str, vector_size: int, packed: bool, suffix: str = "") -> None:
+        self.hashes_dir = hashes_dir
+        self.vector_size = vector_size
+        self.packed = packed
+        self.path = os.path.join(hashes_dir, f"hash_store{suffix}.bin")
+
+    def append(self, key: str, video_hash: VideoHash) -> None:
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+
+        if not new_file:
+            with open(self.path, "rb") as f:
+                header = HEADER.unpack(f.read(HEADER.size))
+
+            if header != (MAGIC, self.vector_size, self.packed):
+                raise ValueError(f"Hash store {self.path} has other format: {header}")
+
+        vecs = np.packbits(video_hash.vecs, axis=1) if self.packed else video_hash.vecs
+        key_bytes = key.encode("utf-8")
+        filename_bytes = video_hash.filename.encode("utf-8")
+
+        with open(self.path, "ab") as f:
+            if new_file:
+                f.write(HEADER.pack(MAGIC, self.vector_size, self.packed))
+
+            f.write(RECORD.pack(len(key_bytes), len(filename_bytes), len(vecs)))
+            f.write(key_bytes)
+            f.write(filename_bytes)
+            f.write(np.ascontiguousarray(video_hash.timecodes, dtype="<f8").tobytes())
+            f.write(np.ascontiguousarray(vecs, dtype=np.uint8).tobytes())
+
+    @staticmethod
+    def exists(hashes_dir: str) -> bool:
+        return len(glob.glob(os.path.join(hashes_dir, "hash_store*.bin"))) > 0
+
+    def compact(self) -> int:
+        """
+        Keep only the last record of every key in the store file, re-runs append the same videos again.
+        The file is rewritten atomically (only if it has older records), returns the number of dropped records
+        """
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return 0
+
+        with open(self.path, "rb") as f:
+            buffer = f.read()
+
+        spans: Dict[str, Tuple[int, int]] = {}
+        records = 0
+        for key, _, _, _, start, end in HashStore.__records(self.path, buffer):
+            spans.pop(key, None)  # records stay in the order of their last append
+            spans[key] = (start, end)
+            records += 1
+
+        if records == len(spans):
+            return 0
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer[: HEADER.size])
+            for start, end in spans.values():
+                f.write(buffer[start:end])
+
+        os.replace(tmp_path, self.path)
+        return records - len(spans)
+
+    @staticmethod
+    def __records(path: str, buffer: bytes) -> Iterator[Tuple[str, str, np.ndarray, np.ndarray, int, int]]:
+        """
+        Records of a store file: key, filename, timecodes, unpacked vectors and the position of the record in the file
+        """
+        magic, vector_size, packed = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a hash store")
+
+        row_bytes = (vector_size + 7) // 8 if packed else vector_size
+        position = HEADER.size
+
+        while position < len(buffer):
+            start = position
+            key_len, filename_len, frames = RECORD.unpack_from(buffer, position)
+            position += RECORD.size
+
+            key = buffer[position: position + key_len].decode("utf-8")
+            position += key_len
+            filename = buffer[position: position + filename_len].decode("utf-8")
+            position += filename_len
+
+            timecodes = np.frombuffer(buffer, dtype="<f8", count=frames, offset=position)
+            position += 8 * frames
+            vecs = np.frombuffer(buffer, dtype=np.uint8, count=frames * row_bytes, offset=position).reshape(frames, row_bytes)
+            position += frames * row_bytes
+
+            if packed:
+                vecs = np.unpackbits(vecs, axis=1, count=vector_size)
+
+            yield key, filename, timecodes, vecs, start, position
+
+    @staticmethod
+    def load(hashes_dir: str) -> HashStoreData:
+        """
+        Read all store files of the directory, videos are sorted by key
+        """
+        records: Dict[str, Tuple[str, np.ndarray, np.ndarray]] = {}
+        vector_size = 0
+
+        for path in sorted(glob.glob(os.path.join(hashes_dir, "hash_store*.bin"))):
+            with open(path, "rb") as f:
+                buffer = f.read()
+
+            vector_size = HEADER.unpack_from(buffer)[1]
+            for key, filename, timecodes, vecs, _, _ in HashStore.__records(path, buffer):
+                records[key] = (filename, timecodes, vecs)
+
+        keys = sorted(records)
+        frames_per_video = [len(records[key][1]) for key in keys]
+
+        return HashStoreData(
+            keys=keys,
+            filenames=[records[key][0] for key in keys],
+            offsets=np.concatenate([[0], np.cumsum(frames_per_video, dtype=np.int64)]).astype(np.int64),
+            timecodes=np.concatenate([records[key][1] for key in keys]) if keys else np.empty(0, dtype=np.float64),
+            vecs=np.concatenate([records[key][2] for key in keys]) if keys else np.empty((0, vector_size), dtype=np.uint8),
+        )
+
+    @staticmethod
+    def load_frames(hashes_dir: str) -> Dict[str, List[Dict]]:
+        """
+        Frames ({"vec", "timecode"}) of every video by key, read from hash store or from json files saved before it
+        """
+        if HashStore.exists(hashes_dir):
+            data = HashStore.load(hashes_dir)
+            return {key: data.to_frames(i) for i, key in enumerate(data.keys)}
+
+        videos = {}
+        for json_path in glob.glob(os.path.join(hashes_dir, "*.json")):
+            with open(json_path, "r") as f:
+                videos[os.path.basename(json_path)[:-5]] = json.load(f)["frames"]
+
+        return videos
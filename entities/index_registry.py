@@ -0,0 +1,97 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from data_structures.annoy_config import AnnoyConfig
+from data_structures.annoy_db import AnnoyDB
+from data_structures.index_load_stats import IndexLoadStats
+from entities.annoy_processor import AnnoyProcessor
+from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
+
+
+class IndexRegistry:
+    """
+    Loads the database (index and db_index) of every hash function once, all searchers get the same read-only AnnoyDB.
+    In incremental mode the database consists of the full index, segments and exact search over new videos
+    """
+
+    def __init__(
+        self,
+        hashers: Dict[str, AbstractFrameHasher],
+        hashes_dir: str,
+        logger: logging.Logger,
+        bucket: int,
+        threads: int,
+        incremental: bool = False,
+        configs: Optional[Dict[str, AnnoyConfig]] = None,
+    ) -> None:
+        self.hashers = hashers
+        self.configs = configs or {}
+        self.incremental = incremental
+        self.hashes_dir = hashes_dir
+        self.logger = logger
+        self.bucket = bucket
+        self.threads = threads
+        self.databases: Dict[str, AnnoyDB] = {}
+        self.stats: Dict[str, IndexLoadStats] = {}
+        self.lock = threading.Lock()
+
+    def get(self, hash_name: str) -> AnnoyDB:
+        with self.lock:
+            if hash_name not in self.databases:
+                self.databases[hash_name], self.stats[hash_name] = self.__load(hash_name)
+
+            self.stats[hash_name].searchers += 1
+            return self.databases[hash_name]
+
+    def check(self, hash_name: str) -> bool:
+        """
+        The index of the hash function is built (not needed in incremental mode: new videos are searched exactly),
+        otherwise logs how to build it
+        """
+        if self.incremental:
+            return True
+
+        annoy_processor = AnnoyProcessor(
+            hasher=self.hashers[hash_name], logger=self.logger, bucket=self.bucket, threads=self.threads, config=self.configs.get(hash_name)
+        )
+        return annoy_processor.check_index(os.path.join(self.hashes_dir, hash_name))
+
+    def reload(self, hash_name: str) -> AnnoyDB:
+        """
+        Load the database again (e.g. after new segments are built), searchers have to be given the new AnnoyDB
+        """
+        annoy_db, stats = self.__load(hash_name)
+        with self.lock:
+            stats.searchers = self.stats[hash_name].searchers if hash_name in self.stats else 0
+            self.databases[hash_name], self.stats[hash_name] = annoy_db, stats
+
+        return annoy_db
+
+    def __load(self, hash_name: str) -> Tuple[AnnoyDB, IndexLoadStats]:
+        hashes_path = os.path.join(self.hashes_dir, hash_name)
+        annoy_processor = AnnoyProcessor(
+            hasher=self.hashers[hash_name], logger=self.logger, bucket=self.bucket, threads=self.threads, config=self.configs.get(hash_name)
+        )
+
+        start_timer = time.perf_counter()
+        annoy_db = annoy_processor.load_annoy_db_from_disk(hashes_path, incremental=self.incremental)
+        annoy_db.db_index.flags.writeable = False
+
+        stats = IndexLoadStats(
+            hash_name=hash_name,
+            items=len(annoy_db.db_index),
+            index_bytes=annoy_db.frame_index.size(),
+            db_index_bytes=annoy_db.db_index.nbytes,
+            load_time=time.perf_counter() - start_timer,
+            searchers=0,
+        )
+        self.logger.info(f"Annoy index successfully loaded: {hashes_path} {stats}")
+
+        return annoy_db, stats
+
+    def report(self) -> List[IndexLoadStats]:
+        with self.lock:
+            return list(self.stats.values())
@@ -0,0 +1,152 @@
+import glob
+import json
+import logging
+import os
+import shutil
+from typing import Optional, Tuple
+
+import numpy as np
+from data_structures.hash_store_data import HashStoreData
+from data_structures.landmark_config import LandmarkConfig
+from data_structures.landmark_db import LandmarkDB
+from entities.annoy_processor import DB_INDEX_DTYPE
+from entities.hash_store import HashStore
+from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
+
+LANDMARKS_DIR = "landmarks"
+GAP_BITS = 8
+
+
+class LandmarkProcessor:
+    """
+    Inverted index of landmarks like Shazam. Every frame hash is split into bands (fixed subsets of bits),
+    a landmark key is a band of an anchor frame, the same band of one of the next fan_out frames and the quantized time gap
+    between them (or the band of a single frame if fan_out is 0). Postings of a key are db_index rows of anchor frames.
+
+    Keys are sorted and saved with postings and db_index to hashes_path/landmarks, all files are memory-mapped on load
+    """
+
+    def __init__(self, hasher: AbstractFrameHasher, logger: logging.Logger, bucket: int, config: Optional[LandmarkConfig] = None) -> None:
+        self.hasher = hasher
+        self.config = config or LandmarkConfig()
+        self.logger = logger
+        self.bucket = bucket
+
+    @staticmethod
+    def to_bits(hasher: AbstractFrameHasher, vecs: np.ndarray) -> np.ndarray:
+        """
+        (N, bits) 0/1 matrix: bits of binary hashes, unpacked bytes of hamming hashes, values above the median for euclidean ones
+        """
+        vecs = np.asarray(vecs, dtype=np.uint8)
+        if hasher.binary:
+            return vecs
+
+        if hasher.metric == "hamming":
+            return np.unpackbits(vecs, axis=-1)
+
+        return (vecs > np.median(vecs, axis=-1, keepdims=True)).astype(np.uint8)
+
+    @staticmethod
+    def landmarks(bits: np.ndarray, timecodes: np.ndarray, offsets: np.ndarray, config: LandmarkConfig) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        uint64 keys of all landmarks of videos (frames of i-th video are offsets[i]:offsets[i + 1]) and their anchor frames
+        """
+        width = min(config.band_bits, bits.shape[1] // config.bands)
+        if (config.bands - 1).bit_length() + 2 * width + GAP_BITS > 64:
+            raise ValueError(f"Landmark keys of {config} don't fit 64 bits")
+
+        # band j takes every bands-th of bits spread over the whole hash
+        positions = np.linspace(0, bits.shape[1], config.bands * width, endpoint=False).astype(np.int64).reshape(width, config.bands).T
+        powers = np.uint64(1) << np.arange(width, dtype=np.uint64)[::-1]
+        band_ids = np.arange(config.bands, dtype=np.uint64) << np.uint64(width)
+        bands = band_ids | (bits[:, positions].astype(np.uint64) * powers).sum(axis=-1, dtype=np.uint64)  # (N, bands)
+
+        if config.fan_out == 0:
+            return bands.ravel(), np.repeat(np.arange(len(bits)), config.bands)
+
+        video = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        keys, anchors = [], []
+        for step in range(1, config.fan_out + 1):
+            anchor = np.arange(len(bits) - step)
+            anchor = anchor[video[anchor] == video[anchor + step]]
+            gap = np.clip(np.rint((timecodes[anchor + step] - timecodes[anchor]) / config.gap_step), 0, (1 << GAP_BITS) - 1).astype(np.uint64)
+
+            pair = (bands[anchor] << np.uint64(width)) | (bands[anchor + step] & np.uint64((1 << width) - 1))
+            keys.append(((pair << np.uint64(GAP_BITS)) | gap[:, np.newaxis]).ravel())
+            anchors.append(np.repeat(anchor, config.bands))
+
+        return np.concatenate(keys), np.concatenate(anchors)
+
+    def load_hashes(self, hashes_path: str) -> HashStoreData:
+        if HashStore.exists(hashes_path):
+            return HashStore.load(hashes_path)
+
+        videos = []  # hashes saved before hash store was introduced
+        for json_path in sorted(glob.glob(os.path.join(hashes_path, "*.json"))):
+            with open(json_path, "r") as f:
+                data = json.load(f)
+
+            videos.append((os.path.basename(json_path)[:-5], data["filename"], data["frames"]))
+
+        frames = [frame for _, _, video_frames in videos for frame in video_frames]
+        return HashStoreData(
+            keys=[key for key, _, _ in videos],
+            filenames=[filename for _, filename, _ in videos],
+            offsets=np.concatenate([[0], np.cumsum([len(video_frames) for _, _, video_frames in videos], dtype=np.int64)]).astype(np.int64),
+            timecodes=np.array([frame["timecode"] for frame in frames], dtype=np.float64),
+            vecs=np.array([frame["vec"] for frame in frames], dtype=np.uint8).reshape(len(frames), -1),
+        )
+
+    def create_landmark_db(self, hashes_path: str) -> LandmarkDB:
+        data = self.load_hashes(hashes_path)
+        keys, anchors = self.landmarks(self.to_bits(self.hasher, data.vecs), data.timecodes, data.offsets, self.config)
+        order = np.argsort(keys, kind="stable")
+
+        db_index = np.empty(len(data.timecodes), dtype=DB_INDEX_DTYPE)
+        frames_per_video = np.diff(data.offsets)
+        db_index["filename_id"] = np.repeat(np.arange(len(data.filenames)), frames_per_video)
+        db_index["frame"] = np.arange(len(data.timecodes)) - np.repeat(data.offsets[:-1], frames_per_video)
+        db_index["timecode"] = data.timecodes
+
+        landmarks_path = os.path.join(hashes_path, LANDMARKS_DIR)
+        tmp_path = os.path.join(hashes_path, f".tmp_{LANDMARKS_DIR}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        np.save(os.path.join(tmp_path, "landmark_keys.npy"), keys[order])
+        np.save(os.path.join(tmp_path, "landmark_items.npy"), anchors[order].astype(np.int32))
+        np.save(os.path.join(tmp_path, "db_index.npy"), db_index)
+        with open(os.path.join(tmp_path, "db_index_filenames.json"), "w", encoding="utf-8") as f:
+            json.dump(data.filenames, f)
+
+        with open(os.path.join(tmp_path, "landmark_config.json"), "w", encoding="utf-8") as f:
+            json.dump(self.config.to_json(), f)
+
+        shutil.rmtree(landmarks_path, ignore_errors=True)
+        os.rename(tmp_path, landmarks_path)
+        self.logger.info(f"Landmarks of {hashes_path}: frames={len(db_index)} postings={len(keys)} unique keys={len(np.unique(keys))}")
+
+        return self.load_landmark_db_from_disk(hashes_path)
+
+    def load_landmark_db_from_disk(self, hashes_path: str) -> Optional[LandmarkDB]:
+        """
+        Memory-map the landmark index, None if it isn't built (pre_search_process.py --landmarks)
+        """
+        landmarks_path = os.path.join(hashes_path, LANDMARKS_DIR)
+        if not os.path.exists(os.path.join(landmarks_path, "landmark_keys.npy")):
+            self.logger.error(f"{landmarks_path} doesn't exist, build it by pre_search_process.py --landmarks")
+            return None
+
+        with open(os.path.join(landmarks_path, "db_index_filenames.json"), "r", encoding="utf-8") as f:
+            filenames = json.load(f)
+
+        with open(os.path.join(landmarks_path, "landmark_config.json"), "r", encoding="utf-8") as f:
+            config = LandmarkConfig(**json.load(f))
+
+        return LandmarkDB(
+            keys=np.load(os.path.join(landmarks_path, "landmark_keys.npy"), mmap_mode="r"),
+            items=np.load(os.path.join(landmarks_path, "landmark_items.npy"), mmap_mode="r"),
+            db_index=np.load(os.path.join(landmarks_path, "db_index.npy"), mmap_mode="r"),
+            filenames=filenames,
+            config=config,
+        )
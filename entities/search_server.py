@@ -0,0 +1,247 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from data_structures.annoy_config import AnnoyConfig
+from data_structures.search_result import SearchResult
+from entities.annoy_processor import AnnoyProcessor
+from entities.index_registry import IndexRegistry
+from entities.video_processor import VideoProcessor
+from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
+
+
+class SearchServer:
+    """
+    Local HTTP search service. Annoy indexes and db_index of every hash function are loaded (mmap) once at start
+    and shared by all search algorithms and request threads.
+
+    Endpoints (JSON bodies):
+        POST /search        {"hash", "search", "frames": [{"vec", "timecode"}, ...], "topk"} - precomputed hashes of a query
+        POST /search_video  {"video_path", "start_time", "end_time", "hash", "search", "topk"} - query clip on the server disk,
+                            "hash" and "search" may be lists, all by default
+        POST /merge         index new videos of hash stores as segments in a background thread and reload the databases
+                            (with incremental=True, new videos are searched exactly until then)
+        GET  /metrics       number of requests, errors and latency percentiles (seconds) per endpoint, load stats of indexes
+    """
+
+    def __init__(
+        self,
+        hashers: Dict[str, AbstractFrameHasher],
+        searchers: Dict[str, Callable],
+        hashes_dir: str,
+        logger: logging.Logger,
+        threads: int,
+        sparse: bool = False,
+        resolution: int = 0,
+        incremental: bool = False,
+        max_segments: int = 8,
+        latency_window: int = 10000,
+        configs: Optional[Dict[str, AnnoyConfig]] = None,
+    ) -> None:
+        self.hashers = hashers
+        self.configs = configs or {}
+        self.hashes_dir = hashes_dir
+        self.max_segments = max_segments
+        self.logger = logger
+        self.threads = threads
+        self.search_engines: Dict[str, Dict[str, Any]] = {}
+        self.index_registry = IndexRegistry(
+            hashers=hashers, hashes_dir=hashes_dir, logger=logger, bucket=0, threads=threads, incremental=incremental, configs=self.configs
+        )
+
+        for hash_name in hashers:
+            for search_name, searcher in searchers.items():
+                self.search_engines.setdefault(search_name, {})[hash_name] = searcher(
+                    annoy_db=self.index_registry.get(hash_name), logger=logger, bucket=0, threads=threads, k=self.configs.get(hash_name, AnnoyConfig()).k
+                )
+
+        # opencv hashers and reused frame buffers are not thread-safe, query clips are hashed one by one
+        self.video_processor = VideoProcessor(
+            hashers=list(hashers.values()), logger=logger, bucket=0, threads=threads, sparse=sparse, resolution=resolution
+        )
+        self.video_lock = threading.Lock()
+        self.merge_thread: Optional[threading.Thread] = None
+
+        self.metrics_lock = threading.Lock()
+        self.latencies: Dict[str, deque] = {}
+        self.requests: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.latency_window = latency_window
+
+    def search_frames(self, hash_name: str, search_name: str, frames: List[Dict], topk: int = 10, name: str = "") -> SearchResult:
+        start_timer = time.perf_counter()
+        results = self.search_engines[search_name][hash_name].process_frames(frames, topk=topk)
+
+        return SearchResult(filename_timestamp=name, results=results, elapsed_time=time.perf_counter() - start_timer)
+
+    def search_video(
+        self, video_path: str, start_time: Optional[str], end_time: Optional[str], hash_names: List[str], search_names: List[str], topk: int = 10
+    ) -> Optional[Dict[str, Dict[str, SearchResult]]]:
+        with self.video_lock:
+            processed = self.video_processor.process(video_path=video_path, start_time=start_time, end_time=end_time)
+
+        if not processed:
+            return None
+
+        _, name2hash = processed
+        results = {}
+        for search_name in search_names:
+            for hash_name in hash_names:
+                video_hash = name2hash[hash_name]
+                frames = [{"vec": vec, "timecode": timecode} for vec, timecode in zip(video_hash.vecs, video_hash.timecodes.tolist())]
+                results.setdefault(search_name, {})[hash_name] = self.search_frames(hash_name, search_name, frames, topk, name=video_path)
+
+        return results
+
+    def merge(self) -> bool:
+        """
+        Start building segments of new videos in background, returns False if the previous merge is still running
+        """
+        if self.merge_thread and self.merge_thread.is_alive():
+            return False
+
+        self.merge_thread = threading.Thread(target=self.__merge, daemon=True)
+        self.merge_thread.start()
+        return True
+
+    def __merge(self) -> None:
+        for hash_name, hasher in self.hashers.items():
+            annoy_processor = AnnoyProcessor(hasher=hasher, logger=self.logger, bucket=0, threads=self.threads, config=self.configs.get(hash_name))
+            try:
+                videos = annoy_processor.create_segment(os.path.join(self.hashes_dir, hash_name), max_segments=self.max_segments)
+                annoy_db = self.index_registry.reload(hash_name)
+            except Exception as e:
+                self.logger.error(f"Exception {e} on merge of {hash_name}")
+                continue
+
+            for search_engines in self.search_engines.values():
+                search_engines[hash_name].annoy_db = annoy_db  # requests in progress finish with the previous database
+
+            self.logger.info(f"Merged {hash_name}: new {videos=}")
+
+    def record(self, endpoint: str, elapsed_time: float, error: bool) -> None:
+        with self.metrics_lock:
+            self.latencies.setdefault(endpoint, deque(maxlen=self.latency_window)).append(elapsed_time)
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + int(error)
+
+    def metrics(self) -> dict:
+        with self.metrics_lock:
+            latencies = {endpoint: np.array(values) for endpoint, values in self.latencies.items()}
+            requests = dict(self.requests)
+            errors = dict(self.errors)
+
+        endpoints = {
+            endpoint: {
+                "requests": requests[endpoint],
+                "errors": errors[endpoint],
+                "mean": float(values.mean()),
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+                "p99": float(np.percentile(values, 99)),
+                "max": float(values.max()),
+            }
+            for endpoint, values in latencies.items()
+        }
+
+        return {**endpoints, "indexes": [stats.to_json() for stats in self.index_registry.report()]}
+
+    def serve(self, host: str, port: int) -> None:
+        server = ThreadingHTTPServer((host, port), SearchRequestHandler)
+        server.search_server = self
+        self.logger.info(f"Search server is listening on http://{host}:{port}")
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.logger.info("Search server is stopped")
+        finally:
+            server.server_close()
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so load tests measure search and not tcp handshakes
+
+    def do_GET(self) -> None:  # noqa: N802 name is required by BaseHTTPRequestHandler
+        if self.path != "/metrics":
+            self.send_json(404, {"error": f"Unknown endpoint {self.path}"})
+            return
+
+        self.send_json(200, self.server.search_server.metrics())
+
+    def do_POST(self) -> None:  # noqa: N802
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))  # read anyway, connection is kept alive
+        handlers = {"/search": self.handle_search, "/search_video": self.handle_search_video, "/merge": self.handle_merge}
+        if self.path not in handlers:
+            self.send_json(404, {"error": f"Unknown endpoint {self.path}"})
+            return
+
+        start_timer = time.perf_counter()
+        try:
+            status, response = handlers[self.path](json.loads(body))
+        except (ValueError, KeyError, TypeError) as e:
+            status, response = 400, {"error": f"Bad request: {e!r}"}
+        except Exception as e:
+            self.server.search_server.logger.error(f"Exception {e} on {self.path}")
+            status, response = 500, {"error": repr(e)}
+
+        elapsed_time = time.perf_counter() - start_timer
+        self.server.search_server.record(self.path, elapsed_time, error=status >= 400)
+
+        response["elapsed_time"] = elapsed_time
+        self.send_json(status, response)
+
+    def handle_search(self, request: dict) -> tuple:
+        search_result = self.server.search_server.search_frames(
+            hash_name=request["hash"],
+            search_name=request.get("search", "Shazam"),
+            frames=request["frames"],
+            topk=request.get("topk", 10),
+            name=request.get("name", ""),
+        )
+
+        return 200, {**search_result.to_json(), "search_time": search_result.elapsed_time}
+
+    def handle_search_video(self, request: dict) -> tuple:
+        search_server = self.server.search_server
+        hash_names = request.get("hash", list(search_server.hashers))
+        search_names = request.get("search", list(search_server.search_engines))
+
+        results = search_server.search_video(
+            video_path=request["video_path"],
+            start_time=request.get("start_time"),
+            end_time=request.get("end_time"),
+            hash_names=[hash_names] if isinstance(hash_names, str) else hash_names,
+            search_names=[search_names] if isinstance(search_names, str) else search_names,
+            topk=request.get("topk", 10),
+        )
+        if results is None:
+            return 422, {"error": f"Can't process video {request['video_path']}"}
+
+        return 200, {
+            search_name: {hash_name: {**result.to_json(), "search_time": result.elapsed_time} for hash_name, result in name2result.items()}
+            for search_name, name2result in results.items()
+        }
+
+    def handle_merge(self, request: dict) -> tuple:
+        if not self.server.search_server.merge():
+            return 409, {"error": "Previous merge is still running"}
+
+        return 202, {"started": True}
+
+    def send_json(self, status: int, response: dict) -> None:
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, message_format: str, *args: object) -> None:
+        self.server.search_server.logger.debug(f"{self.address_string()} {message_format % args}")
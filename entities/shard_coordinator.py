@@ -0,0 +1,134 @@
+import logging
+import multiprocessing
+import threading
+from multiprocessing.connection import Client, Connection
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from data_structures.annoy_config import AnnoyConfig
+from data_structures.search_item_result import SearchItemResult
+from entities.shard_worker import _serve_local_shard
+from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
+from search_algorithms.shazam_search import ShazamSearch
+
+
+class ShardCoordinator:
+    """
+    Scatter-gather search over shards of a database (see AnnoyProcessor.create_shards and ShardWorker).
+    Vectors of all query frames are sent to every shard at once, then the k nearest neighbours of every frame
+    are merged across shards by distance and ranked by ShazamSearch voting in the coordinator.
+    Equal distances are merged in order of (filename, timecode) as items are numbered in every index (AnnoyProcessor.by_filename),
+    so merged neighbours are the same as neighbours of one index of all videos and results are equal to the single index
+    (for exact neighbours of shards). Votes are not summed by shards: a shard doesn't know which of its neighbours
+    are in the top-k of the frame across all shards.
+
+    Has the same process_frames as ShazamSearch, connections are used by one request at a time
+    """
+
+    def __init__(self, connections: List[Connection], logger: logging.Logger, processes: Optional[List[multiprocessing.Process]] = None, k: int = 10) -> None:
+        self.connections = connections
+        self.logger = logger
+        self.processes = processes or []
+        self.k = k
+        self.lock = threading.Lock()
+
+        shard_filenames = self.request("filenames")
+        self.filenames = [filename for filenames in shard_filenames for filename in filenames]
+        self.filename_offsets = np.cumsum([0] + [len(filenames) for filenames in shard_filenames[:-1]])
+        self.filename_ranks = np.argsort(np.argsort(self.filenames, kind="stable"), kind="stable")  # position of file id in sorted filenames
+
+        self.logger.info(f"Connected shards={len(connections)} videos={len(self.filenames)}")
+
+    @staticmethod
+    def start_local(
+        hashers_factory: Callable[[], Dict[str, AbstractFrameHasher]],
+        hash_name: str,
+        shard_paths: List[str],
+        logger: logging.Logger,
+        threads: int,
+        config: Optional[AnnoyConfig] = None,
+    ) -> "ShardCoordinator":
+        """
+        Start a worker process for every shard, connected by pipes
+        """
+        config = config or AnnoyConfig()
+        connections = []
+        processes = []
+        for shard_path in shard_paths:
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_serve_local_shard,
+                args=(worker_connection, hashers_factory, hash_name, shard_path, logger, threads, config),
+                daemon=True,
+            )
+            process.start()
+            worker_connection.close()
+            connections.append(connection)
+            processes.append(process)
+
+        return ShardCoordinator(connections=connections, logger=logger, processes=processes, k=config.k)
+
+    @staticmethod
+    def connect(addresses: List[Tuple[str, int]], authkey: bytes, logger: logging.Logger, k: int = 10) -> "ShardCoordinator":
+        """
+        Connect to shard servers (scripts/shard_server.py) of other nodes
+        """
+        return ShardCoordinator(connections=[Client(address, authkey=authkey) for address in addresses], logger=logger, k=k)
+
+    def request(self, *request: object) -> list:
+        """
+        Send the request to all shards, then gather responses in order of shards
+        """
+        with self.lock:
+            for connection in self.connections:
+                connection.send(request)
+
+            responses = [connection.recv() for connection in self.connections]
+
+        for response in responses:
+            if isinstance(response, Exception):
+                raise response
+
+        return responses
+
+    def process_frames(self, frames: List[Dict[str, Any]], topk: int = 10) -> List[SearchItemResult]:
+        if not frames:
+            return []
+
+        vecs = np.array([frame["vec"] for frame in frames], dtype=np.uint8)
+        responses = self.request("search", vecs, self.k)
+
+        file_ids = np.concatenate([np.where(ids >= 0, ids + offset, -1) for (ids, _, _), offset in zip(responses, self.filename_offsets)], axis=1)
+        timecodes = np.concatenate([response[1] for response in responses], axis=1)
+        distances = np.concatenate([response[2] for response in responses], axis=1)
+
+        # k nearest of every frame across shards by (distance, filename, timecode), missing neighbours have inf distance and go last
+        filename_ranks = np.where(file_ids >= 0, self.filename_ranks[file_ids], len(self.filenames))
+        nearest = np.lexsort((timecodes, filename_ranks, distances), axis=1)[:, : self.k]
+        file_ids = np.take_along_axis(file_ids, nearest, axis=1)
+        timecodes = np.take_along_axis(timecodes, nearest, axis=1)
+        distances = np.take_along_axis(distances, nearest, axis=1)
+
+        found = file_ids >= 0
+        return ShazamSearch.rank(
+            frames=frames,
+            found=found,
+            file_ids=file_ids[found],
+            timecodes=timecodes[found],
+            distances=distances[found],
+            filenames=self.filenames,
+            topk=topk,
+        )
+
+    def close(self) -> None:
+        with self.lock:
+            for connection in self.connections:
+                try:
+                    connection.send(("close",))
+                except OSError:
+                    pass
+
+                connection.close()
+
+        for process in self.processes:
+            process.join()
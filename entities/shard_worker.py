@@ -0,0 +1,101 @@
+import logging
+import threading
+from multiprocessing.connection import AuthenticationError, Connection, Listener
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from data_structures.annoy_config import AnnoyConfig
+from entities.annoy_processor import AnnoyProcessor
+from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
+
+
+def _serve_local_shard(
+    connection: Connection,
+    hashers_factory: Callable[[], Dict[str, AbstractFrameHasher]],
+    hash_name: str,
+    shard_path: str,
+    logger: logging.Logger,
+    threads: int,
+    config: Optional[AnnoyConfig],
+) -> None:
+    # opencv hashers can't be pickled, so every shard process creates its own ones
+    shard_worker = ShardWorker(hasher=hashers_factory()[hash_name], shard_path=shard_path, logger=logger, bucket=0, threads=threads, config=config)
+    shard_worker.serve(connection)
+
+
+class ShardWorker:
+    """
+    One shard of a sharded database (index and db_index of a part of videos), answers requests of ShardCoordinator
+    over multiprocessing connections: a pipe of a local process or a listener of a shard server on another node.
+
+    Requests and responses (pickled by the connection):
+        ("filenames",)      -> filenames of the shard by filename_id
+        ("search", vecs, k) -> (file_ids, timecodes, distances): (frames, k) arrays of nearest neighbours of every vector,
+                               missing neighbours have file_id -1 and distance inf
+        ("close",)          -> the connection is closed
+    Exceptions are sent back as responses
+    """
+
+    def __init__(
+        self, hasher: AbstractFrameHasher, shard_path: str, logger: logging.Logger, bucket: int, threads: int, config: Optional[AnnoyConfig] = None
+    ) -> None:
+        self.shard_path = shard_path
+        self.logger = logger
+        annoy_processor = AnnoyProcessor(hasher=hasher, logger=logger, bucket=bucket, threads=threads, config=config)
+        self.annoy_db = annoy_processor.load_annoy_db_from_disk(shard_path)
+
+    def search(self, vecs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        ids, distances = self.annoy_db.frame_index.search_batch(vecs, k)
+
+        found = ids >= 0
+        found_metadata = self.annoy_db.db_index[ids[found]]
+        file_ids = np.full(ids.shape, -1, dtype=np.int64)
+        file_ids[found] = found_metadata["filename_id"]
+        timecodes = np.zeros(ids.shape, dtype=np.float64)
+        timecodes[found] = found_metadata["timecode"]
+
+        return file_ids, timecodes, distances
+
+    def handle(self, request: tuple) -> object:
+        if request[0] == "filenames":
+            return self.annoy_db.filenames
+
+        if request[0] == "search":
+            return self.search(request[1], request[2])
+
+        raise ValueError(f"Unknown request {request[0]}")
+
+    def serve(self, connection: Connection) -> None:
+        with connection:
+            while True:
+                try:
+                    request = connection.recv()
+                except EOFError:
+                    return
+
+                if request[0] == "close":
+                    return
+
+                try:
+                    response = self.handle(request)
+                except Exception as e:
+                    self.logger.error(f"Exception {e} on {request[0]} of {self.shard_path}")
+                    response = e
+
+                connection.send(response)
+
+    def listen(self, host: str, port: int, authkey: bytes) -> None:
+        """
+        Serve coordinators of other nodes, every connection in its own thread
+        """
+        with Listener((host, port), authkey=authkey) as listener:
+            self.logger.info(f"Shard {self.shard_path} is listening on {host}:{port}")
+
+            while True:
+                try:
+                    connection = listener.accept()
+                except AuthenticationError as e:
+                    self.logger.warning(f"Rejected connection: {e}")
+                    continue
+
+                threading.Thread(target=self.serve, args=(connection,), daemon=True).start()
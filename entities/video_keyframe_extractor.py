@@ -1,19 +1,75 @@
 import logging
+import math
 import os
-from typing import List, Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
 
 import cv2
+import numpy as np
 from data_structures.video_keyframe import VideoKeyframe
 from data_structures.video_metadata import VideoMetadata
+from entities.ffmpeg_frame_reader import FFmpegFrameReader
+from entities.frame_buffer_ring import FrameBufferRing
 
 
 class VideoKeyframeExtractor:
-    def __init__(self, logger: logging.Logger) -> None:
+    def __init__(self, logger: logging.Logger, threads: int = 1) -> None:
         self.logger = logger
+        self.ffmpeg_reader = FFmpegFrameReader(logger=logger, threads=threads)  # containers opencv can't open
 
-    def extract(self, filepath: str, original_filepath: str, interval: float = 0.5) -> Optional[Tuple[VideoMetadata, List[VideoKeyframe]]]:
+    def extract(
+        self,
+        filepath: str,
+        original_filepath: str,
+        interval: float = 0.5,
+        sparse: bool = False,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+    ) -> Optional[Tuple[VideoMetadata, List[VideoKeyframe]]]:
         """Choose one frame every 0.5 seconds
         Used logging with logger instance to catch almost all exceptions
+
+        If sparse is True, skipped frames are only grabbed (demuxed) without decoding pixels,
+        sampled frames and their timecodes are the same as in the default mode
+        """
+        processed = self.extract_stream(
+            filepath=filepath, original_filepath=original_filepath, interval=interval, sparse=sparse, start_time=start_time, end_time=end_time
+        )
+        if not processed:
+            return None
+
+        metadata, keyframes = processed
+
+        try:
+            frames = list(keyframes)
+        except Exception as e:
+            self.logger.error(f"Exception {e} on file {original_filepath}")
+            return None
+
+        return metadata, frames
+
+    def extract_stream(
+        self,
+        filepath: str,
+        original_filepath: str,
+        interval: float = 0.5,
+        sparse: bool = False,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        pipe: bool = False,
+        ring: Optional[FrameBufferRing] = None,
+        resolution: int = 0,
+    ) -> Optional[Tuple[VideoMetadata, Iterator[VideoKeyframe]]]:
+        """Same as extract, but keyframes are decoded lazily one by one,
+        so only one decoded frame is held in memory at once.
+        Exceptions of decoding are raised from the iterator, video is released when the iterator is exhausted or closed
+
+        If start_time and end_time (seconds) are set, only frames of [start_time, end_time) are decoded after a seek
+        (the same frames as ffmpeg -ss start_time -to end_time), metadata and timecodes are of the segment, timecodes start from 0.
+        If pipe is True or opencv can't open the file, frames are decoded by ffmpeg to a pipe (FFmpegFrameReader).
+        If ring is set, frames are decoded in place into its preallocated arrays:
+        a keyframe is overwritten ring.size keyframes later, so it must be copied to be held longer.
+        If resolution is set, keyframes are downscaled to resolution pixels on the short side (INTER_AREA) right after decoding,
+        metadata keeps the size of the video
         """
 
         # Check file is eligible for opencv open
@@ -21,11 +77,21 @@ class VideoKeyframeExtractor:
             self.logger.error(f"Video file does not exist: {original_filepath}")
             return None
 
-        video = cv2.VideoCapture(filepath)
+        video = None if pipe else cv2.VideoCapture(filepath)
 
-        if not video.isOpened():
-            self.logger.error(f"Cannot open video file {original_filepath}")
-            return None
+        if video is None or not video.isOpened():
+            if video is not None:
+                self.logger.warning(f"Cannot open video file {original_filepath} by opencv, it's decoded by ffmpeg")
+
+            return self.ffmpeg_reader.extract_stream(
+                filepath=filepath,
+                original_filepath=original_filepath,
+                interval=interval,
+                start_time=start_time,
+                end_time=end_time,
+                ring=ring,
+                resolution=resolution,
+            )
 
         try:
             fps = video.get(cv2.CAP_PROP_FPS)
@@ -39,31 +105,96 @@ class VideoKeyframeExtractor:
                 height=int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)),
                 frames_count=frames_count,
             )
+            if start_time is not None and end_time is not None:
+                metadata = self.__seek_segment(video, metadata, start_time, end_time)
         except Exception as e:
             self.logger.error(f"Exception {e} on file {original_filepath}")
+            video.release()
             return None
 
         frame_interval = int(fps * interval)
-        frames = self.__process_frames(video, metadata.frames_count, frame_interval, fps, original_filepath)
-        if frames is None:
-            return None
+        iter_frames = self.__iter_frames_sparse if sparse else self.__iter_frames
+        return metadata, iter_frames(video, metadata, frame_interval, ring or FrameBufferRing(0), metadata.keyframe_size(resolution))
 
-        video.release()
-        return metadata, frames
+    def __seek_segment(self, video: cv2.VideoCapture, metadata: VideoMetadata, start_time: float, end_time: float) -> VideoMetadata:
+        """
+        Move video to the first frame at or after start_time, returns metadata of frames before end_time
+        """
+        start_frame = min(metadata.frames_count, math.ceil(start_time * metadata.fps - 1e-6))
+        end_frame = min(metadata.frames_count, max(start_frame, math.ceil(end_time * metadata.fps - 1e-6)))
+
+        video.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        if int(video.get(cv2.CAP_PROP_POS_FRAMES)) != start_frame:  # container without accurate seek, skip frames without decoding
+            self.logger.warning(f"Inaccurate seek in {metadata.filename}, {start_frame} frames are skipped")
+            video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            for _ in range(start_frame):
+                video.grab()
+
+        return VideoMetadata(
+            filename=metadata.filename,
+            fps=metadata.fps,
+            duration=(end_frame - start_frame) / metadata.fps,
+            width=metadata.width,
+            height=metadata.height,
+            frames_count=end_frame - start_frame,
+        )
+
+    @staticmethod
+    def __read(
+        video: cv2.VideoCapture, metadata: VideoMetadata, ring: FrameBufferRing, decoded: FrameBufferRing, size: Tuple[int, int]
+    ) -> Optional[np.ndarray]:
+        """
+        Decode the next frame into the ring or, if it's downscaled to size=(width, height), into the decoded scratch array first.
+        None if the video has no more frames
+        """
+        shape = (metadata.height, metadata.width, 3)
+        if size == (metadata.width, metadata.height):
+            ret, frame = video.read(image=ring.take(shape))
+            return frame if ret else None
+
+        ret, frame = video.read(image=decoded.take(shape))
+        return cv2.resize(frame, size, dst=ring.take((size[1], size[0], 3)), interpolation=cv2.INTER_AREA) if ret else None
 
-    def __process_frames(self, video: cv2.VideoCapture, frames_count: int, frame_interval: int, fps: float, original_filepath: str) -> List[VideoKeyframe]:
-        frames = []
-        for frame_count in range(frames_count):
-            try:
-                ret, frame = video.read()
-            except Exception as e:
-                self.logger.error(f"Exception {e} on file {original_filepath}")
-                return None
+    def __iter_frames(
+        self, video: cv2.VideoCapture, metadata: VideoMetadata, frame_interval: int, ring: FrameBufferRing, size: Tuple[int, int]
+    ) -> Iterator[VideoKeyframe]:
+        decoded = FrameBufferRing(min(1, ring.size))  # skipped frames and frames before downscaling are decoded into one scratch array
+
+        try:
+            for frame_count in range(metadata.frames_count):
+                if frame_count % frame_interval != 0:
+                    if not video.read(image=decoded.take((metadata.height, metadata.width, 3)))[0]:
+                        break  # CAP_PROP_FRAME_COUNT may be larger than real number of frames
+
+                    continue
+
+                frame = self.__read(video, metadata, ring, decoded, size)
+                if frame is None:
+                    break
+
+                timestamp = frame_count / metadata.fps
+                yield VideoKeyframe(frame=frame, timecode=round(2 * timestamp, 2) / 2)
+        finally:
+            video.release()
+
+    def __iter_frames_sparse(
+        self, video: cv2.VideoCapture, metadata: VideoMetadata, frame_interval: int, ring: FrameBufferRing, size: Tuple[int, int]
+    ) -> Iterator[VideoKeyframe]:
+        decoded = FrameBufferRing(min(1, ring.size))
+
+        try:
+            for frame_count in range(metadata.frames_count):
+                if frame_count % frame_interval != 0:
+                    if not video.grab():  # skip frame without retrieving (decoding to BGR) it
+                        break  # CAP_PROP_FRAME_COUNT may be larger than real number of frames
 
-            if frame_count % frame_interval != 0:
-                continue
+                    continue
 
-            timestamp = frame_count / fps
-            frames.append(VideoKeyframe(frame=frame, timecode=round(2 * timestamp, 2) / 2))
+                frame = self.__read(video, metadata, ring, decoded, size)
+                if frame is None:
+                    break
 
-        return frames
+                timestamp = frame_count / metadata.fps
+                yield VideoKeyframe(frame=frame, timecode=round(2 * timestamp, 2) / 2)
+        finally:
+            video.release()
@@ -0,0 +1,175 @@
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from data_structures.video_hash import VideoHash
+from data_structures.video_metadata import VideoMetadata
+from entities.hash_cache import HashCache
+from entities.video_processor import VideoProcessor
+from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
+
+VideoTask = Tuple[str, Optional[str], Optional[str]]  # (video_path, start_time, end_time)
+VideoResult = Optional[Tuple[VideoMetadata, Dict[str, VideoHash]]]
+
+_worker_video_processor: Optional[VideoProcessor] = None
+
+
+def _init_worker(
+    hashers_factory: Callable[[], List[AbstractFrameHasher]], logger: logging.Logger, threads: int, sparse: bool, batch_size: int, resolution: int
+) -> None:
+    global _worker_video_processor
+
+    # opencv hashers can't be pickled, so every worker creates its own ones.
+    # pid is used instead of bucket, so every worker has a unique one
+    _worker_video_processor = VideoProcessor(
+        hashers=hashers_factory(),
+        logger=logger,
+        bucket=os.getpid(),
+        threads=threads,
+        sparse=sparse,
+        batch_size=batch_size,
+        resolution=resolution,
+    )
+
+
+def _process_video(task: VideoTask, hash_names: Optional[List[str]]) -> VideoResult:
+    video_path, start_time, end_time = task
+    return _worker_video_processor.process(video_path=video_path, start_time=start_time, end_time=end_time, hash_names=hash_names)
+
+
+class VideoProcessPool:
+    """
+    Process videos by a pool of worker processes.
+    Every worker takes the next video as soon as it's free, so one long video doesn't stall the others.
+    Videos of a crashed worker (e.g. segfault in decoder) are retried up to `retries` times, other failures
+    (None result or exception) are deterministic and aren't retried.
+    With workers=1 videos are processed in the current process without retries.
+    With cache, hashes found in it aren't computed again: fully cached videos are yielded first,
+    only missing hashers of the other videos are used and their hashes are added to the cache
+    """
+
+    def __init__(
+        self,
+        hashers_factory: Callable[[], List[AbstractFrameHasher]],
+        logger: logging.Logger,
+        bucket: int,
+        workers: int,
+        threads: int,
+        retries: int = 1,
+        sparse: bool = False,
+        batch_size: int = 8,
+        resolution: int = 0,
+        cache: Optional[HashCache] = None,
+    ) -> None:
+        self.hashers_factory = hashers_factory
+        self.logger = logger
+        self.bucket = bucket
+        self.workers = workers
+        self.threads = threads
+        self.retries = retries
+        self.sparse = sparse
+        self.batch_size = batch_size
+        self.resolution = resolution
+        self.cache = cache
+
+    def process(self, tasks: List[VideoTask]) -> Iterator[Tuple[VideoTask, VideoResult]]:
+        """
+        Yield (task, result) in order of completion, result is None if all attempts failed
+        """
+        cached: Dict[VideoTask, Dict[str, VideoHash]] = {}
+        hash_names: Dict[VideoTask, Optional[List[str]]] = {}  # hashers to use, None - all
+
+        for task in tasks:
+            if self.cache is None:
+                hash_names[task] = None
+                continue
+
+            metadata, cached[task] = self.cache.get(*task)
+            missing = [name for name in self.cache.hash_names if name not in cached[task]]
+            if metadata is not None and not missing:
+                yield task, (metadata, cached[task])
+                continue
+
+            hash_names[task] = missing if metadata is not None else None
+
+        process_missing = self.__process_sequential if self.workers <= 1 else self.__process_parallel
+        for task, result in process_missing(hash_names):
+            if result and self.cache is not None:
+                self.cache.put(*task, *result)
+                result = result[0], {**cached[task], **result[1]}
+
+            yield task, result
+
+    def __process_sequential(self, hash_names: Dict[VideoTask, Optional[List[str]]]) -> Iterator[Tuple[VideoTask, VideoResult]]:
+        video_processor = VideoProcessor(
+            hashers=self.hashers_factory(),
+            logger=self.logger,
+            bucket=self.bucket,
+            threads=self.threads,
+            sparse=self.sparse,
+            batch_size=self.batch_size,
+            resolution=self.resolution,
+        )
+
+        for task, names in hash_names.items():
+            video_path, start_time, end_time = task
+            yield task, video_processor.process(video_path=video_path, start_time=start_time, end_time=end_time, hash_names=names)
+
+    def __create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.hashers_factory, self.logger, self.threads, self.sparse, self.batch_size, self.resolution),
+        )
+
+    def __process_parallel(self, hash_names: Dict[VideoTask, Optional[List[str]]]) -> Iterator[Tuple[VideoTask, VideoResult]]:
+        attempts = dict.fromkeys(hash_names, 0)
+        executor = self.__create_executor()
+        futures: Dict[Future, VideoTask] = {executor.submit(_process_video, task, names): task for task, names in hash_names.items()}
+
+        try:
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                resubmit = []
+                broken = False
+
+                for future in done:
+                    task = futures.pop(future)
+                    result, crashed = self.__get_result(future, task)
+                    broken |= crashed
+
+                    if result or not crashed or attempts[task] >= self.retries:
+                        yield task, result
+                        continue
+
+                    attempts[task] += 1
+                    self.logger.warning(f"Retry attempt={attempts[task]} {task=}")
+                    resubmit.append(task)
+
+                if broken:
+                    # a worker crashed (e.g. segfault in decoder): restart the pool and resubmit unfinished videos
+                    self.logger.error("Worker process crashed, restarting the pool")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = self.__create_executor()
+                    resubmit.extend(futures.values())
+                    futures = {}
+
+                for task in resubmit:
+                    futures[executor.submit(_process_video, task, hash_names[task])] = task
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def __get_result(self, future: Future, task: VideoTask) -> Tuple[VideoResult, bool]:
+        """
+        Returns result of the future and flag that the pool is broken
+        """
+        try:
+            return future.result(), False
+        except BrokenProcessPool:
+            self.logger.error(f"Worker process crashed on {task=}")
+            return None, True
+        except Exception as e:
+            self.logger.error(f"Exception {e} on {task=}")
+            return None, False
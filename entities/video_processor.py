@@ -1,104 +1,144 @@
 import logging
-import subprocess
 import time
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
+from data_structures.preprocessed_frame import PreprocessedFrame
 from data_structures.video_hash import VideoHash
+from data_structures.video_keyframe import VideoKeyframe
 from data_structures.video_metadata import VideoMetadata
 from data_structures.video_query_metadata import VideoQueryMetadata
+from entities.frame_buffer_ring import FrameBufferRing
+from entities.frame_preprocessor import FramePreprocessor
 from entities.video_keyframe_extractor import VideoKeyframeExtractor
 from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
 
 
 class VideoProcessor:
-    def __init__(self, hashers: List[AbstractFrameHasher], logger: logging.Logger, bucket: int, threads: int) -> None:
-        self.kfe = VideoKeyframeExtractor(logger=logger)
+    def __init__(
+        self,
+        hashers: List[AbstractFrameHasher],
+        logger: logging.Logger,
+        bucket: int,
+        threads: int,
+        sparse: bool = False,
+        batch_size: int = 8,
+        reuse_buffers: bool = True,
+        resolution: int = 0,
+    ) -> None:
+        self.kfe = VideoKeyframeExtractor(logger=logger, threads=threads)
+        # a batch holds batch_size keyframes at most, so their frames are decoded into a ring of batch_size arrays reused by all videos
+        self.ring = FrameBufferRing(batch_size if reuse_buffers else 0)
+        self.preprocessor = FramePreprocessor(buffers=self.ring.size)
         self.hashers = hashers
         self.logger = logger
         self.bucket = bucket
         self.threads = threads
+        self.sparse = sparse
+        self.batch_size = batch_size
+        self.resolution = resolution  # short side of keyframes, hashes of db and queries must be of the same resolution
 
-    def flv2mp4(self, video_path: str) -> Optional[str]:
+    @staticmethod
+    def to_seconds(timestamp: str) -> float:
         """
-        Convert flv to mp4,
+        Seconds of time in format 'hh:mm:ss', 'mm:ss' or 'ss' (as ffmpeg -ss)
         """
-        cmd = [
-            "ffmpeg",
-            "-i",
-            video_path,
-            f"cash/flv2mp4_{self.bucket}.mp4",
-            "-threads",
-            str(self.threads),
-            "-y",
-            "-loglevel",
-            "quiet",
-        ]
+        seconds = 0.0
+        for part in timestamp.strip().split(":"):
+            seconds = 60 * seconds + float(part)
 
-        try:
-            subprocess.run(cmd)
-        except Exception as e:
-            self.logger.error(f"{video_path=} cash/flv2mp4_{self.bucket}.mp4 {e}")
-            return None
+        return seconds
 
-        return f"cash/flv2mp4_{self.bucket}.mp4"  # for mark that transformation went good
-
-    def cut(self, video_path: str, start_time: str = None, end_time: str = None) -> Optional[str]:
+    def process(
+        self, video_path: str, start_time: str = None, end_time: str = None, hash_names: Optional[List[str]] = None
+    ) -> Optional[Tuple[VideoMetadata, Dict[str, VideoHash]]]:
         """
-        Cut video from start_time to end_time using ffmpeg.
-
-        Args:
-            video_path: Path to the input video file
-            start_time: Start time for cutting in format 'hh:mm:ss' or 'ss'
-            end_time: End time for cutting in format 'hh:mm:ss' or 'ss'
-
-        Returns:
-            Path to the cut video file if successful, None otherwise
+        Hash keyframes of the video or of its segment from start_time to end_time ('hh:mm:ss' or 'ss'),
+        the segment is decoded after a seek in the source video, timecodes are of the segment and start from 0 (as of a cut fragment).
+        If hash_names is set, only these hashers are used (the others are cached)
         """
-
-        cmd = [
-            "ffmpeg",
-            "-i",
-            video_path,
-            "-ss",
-            start_time,
-            "-to",
-            end_time,
-            f'cash_query/cut_{self.bucket}{video_path[video_path.rfind("."):]}',
-            "-threads",
-            str(self.threads),
-            "-y",
-            "-loglevel",
-            "quiet",
-        ]
-        subprocess.run(cmd)
-
-        return f'cash_query/cut_{self.bucket}{video_path[video_path.rfind("."):]}'
-
-    def process(self, video_path: str, start_time: str = None, end_time: str = None) -> Optional[Tuple[VideoMetadata, Dict[str, VideoHash]]]:
+        hashers = [hasher for hasher in self.hashers if hash_names is None or hasher.name in hash_names]
         original_filepath = video_path
-
-        if start_time and end_time:
-            video_path = self.cut(video_path=video_path, start_time=start_time, end_time=end_time)
+        segment = (self.to_seconds(start_time), self.to_seconds(end_time)) if start_time and end_time else (None, None)
 
         start_t = time.perf_counter()
-        if video_path[video_path.rfind(".") + 1:] == "flv":
-            if not self.flv2mp4(video_path):
-                self.logger.error(f"{video_path=} {self.bucket=}")
-                return None
-
-            video_path = f"cash/flv2mp4_{self.bucket}.mp4"
-
-        processed = self.kfe.extract(filepath=video_path, original_filepath=original_filepath)
+        processed = self.kfe.extract_stream(
+            filepath=video_path,
+            original_filepath=original_filepath,
+            sparse=self.sparse,
+            start_time=segment[0],
+            end_time=segment[1],
+            pipe=video_path[video_path.rfind(".") + 1:] == "flv",  # flv is decoded by ffmpeg to a pipe, without conversion to mp4
+            ring=self.ring,
+            resolution=self.resolution,
+        )
         if not processed:
             return None
 
         kfe_time = time.perf_counter() - start_t
 
-        metadata, frames = processed
+        metadata, keyframes = processed
 
         if start_time and end_time:
             metadata = VideoQueryMetadata(**metadata.__dict__, start_time=start_time, end_time=end_time)
 
-        result_hashes = {hasher.name: hasher.process_frames(frames=frames, filename=metadata.filename, kfe_time=kfe_time) for hasher in self.hashers}
+        result_hashes = self.__hash_keyframes(keyframes=keyframes, hashers=hashers, filename=metadata.filename, kfe_time=kfe_time)
+        if result_hashes is None:
+            return None
 
         return metadata, result_hashes
+
+    def __hash_keyframes(
+        self, keyframes: Iterator[VideoKeyframe], hashers: List[AbstractFrameHasher], filename: str, kfe_time: float
+    ) -> Optional[Dict[str, VideoHash]]:
+        """
+        Keyframes are streamed: they are hashed by all hashers in batches of batch_size and dropped before the next batch is decoded.
+        Grayscale conversion is done once per keyframe and shared by all hashers.
+        Time spent inside the keyframes iterator and in the shared preprocessing is added to kfe_time
+        """
+        vecs = {hasher.name: [] for hasher in hashers}
+        elapsed_time = dict.fromkeys(vecs, 0.0)
+        timecodes = []
+        batch = []
+
+        try:
+            while True:
+                start_t = time.perf_counter()
+                keyframe = next(keyframes, None)
+                frame = None if keyframe is None else self.preprocessor.process(keyframe)
+                kfe_time += time.perf_counter() - start_t
+
+                if frame is not None:
+                    batch.append(frame)
+                    timecodes.append(frame.timecode)
+
+                if batch and (frame is None or len(batch) == self.batch_size):
+                    self.__hash_batch(batch, hashers, vecs, elapsed_time)
+                    batch = []
+
+                if frame is None:
+                    break
+        except Exception as e:
+            self.logger.error(f"Exception {e} on file {filename}")
+            return None
+        finally:
+            keyframes.close()
+
+        return {
+            hasher.name: VideoHash(
+                filename=filename,
+                vecs=np.concatenate(vecs[hasher.name]) if vecs[hasher.name] else np.empty((0, hasher.vector_size), dtype=np.uint8),
+                timecodes=np.array(timecodes, dtype=np.float64),
+                elapsed_time=elapsed_time[hasher.name],
+                full_elapsed_time=kfe_time + elapsed_time[hasher.name],
+            )
+            for hasher in hashers
+        }
+
+    def __hash_batch(
+        self, batch: List[PreprocessedFrame], hashers: List[AbstractFrameHasher], vecs: Dict[str, List[np.ndarray]], elapsed_time: Dict[str, float]
+    ) -> None:
+        for hasher in hashers:
+            start_t = time.perf_counter()
+            vecs[hasher.name].append(hasher.process_batch(np.stack([hasher.batch_input(frame) for frame in batch])))
+            elapsed_time[hasher.name] += time.perf_counter() - start_t
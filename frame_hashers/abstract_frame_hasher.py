@@ -2,23 +2,52 @@ import abc
 import time
 from typing import List
 
+import numpy as np
 from data_structures.frame_hash import FrameHash
+from data_structures.preprocessed_frame import PreprocessedFrame
 from data_structures.video_hash import VideoHash
 from data_structures.video_keyframe import VideoKeyframe
+from entities.frame_preprocessor import FramePreprocessor
 
 
 class AbstractFrameHasher:
     def __init__(self, name: str) -> None:
         self.name: str = name
         self.vector_size: int = -1
+        self.binary: bool = False  # vector consists of 0/1 bits only, so it can be stored packed
+        self.metric: str = "euclidean"  # distance between vectors in the index, "hamming" compares bits (opencv hashes are packed bits)
+        self.preprocessor = FramePreprocessor()
 
     @abc.abstractmethod
-    def process(self, frame: VideoKeyframe) -> FrameHash:
+    def batch_input(self, frame: PreprocessedFrame) -> np.ndarray:
+        """
+        Preprocessed 2D (H, W) array of the frame the hasher works on. All frames of one video have the same shape
+        """
         pass
 
+    @abc.abstractmethod
+    def process_batch(self, frames: np.ndarray) -> np.ndarray:
+        """
+        Hash stacked batch_input arrays (N, H, W) at once, returns (N, vector_size) uint8 matrix
+        """
+        pass
+
+    def process(self, frame: PreprocessedFrame) -> FrameHash:
+        x = self.process_batch(self.batch_input(frame)[np.newaxis])
+        return FrameHash(vec=x[0], timecode=frame.timecode)
+
     def process_frames(self, frames: List[VideoKeyframe], filename: str, kfe_time: float) -> VideoHash:
         start_timer = time.perf_counter()
-        frames = [self.process(frame) for frame in frames]
+        vecs = np.empty((0, self.vector_size), dtype=np.uint8)
+        if frames:
+            vecs = self.process_batch(np.stack([self.batch_input(self.preprocessor.process(frame)) for frame in frames]))
+
         end_timer = time.perf_counter()
 
-        return VideoHash(filename=filename, frames=frames, elapsed_time=end_timer - start_timer, full_elapsed_time=kfe_time + end_timer - start_timer)
+        return VideoHash(
+            filename=filename,
+            vecs=vecs,
+            timecodes=np.array([frame.timecode for frame in frames], dtype=np.float64),
+            elapsed_time=end_timer - start_timer,
+            full_elapsed_time=kfe_time + end_timer - start_timer,
+        )
@@ -1,6 +1,6 @@
+import numpy as np
 from cv2.img_hash import BlockMeanHash
-from data_structures.frame_hash import FrameHash
-from data_structures.video_keyframe import VideoKeyframe
+from data_structures.preprocessed_frame import PreprocessedFrame
 from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
 
 
@@ -10,7 +10,10 @@ class BlockMeanframeHasher(AbstractFrameHasher):
         self.hasher = BlockMeanHash.create(mode=mode)
         self.mode = mode
         self.vector_size = 121 if self.mode else 32
+        self.metric = "hamming"
 
-    def process(self, frame: VideoKeyframe) -> FrameHash:
-        x = self.hasher.compute(frame.frame)
-        return FrameHash(vec=x.flatten(), timecode=frame.timecode)
+    def batch_input(self, frame: PreprocessedFrame) -> np.ndarray:
+        return self.preprocessor.resized_gray(frame, (256, 256))  # BlockMeanHash works on 256x256 grayscale
+
+    def process_batch(self, frames: np.ndarray) -> np.ndarray:
+        return np.stack([self.hasher.compute(x).flatten() for x in frames])
@@ -1,19 +1,23 @@
-import cv2
-import imagehash
-from PIL import Image
-from data_structures.frame_hash import FrameHash
-from data_structures.video_keyframe import VideoKeyframe
+import numpy as np
+from data_structures.preprocessed_frame import PreprocessedFrame
 from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
 
 
 class DHashImageHasher(AbstractFrameHasher):
+    """
+    imagehash.dhash computed for a batch of frames at once, bit-exact with imagehash
+    """
+
     def __init__(self) -> None:
         super().__init__(name="dhash")
-        self.hasher = imagehash.dhash
-        self.vector_size = 64
+        self.hash_size = 8
+        self.vector_size = self.hash_size**2
+        self.binary = True
+        self.metric = "hamming"
+
+    def batch_input(self, frame: PreprocessedFrame) -> np.ndarray:
+        return np.asarray(self.preprocessor.resized_image(frame, (self.hash_size + 1, self.hash_size)))
 
-    def process(self, frame: VideoKeyframe) -> FrameHash:
-        x = cv2.cvtColor(frame.frame, cv2.COLOR_BGR2RGB)  # turn frame from BGR to RGB
-        x = self.hasher(Image.fromarray(x))
-        x = x.hash  # turn from string representation (ImageHash algo) to np.ndarray
-        return FrameHash(vec=x.flatten(), timecode=frame.timecode)  # make 1D instead of 2D np.ndarray
+    def process_batch(self, frames: np.ndarray) -> np.ndarray:
+        x = frames[:, :, 1:] > frames[:, :, :-1]  # compute differences between columns
+        return x.reshape(len(frames), -1).astype(np.uint8)
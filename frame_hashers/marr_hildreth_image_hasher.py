@@ -1,6 +1,6 @@
+import numpy as np
 from cv2.img_hash import MarrHildrethHash
-from data_structures.frame_hash import FrameHash
-from data_structures.video_keyframe import VideoKeyframe
+from data_structures.preprocessed_frame import PreprocessedFrame
 from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
 
 
@@ -9,7 +9,10 @@ class MarrHildrethframeHasher(AbstractFrameHasher):
         super().__init__(name="Marr-Hildreth")
         self.hasher = MarrHildrethHash.create()
         self.vector_size = 72
+        self.metric = "hamming"
 
-    def process(self, frame: VideoKeyframe) -> FrameHash:
-        x = self.hasher.compute(frame.frame)
-        return FrameHash(vec=x.flatten(), timecode=frame.timecode)
+    def batch_input(self, frame: PreprocessedFrame) -> np.ndarray:
+        return frame.gray  # grayscale is shared, hasher skips its own conversion
+
+    def process_batch(self, frames: np.ndarray) -> np.ndarray:
+        return np.stack([self.hasher.compute(x).flatten() for x in frames])
@@ -1,19 +1,38 @@
-import cv2
-import imagehash
-from PIL import Image
-from data_structures.frame_hash import FrameHash
-from data_structures.video_keyframe import VideoKeyframe
+import numpy as np
+import pywt
+from data_structures.preprocessed_frame import PreprocessedFrame
 from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
 
 
 class WHashImageHasher(AbstractFrameHasher):
+    """
+    imagehash.whash (haar, remove_max_haar_ll=True) computed for a batch of frames at once, bit-exact with imagehash.
+    Wavelet transforms are the same pywt ones as in imagehash, applied over the last two axes of the batch
+    """
+
     def __init__(self) -> None:
         super().__init__(name="whash")
-        self.hasher = imagehash.whash
-        self.vector_size = 64
-
-    def process(self, frame: VideoKeyframe) -> FrameHash:
-        x = cv2.cvtColor(frame.frame, cv2.COLOR_BGR2RGB)  # turn frame from BGR to RGB
-        x = self.hasher(Image.fromarray(x))
-        x = x.hash  # turn from string representation (ImageHash algo) to np.ndarray
-        return FrameHash(vec=x.flatten(), timecode=frame.timecode)  # make 1D instead of 2D np.ndarray
+        self.hash_size = 8
+        self.vector_size = self.hash_size**2
+        self.binary = True
+        self.metric = "hamming"
+
+    def batch_input(self, frame: PreprocessedFrame) -> np.ndarray:
+        scale = max(2 ** int(np.log2(min(frame.image.size))), self.hash_size)  # the same image_scale as imagehash chooses for the full frame
+        return np.asarray(self.preprocessor.resized_image(frame, (scale, scale)))
+
+    def process_batch(self, frames: np.ndarray) -> np.ndarray:
+        ll_max_level = int(np.log2(frames.shape[-1]))
+        dwt_level = ll_max_level - int(np.log2(self.hash_size))
+
+        pixels = frames / 255.0
+
+        # Remove low level frequency LL(max_ll) using haar filter
+        coeffs = list(pywt.wavedec2(pixels, "haar", level=ll_max_level, axes=(1, 2)))
+        coeffs[0] *= 0
+        pixels = pywt.waverec2(coeffs, "haar", axes=(1, 2))
+
+        # Use LL(K) as freq, where K is log2(hash_size)
+        dwt_low = pywt.wavedec2(pixels, "haar", level=dwt_level, axes=(1, 2))[0].reshape(len(frames), -1)
+        med = np.median(dwt_low, axis=1, keepdims=True)
+        return (dwt_low > med).astype(np.uint8)
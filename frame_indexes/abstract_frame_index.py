@@ -0,0 +1,40 @@
+import abc
+
+import numpy as np
+from frame_indexes.abstract_search_index import AbstractSearchIndex
+
+
+class AbstractFrameIndex(AbstractSearchIndex):
+    """
+    Nearest neighbour index of frame vectors built from added items, saved to and loaded from a directory
+    """
+
+    @abc.abstractmethod
+    def add(self, item: int, vec: np.ndarray) -> None:
+        pass
+
+    @abc.abstractmethod
+    def build(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def save(self, save_dir: str) -> None:
+        pass
+
+    @abc.abstractmethod
+    def load(self, load_dir: str) -> None:
+        pass
+
+    @abc.abstractmethod
+    def count(self) -> int:
+        """
+        Number of items of the index
+        """
+        pass
+
+    @abc.abstractmethod
+    def contains(self, items: np.ndarray, vecs: np.ndarray) -> bool:
+        """
+        Items of the index were added with these vectors (N, vector_size)
+        """
+        pass
@@ -0,0 +1,43 @@
+import abc
+from typing import Tuple
+
+import numpy as np
+
+
+class AbstractSearchIndex:
+    """
+    Searchable nearest neighbour index of frame vectors. Items are numbered by position in db_index.
+    Distances are returned on the euclidean scale for all metrics, so search algorithms don't depend on the index
+    """
+
+    def __init__(self, name: str, vector_size: int, metric: str, binary: bool) -> None:
+        self.name: str = name
+        self.vector_size = vector_size
+        self.metric = metric
+        self.binary = binary  # vectors are 0/1 bits, otherwise "hamming" unpacks bytes to bits
+
+    def to_bits(self, vec: np.ndarray) -> np.ndarray:
+        vec = np.asarray(vec, dtype=np.uint8)
+        return vec if self.binary else np.unpackbits(vec, axis=-1)
+
+    @abc.abstractmethod
+    def size(self) -> int:
+        """
+        Size of the index data in bytes (file size for memory-mapped indexes)
+        """
+        pass
+
+    @abc.abstractmethod
+    def search(self, vec: np.ndarray, k: int) -> Tuple[list, list]:
+        """
+        Returns ids of k nearest items and distances to them
+        """
+        pass
+
+    @abc.abstractmethod
+    def search_batch(self, vecs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search all vectors (N, vector_size) at once, returns (N, k) int64 ids and (N, k) float64 distances.
+        If less than k items are found, ids are padded with -1 and distances with inf
+        """
+        pass
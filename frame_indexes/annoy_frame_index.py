@@ -0,0 +1,91 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+
+import numpy as np
+from annoy import AnnoyIndex
+from frame_indexes.abstract_frame_index import AbstractFrameIndex
+
+EUCLIDEAN_FILENAME = "annoy_index.ann"  # name of indexes built before the hamming metric
+
+
+class AnnoyFrameIndex(AbstractFrameIndex):
+    """
+    Annoy index with "euclidean" metric on vector values or "hamming" metric on bits.
+    Annoy packs hamming vectors to uint64 words and counts differing bits, the count is returned as sqrt(hamming):
+    it's equal to euclidean distance between 0/1 vectors.
+    n_trees is used on build, search_k (number of inspected nodes, -1 is n_trees * k) on search
+    """
+
+    def __init__(self, vector_size: int, metric: str, binary: bool, threads: int, n_trees: int = 1000, search_k: int = -1) -> None:
+        super().__init__(name="annoy", vector_size=vector_size, metric=metric, binary=binary)
+        self.threads = threads
+        self.n_trees = n_trees
+        self.search_k = search_k
+        self.dimensions = vector_size if metric == "euclidean" or binary else 8 * vector_size
+        self.index = AnnoyIndex(self.dimensions, metric)
+        self.index.set_seed(42)
+        self.path = None
+
+    @property
+    def filename(self) -> str:
+        # euclidean index keeps the old name, so indexes built before are loaded as is
+        return EUCLIDEAN_FILENAME if self.metric == "euclidean" else f"annoy_index_{self.metric}.ann"
+
+    def prepare(self, vec: np.ndarray) -> np.ndarray:
+        return vec if self.metric == "euclidean" else self.to_bits(vec)
+
+    def add(self, item: int, vec: np.ndarray) -> None:
+        self.index.add_item(item, self.prepare(vec))
+
+    def build(self) -> None:
+        self.index.build(self.n_trees, n_jobs=self.threads)
+
+    def save(self, save_dir: str) -> None:
+        self.path = os.path.join(save_dir, self.filename)
+        self.index.save(self.path)
+
+    def load(self, load_dir: str) -> None:
+        self.path = os.path.join(load_dir, self.filename)
+        self.index.load(self.path)
+
+    def size(self) -> int:
+        return os.path.getsize(self.path) if self.path else 0
+
+    def count(self) -> int:
+        return self.index.get_n_items()
+
+    def contains(self, items: np.ndarray, vecs: np.ndarray) -> bool:
+        return all(np.array_equal(self.index.get_item_vector(int(item)), self.prepare(vec)) for item, vec in zip(items, vecs))
+
+    def search(self, vec: np.ndarray, k: int) -> Tuple[list, list]:
+        ids, distances = self.index.get_nns_by_vector(self.prepare(vec), k, search_k=self.search_k, include_distances=True)
+        if self.metric == "hamming":
+            distances = [math.sqrt(distance) for distance in distances]
+
+        return ids, distances
+
+    def search_batch(self, vecs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Frames are searched by a thread pool, annoy releases the GIL during search
+        """
+        ids = np.full((len(vecs), k), -1, dtype=np.int64)
+        distances = np.full((len(vecs), k), np.inf)
+
+        def search_row(i: int) -> None:
+            row_ids, row_distances = self.index.get_nns_by_vector(self.prepare(vecs[i]), k, search_k=self.search_k, include_distances=True)
+            ids[i, : len(row_ids)] = row_ids
+            distances[i, : len(row_ids)] = row_distances
+
+        if self.threads > 1 and len(vecs) > 1:
+            with ThreadPoolExecutor(max_workers=self.threads) as executor:
+                list(executor.map(search_row, range(len(vecs))))
+        else:
+            for i in range(len(vecs)):
+                search_row(i)
+
+        if self.metric == "hamming":
+            distances = np.sqrt(distances)
+
+        return ids, distances
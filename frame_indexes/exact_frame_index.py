@@ -0,0 +1,121 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from typing import List, Tuple
+
+import numpy as np
+from frame_indexes.abstract_frame_index import AbstractFrameIndex
+
+
+class ExactFrameIndex(AbstractFrameIndex):
+    """
+    Exact (brute-force) search over one contiguous uint8 matrix of all vectors, memory-mapped after load.
+    "hamming" vectors are stored as packed bits, "euclidean" ones as values.
+
+    Distances are computed by blocks of items with a matrix multiply: |q|^2 + |x|^2 - 2 q.x, for bits it's the hamming distance.
+    Values are integer and small, so float32 is exact. Blocks are searched by a thread pool (BLAS releases the GIL),
+    top-k of blocks are merged. Distances are returned as sqrt like in AnnoyFrameIndex, equal distances are ordered by item id
+    """
+
+    def __init__(self, vector_size: int, metric: str, binary: bool, threads: int = 1, block_size: int = 1 << 16, chunk_size: int = 1 << 22) -> None:
+        super().__init__(name="exact", vector_size=vector_size, metric=metric, binary=binary)
+        self.threads = threads
+        self.block_size = block_size  # items of one block
+        self.chunk_size = chunk_size  # max number of (query, item) distances of a block computed at once
+        self.rows: List[np.ndarray] = []
+        self.data = np.empty((0, 0), dtype=np.uint8)
+        self.path = None
+
+    @property
+    def filename(self) -> str:
+        return f"exact_index_{self.metric}.npy"
+
+    def prepare(self, vecs: np.ndarray) -> np.ndarray:
+        if self.metric == "hamming":
+            return np.packbits(self.to_bits(vecs), axis=-1)
+
+        return np.asarray(vecs, dtype=np.uint8)
+
+    def add(self, item: int, vec: np.ndarray) -> None:
+        if item != len(self.rows):
+            raise ValueError(f"Items of exact index are added in order, expected {len(self.rows)}, got {item}")
+
+        self.rows.append(self.prepare(vec))
+
+    def build(self) -> None:
+        if self.rows:
+            self.data = np.ascontiguousarray(np.stack(self.rows))
+
+        self.rows = []
+
+    def save(self, save_dir: str) -> None:
+        self.path = os.path.join(save_dir, self.filename)
+        np.save(self.path, self.data)
+
+    def load(self, load_dir: str) -> None:
+        self.path = os.path.join(load_dir, self.filename)
+        self.data = np.load(self.path, mmap_mode="r")
+
+    def size(self) -> int:
+        return self.data.nbytes
+
+    def count(self) -> int:
+        return len(self.data)
+
+    def contains(self, items: np.ndarray, vecs: np.ndarray) -> bool:
+        return np.array_equal(self.data[items], self.prepare(vecs))
+
+    def search(self, vec: np.ndarray, k: int) -> Tuple[list, list]:
+        ids, distances = self.search_batch(np.asarray(vec)[np.newaxis], k)
+        found = ids[0] >= 0
+        return ids[0][found].tolist(), distances[0][found].tolist()
+
+    def search_batch(self, vecs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        ids = np.full((len(vecs), k), -1, dtype=np.int64)
+        distances = np.full((len(vecs), k), np.inf)
+        items = len(self.data)
+        if items == 0 or len(vecs) == 0 or k <= 0:
+            return ids, distances
+
+        queries = self.as_float(self.prepare(vecs))
+        found = min(k, items)
+        step = max(1, self.chunk_size // min(items, self.block_size))
+        blocks = range(0, items, self.block_size)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.threads)) as executor:
+            for start in range(0, len(queries), step):
+                chunk = queries[start: start + step]
+                norms = (chunk * chunk).sum(axis=1)
+                keys = np.concatenate(list(executor.map(self.search_block, repeat(chunk), repeat(norms), blocks, repeat(found))), axis=1)
+
+                # the key is unique: squared distance * items + item id, so sorting keys orders equal distances by id
+                keys = self.top(keys, found)
+                keys.sort(axis=1)
+                ids[start: start + step, :found] = keys % items
+                distances[start: start + step, :found] = np.sqrt(keys // items)
+
+        return ids, distances
+
+    def search_block(self, queries: np.ndarray, norms: np.ndarray, start: int, found: int) -> np.ndarray:
+        """
+        Keys of the found nearest items of the block [start, start + block_size) for every query
+        """
+        block = self.as_float(self.data[start: start + self.block_size])
+        squared = norms[:, np.newaxis] + (block * block).sum(axis=1)[np.newaxis, :] - 2 * queries @ block.T
+
+        keys = np.rint(np.maximum(squared, 0)).astype(np.int64) * len(self.data) + np.arange(start, start + len(block))
+        return self.top(keys, found)
+
+    @staticmethod
+    def top(keys: np.ndarray, found: int) -> np.ndarray:
+        return np.partition(keys, found - 1, axis=1)[:, :found] if keys.shape[1] > found else keys
+
+    def as_float(self, vecs: np.ndarray) -> np.ndarray:
+        """
+        Bits (hamming) or values of vectors for the matrix multiply, float32 while all sums are exact in it
+        """
+        if self.metric == "hamming":
+            return np.unpackbits(vecs, axis=-1).astype(np.float32)
+
+        exact_float32 = 2 * 255**2 * vecs.shape[-1] < 1 << 24
+        return vecs.astype(np.float32 if exact_float32 else np.float64)
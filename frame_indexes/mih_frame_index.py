@@ -0,0 +1,184 @@
+import os
+from functools import lru_cache
+from itertools import combinations
+from typing import Optional, Tuple
+
+import numpy as np
+from frame_indexes.exact_frame_index import ExactFrameIndex
+
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+@lru_cache(maxsize=None)
+def _masks(width: int, radius: int) -> np.ndarray:
+    """
+    All width-bit values with radius set bits
+    """
+    return np.array([sum(1 << bit for bit in bits) for bits in combinations(range(width), radius)], dtype=np.uint64)
+
+
+class MIHFrameIndex(ExactFrameIndex):
+    """
+    Multi-index hashing (Norouzi et al.) for exact hamming search of binary codes.
+    Codes are split into m substrings, every substring has a table: values sorted and items in the same order.
+    If hamming distance d <= m * (r + 1) - 1, at least one substring differs by <= r bits, so probing all values
+    within radius r = 0, 1, ... of every query substring finds all items with such d exactly.
+    A query is done when k candidates are within the guaranteed distance (or radius, if set).
+    When probing a radius costs more than a scan, remaining queries are searched by ExactFrameIndex.
+
+    Codes and tables are saved as .npy files and memory-mapped on load. Equal distances are ordered by item id
+    """
+
+    def __init__(
+        self, vector_size: int, metric: str, binary: bool, threads: int = 1, substrings: Optional[int] = None, radius: Optional[int] = None
+    ) -> None:
+        if metric != "hamming":
+            raise ValueError(f"Multi-index hashing needs hamming metric, got {metric}")
+
+        super().__init__(vector_size=vector_size, metric=metric, binary=binary, threads=threads)
+        self.name = "mih"
+        self.bits = vector_size if binary else 8 * vector_size
+        self.substrings = substrings  # number of substrings, by default ~ bits / log2(items)
+        self.radius = radius  # max hamming distance of found items, None - k nearest at any distance
+        self.values = np.empty((0, 0), dtype=np.uint64)  # (substrings, items) sorted substring values
+        self.items = np.empty((0, 0), dtype=np.int64)  # (substrings, items) item ids in order of values
+
+    @property
+    def filename(self) -> str:
+        return f"mih_index_{self.metric}.npy"
+
+    def widths(self) -> np.ndarray:
+        substrings = self.values.shape[0]
+        return np.array([self.bits // substrings + (j < self.bits % substrings) for j in range(substrings)])
+
+    def split(self, codes: np.ndarray, substrings: int) -> np.ndarray:
+        """
+        (N, substrings) integer values of substrings of packed codes
+        """
+        bits = np.unpackbits(codes, axis=-1)[:, : self.bits].astype(np.uint64)
+        widths = [self.bits // substrings + (j < self.bits % substrings) for j in range(substrings)]
+        starts = np.cumsum([0] + widths[:-1])
+
+        values = np.zeros((len(codes), substrings), dtype=np.uint64)
+        for j, (start, width) in enumerate(zip(starts, widths)):
+            values[:, j] = bits[:, start: start + width] @ (np.uint64(1) << np.arange(width, dtype=np.uint64)[::-1])
+
+        return values
+
+    def build(self) -> None:
+        super().build()
+
+        items = len(self.data)
+        substrings = self.substrings or int(round(self.bits / max(1.0, np.log2(max(items, 2)))))
+        substrings = min(max(substrings, -(-self.bits // 32), 1), self.bits)  # substring values fit uint32 tables
+
+        values = self.split(np.asarray(self.data), substrings).T if items else np.empty((substrings, 0), dtype=np.uint64)
+        order = np.argsort(values, axis=1, kind="stable")
+        self.values = np.take_along_axis(values, order, axis=1).astype(np.uint32)
+        self.items = order.astype(np.int32)
+
+    def save(self, save_dir: str) -> None:
+        super().save(save_dir)
+        np.save(os.path.join(save_dir, self.filename.replace(".npy", "_values.npy")), self.values)
+        np.save(os.path.join(save_dir, self.filename.replace(".npy", "_items.npy")), self.items)
+
+    def load(self, load_dir: str) -> None:
+        super().load(load_dir)
+        self.values = np.load(os.path.join(load_dir, self.filename.replace(".npy", "_values.npy")), mmap_mode="r")
+        self.items = np.load(os.path.join(load_dir, self.filename.replace(".npy", "_items.npy")), mmap_mode="r")
+
+    def size(self) -> int:
+        return self.data.nbytes + self.values.nbytes + self.items.nbytes
+
+    def search_batch(self, vecs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        ids = np.full((len(vecs), k), -1, dtype=np.int64)
+        distances = np.full((len(vecs), k), np.inf)
+        items = len(self.data)
+        if items == 0 or len(vecs) == 0 or k <= 0:
+            return ids, distances
+
+        queries = self.prepare(vecs)
+        found = min(k, items)
+        max_distance = self.bits if self.radius is None else self.radius
+        query_values = self.split(queries, self.values.shape[0])
+
+        pair_queries, pair_items, pair_distances = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        active = np.arange(len(queries))
+        scan = np.empty(0, dtype=np.int64)
+
+        for radius in range(max(self.widths()) + 1):
+            guaranteed = min(self.values.shape[0] * (radius + 1) - 1, max_distance)
+            if sum(len(_masks(int(width), radius)) for width in self.widths() if radius <= width) > items:
+                scan = active  # probing costs more than a scan
+                break
+
+            pair_queries, pair_items = self.probe(query_values, active, radius, pair_queries, pair_items)
+            pair_distances = POPCOUNT[queries[pair_queries] ^ self.data[pair_items]].sum(axis=1, dtype=np.int64)
+
+            close = np.bincount(pair_queries[pair_distances <= guaranteed], minlength=len(queries))
+            active = active[(close[active] < found) & (guaranteed < max_distance)]
+            if len(active) == 0:
+                break
+
+        self.collect(ids, distances, pair_queries, pair_items, pair_distances, max_distance, found)
+
+        if len(scan):
+            self.scan(vecs[scan], scan, ids, distances, max_distance, found)
+
+        return ids, distances
+
+    def probe(
+        self, query_values: np.ndarray, active: np.ndarray, radius: int, pair_queries: np.ndarray, pair_items: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Add (query, item) pairs of items which have a substring within radius of the query substring, pairs are unique
+        """
+        all_queries, all_items = [pair_queries], [pair_items]
+        for j, width in enumerate(self.widths()):
+            if radius > width:
+                continue
+
+            probes = query_values[active, j][:, np.newaxis] ^ _masks(int(width), radius)[np.newaxis, :]
+            left = np.searchsorted(self.values[j], probes.astype(np.uint32), side="left").ravel()
+            right = np.searchsorted(self.values[j], probes.astype(np.uint32), side="right").ravel()
+
+            counts = right - left
+            positions = np.repeat(left - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            all_queries.append(np.repeat(np.repeat(active, probes.shape[1]), counts))
+            all_items.append(np.asarray(self.items[j])[positions].astype(np.int64))
+
+        keys = np.unique(np.concatenate(all_queries) * len(self.data) + np.concatenate(all_items))
+        return keys // len(self.data), keys % len(self.data)
+
+    def collect(
+        self,
+        ids: np.ndarray,
+        distances: np.ndarray,
+        pair_queries: np.ndarray,
+        pair_items: np.ndarray,
+        pair_distances: np.ndarray,
+        max_distance: int,
+        found: int,
+    ) -> None:
+        """
+        found nearest candidates of every query (within max_distance), ordered by distance and item id
+        """
+        keep = pair_distances <= max_distance
+        pair_queries, pair_items, pair_distances = pair_queries[keep], pair_items[keep], pair_distances[keep]
+
+        order = np.lexsort((pair_items, pair_distances, pair_queries))
+        pair_queries, pair_items, pair_distances = pair_queries[order], pair_items[order], pair_distances[order]
+        starts = np.searchsorted(pair_queries, pair_queries, side="left")
+        rank = np.arange(len(pair_queries)) - starts
+        top = rank < found
+
+        ids[pair_queries[top], rank[top]] = pair_items[top]
+        distances[pair_queries[top], rank[top]] = np.sqrt(pair_distances[top])
+
+    def scan(self, vecs: np.ndarray, scan: np.ndarray, ids: np.ndarray, distances: np.ndarray, max_distance: int, found: int) -> None:
+        scan_ids, scan_distances = super().search_batch(vecs, found)
+        outside = scan_distances > np.sqrt(max_distance)
+        scan_ids[outside], scan_distances[outside] = -1, np.inf
+
+        ids[scan, :found] = scan_ids
+        distances[scan, :found] = scan_distances
@@ -0,0 +1,40 @@
+from typing import List, Tuple
+
+import numpy as np
+from frame_indexes.abstract_frame_index import AbstractFrameIndex
+from frame_indexes.abstract_search_index import AbstractSearchIndex
+
+
+class SegmentedFrameIndex(AbstractSearchIndex):
+    """
+    Read-only view of several indexes (immutable annoy segments and the exact index of new videos) as one index.
+    Items of i-th segment are numbered from offsets[i], every query is sent to all segments
+    and k nearest of the merged results are returned (equal distances keep the order of segments).
+    It can't be built or saved, new videos are added as a new segment and every segment is saved to its own directory
+    """
+
+    def __init__(self, segments: List[AbstractFrameIndex], offsets: List[int]) -> None:
+        super().__init__(name="segmented", vector_size=segments[0].vector_size, metric=segments[0].metric, binary=segments[0].binary)
+        self.segments = segments
+        self.offsets = offsets
+
+    def size(self) -> int:
+        return sum(segment.size() for segment in self.segments)
+
+    def search(self, vec: np.ndarray, k: int) -> Tuple[list, list]:
+        ids, distances = self.search_batch(np.asarray(vec)[np.newaxis], k)
+        found = ids[0] >= 0
+        return ids[0][found].tolist(), distances[0][found].tolist()
+
+    def search_batch(self, vecs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        all_ids, all_distances = [], []
+        for segment, offset in zip(self.segments, self.offsets):
+            ids, distances = segment.search_batch(vecs, k)
+            all_ids.append(np.where(ids >= 0, ids + offset, -1))
+            all_distances.append(distances)
+
+        ids = np.concatenate(all_ids, axis=1)
+        distances = np.concatenate(all_distances, axis=1)
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+
+        return np.take_along_axis(ids, order, axis=1), np.take_along_axis(distances, order, axis=1)
@@ -0,0 +1,156 @@
+import argparse
+import csv
+import glob
+import logging
+import os
+import resource
+import time
+import tracemalloc
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from data_structures.buffer_benchmark_result import BufferBenchmarkResult
+from data_structures.video_hash import VideoHash
+from data_structures.video_metadata import VideoMetadata
+from entities.video_processor import VideoProcessor
+from frame_hashers.block_mean_image_hasher import BlockMeanframeHasher
+from frame_hashers.dhash_image_hasher import DHashImageHasher
+from frame_hashers.marr_hildreth_image_hasher import MarrHildrethframeHasher
+from frame_hashers.phash_image_hasher import PHashImageHasher
+from frame_hashers.radial_variance_image_hasher import RadialVarianceframeHasher
+from frame_hashers.whash_image_hasher import WHashImageHasher
+
+
+def get_logger(log_path: str) -> logging.Logger:
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] - %(message)s",
+        handlers=[
+            logging.FileHandler(log_path, mode="w"),
+            logging.StreamHandler(),
+        ],
+    )
+
+    return logging.getLogger(__name__)
+
+
+def measure(video_processor: VideoProcessor, video_path: str) -> Tuple[Optional[Tuple[VideoMetadata, Dict[str, VideoHash]]], float, int, int]:
+    """
+    Result of video_processor.process, its time, minor page faults and peak of traced memory.
+    Time and page faults are measured without tracemalloc (it slows down every allocation), peak in the second run
+    """
+    page_faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+    start_timer = time.perf_counter()
+    processed = video_processor.process(video_path)
+    elapsed_time = time.perf_counter() - start_timer
+    page_faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - page_faults
+
+    tracemalloc.start()
+    video_processor.process(video_path)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return processed, elapsed_time, page_faults, peak_bytes
+
+
+def main() -> None:
+    description = "\n".join([
+        "Benchmark allocations of ingest: a new array per decoded frame vs frames decoded into a ring of preallocated buffers.",
+        "Same workload as scripts/video_process.py for one hash function, hashes of both modes must be the same. Try:",
+        "PYTHONPATH=. python scripts/buffer_benchmark.py -i /home/superustam/jam/light_video_copy_detection/data/core_dataset/ -o core_dataset -n 20",
+    ])
+
+    hashers = {
+        "Marr-Hildreth": MarrHildrethframeHasher(),
+        "BlockMean0": BlockMeanframeHasher(mode=0),
+        "BlockMean1": BlockMeanframeHasher(mode=1),
+        "RadialVariance": RadialVarianceframeHasher(),
+        "phash": PHashImageHasher(),
+        "whash": WHashImageHasher(),
+        "dhash": DHashImageHasher(),
+    }
+
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("-i", "--input", help="input directory with videos db", type=str, required=True)
+    parser.add_argument("-o", "--output", help="output directory to store benchmark results (buffer_benchmark.csv)", type=str, required=True)
+    parser.add_argument("-n", "--limit", help="number of videos to benchmark (default: all)", type=int, default=None)
+    parser.add_argument("--hash", help="hash function to use (default: %(default)s)", choices=list(hashers), default="phash")
+    parser.add_argument("--sparse", help="decode only sampled frames, as --sparse of scripts/video_process.py", action="store_true")
+    parser.add_argument("--batch-size", help="keyframes hashed at once, size of the ring (default: %(default)d)", type=int, default=8)
+    parser.add_argument("-t", "--threads", help="threads of ffmpeg (default: %(default)d)", type=int, default=1)
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    logger = get_logger(f"{args.output}/buffer_benchmark.log")
+
+    if not os.path.exists(args.input):
+        logger.error(f"--input={args.input} doesn't exist")
+        return
+
+    processors = {
+        reuse_buffers: VideoProcessor(
+            hashers=[hashers[args.hash]],
+            logger=logger,
+            bucket=0,
+            threads=args.threads,
+            sparse=args.sparse,
+            batch_size=args.batch_size,
+            reuse_buffers=reuse_buffers,
+        )
+        for reuse_buffers in (False, True)
+    }
+
+    video_paths = glob.glob(f"{args.input}/*/*")[: args.limit]
+    if video_paths:  # warm up decoders and hasher, so the first measured mode isn't slower because of it
+        processors[True].process(video_paths[0])
+
+    results = []
+    for i, video_path in enumerate(video_paths):
+        logger.info(f"{i=} {video_path=}")
+
+        fresh, fresh_time, fresh_page_faults, fresh_peak_bytes = measure(processors[False], video_path)
+        ring, ring_time, ring_page_faults, ring_peak_bytes = measure(processors[True], video_path)
+        if not fresh or not ring:
+            logger.error(f"{video_path=}")
+            continue
+
+        metadata, fresh_hashes = fresh
+        fresh_hash, ring_hash = fresh_hashes[args.hash], ring[1][args.hash]
+        same_hashes = np.array_equal(fresh_hash.vecs, ring_hash.vecs) and np.array_equal(fresh_hash.timecodes, ring_hash.timecodes)
+        if not same_hashes:
+            logger.warning(f"Hashes of preallocated buffers differ from the default ones: {video_path=}")
+
+        results.append(
+            BufferBenchmarkResult(
+                filename=video_path,
+                width=metadata.width,
+                height=metadata.height,
+                keyframes_count=len(fresh_hash.timecodes),
+                fresh_time=fresh_time,
+                ring_time=ring_time,
+                fresh_page_faults=fresh_page_faults,
+                ring_page_faults=ring_page_faults,
+                fresh_peak_bytes=fresh_peak_bytes,
+                ring_peak_bytes=ring_peak_bytes,
+                same_hashes=same_hashes,
+            )
+        )
+
+    with open(os.path.join(args.output, "buffer_benchmark.csv"), "w", newline="") as f:
+        csv_writer = csv.writer(f, delimiter=",")
+        csv_writer.writerow(BufferBenchmarkResult.to_csv_header())
+        for result in results:
+            csv_writer.writerow(result.to_csv())
+
+    fresh_time = sum(result.fresh_time for result in results)
+    ring_time = sum(result.ring_time for result in results)
+    fresh_page_faults = sum(result.fresh_page_faults for result in results)
+    ring_page_faults = sum(result.ring_page_faults for result in results)
+    logger.info(
+        f"Done videos={len(results)} {fresh_time=:.2f}s {ring_time=:.2f}s speedup={fresh_time / max(ring_time, 1e-9):.2f}x "
+        f"{fresh_page_faults=} {ring_page_faults=} same_hashes={all(result.same_hashes for result in results)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import argparse
+import glob
+import logging
+import os
+import time
+from typing import Callable, Dict
+
+import cv2
+import imagehash
+import numpy as np
+from PIL import Image
+from cv2.img_hash import BlockMeanHash, MarrHildrethHash, RadialVarianceHash
+from entities.frame_preprocessor import FramePreprocessor
+from entities.video_keyframe_extractor import VideoKeyframeExtractor
+from frame_hashers.block_mean_image_hasher import BlockMeanframeHasher
+from frame_hashers.dhash_image_hasher import DHashImageHasher
+from frame_hashers.marr_hildreth_image_hasher import MarrHildrethframeHasher
+from frame_hashers.phash_image_hasher import PHashImageHasher
+from frame_hashers.radial_variance_image_hasher import RadialVarianceframeHasher
+from frame_hashers.whash_image_hasher import WHashImageHasher
+
+
+def get_logger(log_path: str) -> logging.Logger:
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] - %(message)s",
+        handlers=[
+            logging.FileHandler(log_path, mode="w"),
+            logging.StreamHandler(),
+        ],
+    )
+
+    return logging.getLogger(__name__)
+
+
+def get_reference_hashers() -> Dict[str, Callable[[np.ndarray], np.ndarray]]:
+    """
+    Original per-frame hashing of a BGR frame: imagehash on RGB PIL image and opencv img_hash on BGR frame
+    """
+
+    def imagehash_hasher(hasher: Callable) -> Callable[[np.ndarray], np.ndarray]:
+        return lambda frame: hasher(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))).hash.flatten().astype(np.uint8)
+
+    def opencv_hasher(hasher: cv2.img_hash.ImgHashBase) -> Callable[[np.ndarray], np.ndarray]:
+        return lambda frame: hasher.compute(frame).flatten()
+
+    return {
+        "Marr-Hildreth": opencv_hasher(MarrHildrethHash.create()),
+        "BlockMean0": opencv_hasher(BlockMeanHash.create(mode=0)),
+        "BlockMean1": opencv_hasher(BlockMeanHash.create(mode=1)),
+        "RadialVariance": opencv_hasher(RadialVarianceHash.create()),
+        "phash": imagehash_hasher(imagehash.phash),
+        "whash": imagehash_hasher(imagehash.whash),
+        "dhash": imagehash_hasher(imagehash.dhash),
+    }
+
+
+def main() -> None:
+    description = "\n".join([
+        "Check that batched hashing (AbstractFrameHasher.process_batch) is bit-exact with imagehash and opencv img_hash",
+        "on keyframes of real videos and compare speed. Try:",
+        "PYTHONPATH=. python scripts/check_batch_hashers.py -i /home/superustam/jam/light_video_copy_detection/data/core_dataset/ -o core_dataset -n 20",
+    ])
+
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("-i", "--input", help="input directory with videos db", type=str, required=True)
+    parser.add_argument("-o", "--output", help="output directory to store log", type=str, required=True)
+    parser.add_argument("-n", "--limit", help="number of videos to check (default: all)", type=int, default=None)
+    parser.add_argument("--batch-size", help="number of keyframes hashed at once (default: %(default)d)", type=int, default=8)
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    logger = get_logger(f"{args.output}/check_batch_hashers.log")
+
+    if not os.path.exists(args.input):
+        logger.error(f"--input={args.input} doesn't exist")
+        return
+
+    hashers = [
+        MarrHildrethframeHasher(),
+        BlockMeanframeHasher(mode=0),
+        BlockMeanframeHasher(mode=1),
+        RadialVarianceframeHasher(),
+        PHashImageHasher(),
+        WHashImageHasher(),
+        DHashImageHasher(),
+    ]
+    reference_hashers = get_reference_hashers()
+
+    kfe = VideoKeyframeExtractor(logger=logger)
+    preprocessor = FramePreprocessor()
+
+    mismatches = {hasher.name: 0 for hasher in hashers}
+    reference_time = dict.fromkeys(mismatches, 0.0)
+    batch_time = dict.fromkeys(mismatches, 0.0)
+    preprocess_time = 0.0
+    frames_count = 0
+
+    for video_path in glob.glob(f"{args.input}/*/*")[: args.limit]:
+        processed = kfe.extract_stream(filepath=video_path, original_filepath=video_path, sparse=True)
+        if not processed:
+            continue
+
+        _, keyframes = processed
+        batch = []
+        for keyframe in keyframes:
+            batch.append(keyframe)
+            if len(batch) < args.batch_size:
+                continue
+
+            preprocess_time += check_batch(batch, hashers, reference_hashers, preprocessor, mismatches, reference_time, batch_time)
+            frames_count += len(batch)
+            batch = []
+
+        if batch:
+            preprocess_time += check_batch(batch, hashers, reference_hashers, preprocessor, mismatches, reference_time, batch_time)
+            frames_count += len(batch)
+
+        logger.info(f"{video_path=} {frames_count=} {mismatches=}")
+
+    for hasher in hashers:
+        logger.info(
+            f"{hasher.name}: mismatched frames {mismatches[hasher.name]}/{frames_count}, "
+            f"reference {reference_time[hasher.name]:.3f}s, batched {batch_time[hasher.name]:.3f}s"
+        )
+
+    logger.info(f"Done {frames_count=} shared preprocessing {preprocess_time:.3f}s")
+
+
+def check_batch(
+    batch: list,
+    hashers: list,
+    reference_hashers: Dict[str, Callable[[np.ndarray], np.ndarray]],
+    preprocessor: FramePreprocessor,
+    mismatches: Dict[str, int],
+    reference_time: Dict[str, float],
+    batch_time: Dict[str, float],
+) -> float:
+    start_timer = time.perf_counter()
+    frames = [preprocessor.process(keyframe) for keyframe in batch]
+    preprocess_time = time.perf_counter() - start_timer
+
+    for hasher in hashers:
+        start_timer = time.perf_counter()
+        reference = np.stack([reference_hashers[hasher.name](keyframe.frame) for keyframe in batch])
+        reference_time[hasher.name] += time.perf_counter() - start_timer
+
+        start_timer = time.perf_counter()
+        vecs = hasher.process_batch(np.stack([hasher.batch_input(frame) for frame in frames]))
+        batch_time[hasher.name] += time.perf_counter() - start_timer
+
+        mismatches[hasher.name] += int(np.any(vecs != reference, axis=1).sum())
+
+    return preprocess_time
+
+
+if __name__ == "__main__":
+    main()
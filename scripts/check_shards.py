@@ -0,0 +1,106 @@
+import argparse
+import glob
+import logging
+import os
+import shutil
+from typing import Dict
+
+from data_structures.annoy_config import AnnoyConfig
+from entities.annoy_processor import AnnoyProcessor
+from entities.hash_store import HashStore
+from entities.shard_coordinator import ShardCoordinator
+from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
+from frame_hashers.block_mean_image_hasher import BlockMeanframeHasher
+from frame_hashers.dhash_image_hasher import DHashImageHasher
+from frame_hashers.marr_hildreth_image_hasher import MarrHildrethframeHasher
+from frame_hashers.phash_image_hasher import PHashImageHasher
+from frame_hashers.radial_variance_image_hasher import RadialVarianceframeHasher
+from frame_hashers.whash_image_hasher import WHashImageHasher
+from search_algorithms.shazam_search import ShazamSearch
+
+
+def get_hashers() -> Dict[str, AbstractFrameHasher]:
+    return {
+        "Marr-Hildreth": MarrHildrethframeHasher(),
+        "BlockMean0": BlockMeanframeHasher(mode=0),
+        "BlockMean1": BlockMeanframeHasher(mode=1),
+        "RadialVariance": RadialVarianceframeHasher(),
+        "phash": PHashImageHasher(),
+        "whash": WHashImageHasher(),
+        "dhash": DHashImageHasher(),
+    }
+
+
+def get_logger(log_path: str) -> logging.Logger:
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] - %(message)s",
+        handlers=[
+            logging.FileHandler(log_path, mode="w"),
+            logging.StreamHandler(),
+        ],
+    )
+
+    return logging.getLogger(__name__)
+
+
+def check_hash(hash_name: str, args: argparse.Namespace, logger: logging.Logger) -> int:
+    """
+    Build exact indexes of all videos and of shards in <output>/check_shards/<hash>, returns queries with different results
+    """
+    hashes_path = os.path.join(args.output, "check_shards", hash_name)
+    shutil.rmtree(hashes_path, ignore_errors=True)
+    os.makedirs(hashes_path)
+    for path in glob.glob(os.path.join(args.output, "hashes", hash_name, "hash_store*.bin")):
+        shutil.copy(path, hashes_path)
+
+    config = AnnoyConfig(backend="exact")
+    annoy_processor = AnnoyProcessor(hasher=get_hashers()[hash_name], logger=logger, bucket=0, threads=args.threads, config=config)
+    single = ShazamSearch(annoy_db=annoy_processor.create_annoy_db(hashes_path), logger=logger, bucket=0, threads=args.threads, k=config.k)
+    shard_paths = annoy_processor.create_shards(hashes_path, shards=args.shards)
+    coordinator = ShardCoordinator.start_local(get_hashers, hash_name, shard_paths, logger, threads=1, config=config)
+
+    mismatches = 0
+    try:
+        for query_name, frames in sorted(HashStore.load_frames(os.path.join(args.output, "query_hashes", hash_name)).items()):
+            single_results = single.process_frames(frames)
+            sharded_results = coordinator.process_frames(frames)
+            if single_results != sharded_results:
+                mismatches += 1
+                logger.warning(f"{hash_name=} {query_name=}\nsingle:  {single_results}\nsharded: {sharded_results}")
+    finally:
+        coordinator.close()
+
+    shutil.rmtree(hashes_path, ignore_errors=True)
+    return mismatches
+
+
+def main() -> None:
+    description = "\n".join([
+        "Check that search over shards (ShardCoordinator) is equal to search over one index of all videos with exact indexes.",
+        "Hashes of a processed dataset are indexed in <output>/check_shards, indexes of the dataset are not changed. Try:",
+        "PYTHONPATH=. python scripts/check_shards.py -o core_dataset --shards 4",
+    ])
+
+    hash_names = list(get_hashers())
+
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("-o", "--output", help="directory of processed dataset (hashes and query_hashes)", type=str, required=True)
+    parser.add_argument("--hash", help="hash function to check", choices=hash_names + ["all"], default="all")
+    parser.add_argument("--shards", help="number of shards (default: %(default)d)", type=int, default=4)
+    parser.add_argument("-t", "--threads", help="threads of exact search (default: %(default)d)", type=int, default=1)
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    logger = get_logger(f"{args.output}/check_shards.log")
+
+    if not os.path.exists(os.path.join(args.output, "hashes")):
+        logger.error(f"--output={args.output} has no hashes")
+        return
+
+    mismatches = {hash_name: check_hash(hash_name, args, logger) for hash_name in (hash_names if args.hash == "all" else [args.hash])}
+    logger.info(f"Done {mismatches=}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import glob
+import json
+import logging
+import os
+
+import numpy as np
+from data_structures.video_hash import VideoHash
+from entities.hash_store import HashStore
+from frame_hashers.block_mean_image_hasher import BlockMeanframeHasher
+from frame_hashers.dhash_image_hasher import DHashImageHasher
+from frame_hashers.marr_hildreth_image_hasher import MarrHildrethframeHasher
+from frame_hashers.phash_image_hasher import PHashImageHasher
+from frame_hashers.radial_variance_image_hasher import RadialVarianceframeHasher
+from frame_hashers.whash_image_hasher import WHashImageHasher
+
+
+def get_logger(log_path: str) -> logging.Logger:
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] - %(message)s",
+        handlers=[
+            logging.FileHandler(log_path, mode="w"),
+            logging.StreamHandler(),
+        ],
+    )
+
+    return logging.getLogger(__name__)
+
+
+def convert_dir(hashes_dir: str, vector_size: int, packed: bool, remove: bool, logger: logging.Logger) -> int:
+    json_paths = sorted(glob.glob(os.path.join(hashes_dir, "*.json")))
+    store = HashStore(hashes_dir, vector_size, packed)
+
+    for json_path in json_paths:
+        with open(json_path, "r") as f:
+            data = json.load(f)
+
+        vecs = np.array([frame["vec"] for frame in data["frames"]], dtype=np.uint8)  # bool vectors of imagehash become 0/1
+        video_hash = VideoHash(
+            filename=data["filename"],
+            vecs=vecs.reshape(len(vecs), vector_size),
+            timecodes=np.array([frame["timecode"] for frame in data["frames"]], dtype=np.float64),
+            elapsed_time=0.0,  # timings are kept in time.csv, not in json
+            full_elapsed_time=0.0,
+        )
+        store.append(key=os.path.basename(json_path)[:-5], video_hash=video_hash)
+
+    if remove:
+        for json_path in json_paths:
+            os.remove(json_path)
+
+    logger.info(f"{hashes_dir=} videos={len(json_paths)} {packed=}")
+    return len(json_paths)
+
+
+def main() -> None:
+    description = "\n".join([
+        "Convert json hashes (one file per video) of hashes/ and query_hashes/ to hash stores. Try:",
+        "PYTHONPATH=. python scripts/convert_hashes.py -o core_dataset",
+    ])
+
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("-o", "--output", help="directory of processed dataset", type=str, required=True)
+    parser.add_argument("--remove", help="remove json files after conversion", action="store_true")
+    args = parser.parse_args()
+
+    logger = get_logger(f"{args.output}/convert_hashes.log")
+
+    hashers = [
+        MarrHildrethframeHasher(),
+        BlockMeanframeHasher(mode=0),
+        BlockMeanframeHasher(mode=1),
+        RadialVarianceframeHasher(),
+        PHashImageHasher(),
+        WHashImageHasher(),
+        DHashImageHasher(),
+    ]
+
+    videos = 0
+    for hashes_dir in ["hashes", "query_hashes"]:
+        for hasher in hashers:
+            hasher_dir = os.path.join(args.output, hashes_dir, hasher.name)
+            if not os.path.isdir(hasher_dir):
+                continue
+
+            if HashStore.exists(hasher_dir):
+                logger.warning(f"{hasher_dir=} already has hash store, skipped")
+                continue
+
+            videos += convert_dir(hasher_dir, hasher.vector_size, hasher.binary, args.remove, logger)
+
+    logger.info(f"Done {videos=}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import csv
+import glob
+import logging
+import math
+import os
+import time
+
+import numpy as np
+from data_structures.kfe_benchmark_result import KfeBenchmarkResult
+from entities.video_keyframe_extractor import VideoKeyframeExtractor
+
+
+def get_logger(log_path: str, bucket: int, buckets: int) -> logging.Logger:
+    logger = logging.getLogger(__name__)
+    bucket += 1
+
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] [bucket=%(bucket)s/%(buckets)s] - %(message)s",
+        handlers=[
+            logging.FileHandler(log_path, mode="w"),
+            logging.StreamHandler(),
+        ],
+    )
+
+    # Add bucket and buckets as extra attributes to the logger
+    logger = logging.LoggerAdapter(logger, {"bucket": bucket, "buckets": buckets})
+    return logger
+
+
+def main() -> None:
+    description = "\n".join([
+        "Benchmark keyframe extraction: decode every frame (default) vs decode only sampled frames (--sparse).",
+        "Same workload as scripts/video_process.py. Try:",
+        "PYTHONPATH=. python scripts/kfe_benchmark.py -i /home/superustam/jam/light_video_copy_detection/data/core_dataset/ -o core_dataset",
+    ])
+
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("-i", "--input", help="input directory with videos db", type=str, required=True)
+    parser.add_argument("-o", "--output", help="output directory to store benchmark results", type=str, required=True)
+    parser.add_argument("-n", "--limit", help="number of videos to benchmark (default: all)", type=int, default=None)
+    parser.add_argument("-B", "--buckets", help="number of buckets (default: %(default)d)", type=int, default=1)
+    parser.add_argument("-b", "--bucket", help="index of bucket (0...buckets-1, default: %(default)d)", type=int, default=0)
+    args = parser.parse_args()
+
+    videos_dir = args.input
+    output_path = args.output
+
+    os.makedirs(output_path, exist_ok=True)
+    logger = get_logger(f"{output_path}/kfe_benchmark_{args.bucket}.log", args.bucket, args.buckets)
+
+    if not os.path.exists(videos_dir):
+        logger.error(f"--input={videos_dir} doesn't exist")
+        return
+
+    if 0 > args.bucket or args.bucket >= args.buckets:
+        logger.error(f"The --bucket={args.bucket} must be 0 <= --bucket < --buckets={args.buckets}")
+        return
+
+    kfe = VideoKeyframeExtractor(logger=logger)
+
+    video_paths = glob.glob(f"{videos_dir}/*/*")[: args.limit]
+    len_video_paths = len(video_paths)
+
+    start_with_video = math.ceil(len_video_paths * args.bucket / args.buckets)
+    end_with_video = min(len_video_paths, math.ceil(len_video_paths * (args.bucket + 1) / args.buckets))
+
+    results = []
+    for i, video_path in enumerate(video_paths[start_with_video:end_with_video]):
+        logger.info(f"i={start_with_video + i} {video_path=}")
+
+        if video_path[video_path.rfind(".") + 1:] == "flv":  # flv is decoded by ffmpeg to a pipe, sparse grabbing is of opencv only
+            continue
+
+        start_timer = time.perf_counter()
+        dense = kfe.extract(filepath=video_path, original_filepath=video_path)
+        dense_time = time.perf_counter() - start_timer
+
+        start_timer = time.perf_counter()
+        sparse = kfe.extract(filepath=video_path, original_filepath=video_path, sparse=True)
+        sparse_time = time.perf_counter() - start_timer
+
+        if not dense or not sparse:
+            logger.error(f"{video_path=}")
+            continue
+
+        metadata, dense_frames = dense
+        _, sparse_frames = sparse
+        same_keyframes = len(dense_frames) == len(sparse_frames) and all(
+            x.timecode == y.timecode and np.array_equal(x.frame, y.frame) for x, y in zip(dense_frames, sparse_frames)
+        )
+        if not same_keyframes:
+            logger.warning(f"Sparse keyframes differ from dense ones: {video_path=}")
+
+        results.append(KfeBenchmarkResult(video_path, metadata.frames_count, len(dense_frames), dense_time, sparse_time, same_keyframes))
+
+    with open(os.path.join(output_path, f"kfe_benchmark_{args.bucket}.csv"), "w", newline="") as f:
+        csv_writer = csv.writer(f, delimiter=",")
+        csv_writer.writerow(KfeBenchmarkResult.to_csv_header())
+        for result in results:
+            csv_writer.writerow(result.to_csv())
+
+    dense_time = sum(result.dense_time for result in results)
+    sparse_time = sum(result.sparse_time for result in results)
+    logger.info(f"Done videos={len(results)} {dense_time=:.2f}s {sparse_time=:.2f}s speedup={dense_time / max(sparse_time, 1e-9):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import csv
+import logging
+import os
+import shutil
+import time
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+from data_structures.index_benchmark_result import IndexBenchmarkResult
+from entities.hash_store import HashStore
+from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
+from frame_hashers.dhash_image_hasher import DHashImageHasher
+from frame_hashers.phash_image_hasher import PHashImageHasher
+from frame_hashers.whash_image_hasher import WHashImageHasher
+from frame_indexes.abstract_frame_index import AbstractFrameIndex
+from frame_indexes.annoy_frame_index import AnnoyFrameIndex
+from frame_indexes.exact_frame_index import ExactFrameIndex
+from frame_indexes.mih_frame_index import MIHFrameIndex
+
+
+def get_logger(log_path: str) -> logging.Logger:
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] - %(message)s",
+        handlers=[
+            logging.FileHandler(log_path, mode="w"),
+            logging.StreamHandler(),
+        ],
+    )
+
+    return logging.getLogger(__name__)
+
+
+def get_indexes(hasher: AbstractFrameHasher, threads: int, n_trees: int) -> Dict[str, Callable[[], AbstractFrameIndex]]:
+    return {
+        "exact": lambda: ExactFrameIndex(vector_size=hasher.vector_size, metric=hasher.metric, binary=hasher.binary, threads=threads),
+        "mih": lambda: MIHFrameIndex(vector_size=hasher.vector_size, metric=hasher.metric, binary=hasher.binary, threads=threads),
+        "annoy_hamming": lambda: AnnoyFrameIndex(vector_size=hasher.vector_size, metric="hamming", binary=hasher.binary, threads=threads, n_trees=n_trees),
+        # the search before hamming metric: euclidean annoy on 0/1 vectors, distance is sqrt(hamming) too
+        "annoy_euclidean": lambda: AnnoyFrameIndex(vector_size=hasher.vector_size, metric="euclidean", binary=hasher.binary, threads=threads, n_trees=n_trees),
+    }
+
+
+def benchmark(index: AbstractFrameIndex, vecs: np.ndarray, queries: np.ndarray, k: int, save_dir: str) -> Tuple[float, int, float, np.ndarray, np.ndarray]:
+    """
+    Build, save and load (memory-mapped) the index, then search all queries at once
+    """
+    start_timer = time.perf_counter()
+    for item, vec in enumerate(vecs):
+        index.add(item, vec)
+
+    index.build()
+    build_time = time.perf_counter() - start_timer
+
+    index.save(save_dir)
+    index.load(save_dir)
+
+    start_timer = time.perf_counter()
+    ids, distances = index.search_batch(queries, k)
+    search_time = time.perf_counter() - start_timer
+
+    return build_time, index.size(), search_time, ids, distances
+
+
+def recall(distances: np.ndarray, exact_distances: np.ndarray) -> float:
+    """
+    Neighbours within the exact k-th distance are correct, so equal distances in other order are not counted as errors
+    """
+    exact_found = np.isfinite(exact_distances)
+    kth_distance = np.where(exact_found, exact_distances, -np.inf).max(axis=1)
+    correct = (distances <= kth_distance[:, np.newaxis] + 1e-9) & np.isfinite(distances)
+
+    return float(correct.sum() / max(1, exact_found.sum()))
+
+
+def main() -> None:
+    description = "\n".join([
+        "Benchmark multi-index hashing against annoy (hamming and euclidean on bits) and exact search",
+        "on hashes of videos (hashes/) with frames of query videos (query_hashes/). Try:",
+        "PYTHONPATH=. python scripts/mih_benchmark.py -i core_dataset -o core_dataset",
+    ])
+
+    hashers = {
+        "phash": PHashImageHasher(),
+        "whash": WHashImageHasher(),
+        "dhash": DHashImageHasher(),
+    }
+
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--hash", help="64-bit hash function to benchmark", choices=list(hashers) + ["all"], default="all")
+    parser.add_argument("-i", "--input", help="directory of processed dataset (hashes/, query_hashes/)", type=str, required=True)
+    parser.add_argument("-o", "--output", help="output directory to store benchmark results", type=str, required=True)
+    parser.add_argument("-k", help="nearest frames per query frame (default: %(default)d)", type=int, default=10)
+    parser.add_argument("-n", "--limit", help="number of query frames (default: all)", type=int, default=None)
+    parser.add_argument("--n-trees", help="trees of annoy indexes (default: %(default)d)", type=int, default=1000)
+    parser.add_argument("-t", "--threads", help="threads of build and batched search (default: number of cpus)", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    logger = get_logger(f"{args.output}/mih_benchmark.log")
+
+    if not os.path.exists(args.input):
+        logger.error(f"--input={args.input} doesn't exist")
+        return
+
+    results = []
+    for hash_name in list(hashers) if args.hash == "all" else [args.hash]:
+        hasher = hashers[hash_name]
+        vecs = HashStore.load(os.path.join(args.input, "hashes", hash_name)).vecs
+        queries = HashStore.load(os.path.join(args.input, "query_hashes", hash_name)).vecs[: args.limit]
+        exact_distances = None
+
+        for index_name, create_index in get_indexes(hasher, args.threads, args.n_trees).items():
+            save_dir = os.path.join(args.output, "mih_benchmark", hash_name, index_name)
+            os.makedirs(save_dir, exist_ok=True)
+
+            build_time, index_bytes, search_time, _, distances = benchmark(create_index(), vecs, queries, args.k, save_dir)
+            exact_distances = distances if exact_distances is None else exact_distances  # exact search goes first
+            shutil.rmtree(save_dir)
+
+            results.append(IndexBenchmarkResult(
+                hash_name=hash_name,
+                index_name=index_name,
+                items=len(vecs),
+                queries=len(queries),
+                build_time=build_time,
+                index_bytes=index_bytes,
+                search_time=search_time,
+                recall=recall(distances, exact_distances),
+            ))
+            logger.info(f"{results[-1]}")
+
+    with open(os.path.join(args.output, "mih_benchmark.csv"), "w", encoding="utf-8") as f:
+        csv_writer = csv.writer(f, delimiter=",")
+        csv_writer.writerow(IndexBenchmarkResult.to_csv_header())
+        for result in results:
+            csv_writer.writerow(result.to_csv())
+
+    logger.info(f"Done {len(results)=}")
+
+
+if __name__ == "__main__":
+    main()
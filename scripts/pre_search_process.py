@@ -6,8 +6,11 @@ import math
 import os
 from typing import Dict
 
+from data_structures.annoy_config import AnnoyConfig
+from data_structures.landmark_config import LandmarkConfig
 from data_structures.search_result import SearchResult
 from entities.annoy_processor import AnnoyProcessor
+from entities.landmark_processor import LandmarkProcessor
 from frame_hashers.block_mean_image_hasher import BlockMeanframeHasher
 from frame_hashers.dhash_image_hasher import DHashImageHasher
 from frame_hashers.marr_hildreth_image_hasher import MarrHildrethframeHasher
@@ -77,6 +80,17 @@ def main() -> None:
     parser.add_argument("-o", "--output", help="output directory to store results", type=str, required=True)
     parser.add_argument("-B", "--buckets", help="number of buckets (default: %(default)d)", type=int, default=1)
     parser.add_argument("-b", "--bucket", help="index of bucket (0...buckets-1, default: %(default)d)", type=int, default=0)
+    parser.add_argument("--incremental", help="index only new videos as a new segment instead of full rebuild", action="store_true")
+    parser.add_argument("--max-segments", help="merge segments when there are more (default: %(default)d)", type=int, default=8)
+    parser.add_argument("--annoy-config", help="n_trees, search_k, k per hash function (default: <input>/annoy_config.json)", type=str, default=None)
+    parser.add_argument("--backend", help="annoy, exact or mih search (default: from config, annoy)", choices=["annoy", "exact", "mih"], default=None)
+    parser.add_argument(
+        "--metric", help="index metric of bit hashes, RadialVariance is euclidean (default: config, hamming)", choices=["hamming", "euclidean"], default=None
+    )
+    parser.add_argument("--landmarks", help="also build landmark index of Landmark search, not updated by --incremental", action="store_true")
+    parser.add_argument("--landmark-bands", help="landmark keys per frame of Landmark search (default: %(default)d)", type=int, default=4)
+    parser.add_argument("--landmark-fan-out", help="frames paired with an anchor frame, 0 - single frames (default: %(default)d)", type=int, default=2)
+    parser.add_argument("--shards", help="also partition videos to this number of separately built shards (default: no shards)", type=int, default=0)
     args = parser.parse_args()
 
     input_path = args.input
@@ -95,6 +109,7 @@ def main() -> None:
         return
 
     hash_names = hash_names if args.hash == "all" else [args.hash]
+    configs = AnnoyConfig.load(args.annoy_config or os.path.join(input_path, "annoy_config.json"), args.backend, hash_names, args.metric)
 
     len_hash_paths = len(hash_names)
     start_with_hash = math.ceil(len_hash_paths * args.bucket / args.buckets)
@@ -108,9 +123,30 @@ def main() -> None:
             logger=logger,
             bucket=args.bucket,
             threads=max(1, int(os.cpu_count() / args.buckets)),
+            config=configs.get(hash_name),
         )
-        annoy_processor.create_annoy_db(os.path.join(input_path, "hashes", hash_name))
-        logger.info(f'Annoy index successfully set up for {hash_name}: {os.path.join(output_path, "hashes", hash_name, "annoy_index.ann")}')
+        if args.incremental:
+            videos = annoy_processor.create_segment(os.path.join(input_path, "hashes", hash_name), max_segments=args.max_segments)
+            logger.info(f"Annoy segments successfully updated for {hash_name} (metric={annoy_processor.metric}): new {videos=}")
+        else:
+            annoy_processor.create_annoy_db(os.path.join(input_path, "hashes", hash_name))
+            index_path = os.path.join(output_path, "hashes", hash_name, annoy_processor.frame_index.filename)
+            logger.info(f"Annoy index successfully set up for {hash_name} (metric={annoy_processor.metric}): {index_path}")
+
+        if args.shards > 0 and not args.incremental:
+            shard_paths = annoy_processor.create_shards(os.path.join(input_path, "hashes", hash_name), shards=args.shards)
+            logger.info(f"Annoy shards successfully set up for {hash_name}: shards={len(shard_paths)}")
+
+        if args.landmarks and args.incremental:  # it's a sort of all keys, a rebuild per new video costs as much as the full one
+            logger.warning(f"Landmarks of {hash_name} aren't updated with --incremental, new videos are found by Landmark after a full run")
+        elif args.landmarks:
+            landmark_processor = LandmarkProcessor(
+                hasher=hashers[hash_name],
+                logger=logger,
+                bucket=args.bucket,
+                config=LandmarkConfig(bands=args.landmark_bands, fan_out=args.landmark_fan_out),
+            )
+            landmark_processor.create_landmark_db(os.path.join(input_path, "hashes", hash_name))
 
     logger.info(f"Done threads={max(1, int(os.cpu_count() / args.buckets))}")
 
@@ -15,6 +15,8 @@ from frame_hashers.whash_image_hasher import WHashImageHasher
 from quality_plotters.folder_metric_plotter import FolderMetricPlotter
 from quality_plotters.global_metric_plotter import GlobalMetricPlotter
 from quality_plotters.time_metric_plotter import TimeMetricPlotter
+from search_algorithms.landmark_search import LandmarkSearch
+from search_algorithms.progressive_shazam_search import ProgressiveShazamSearch
 from search_algorithms.shazam_search import ShazamSearch
 
 
@@ -74,14 +76,19 @@ def main() -> None:
     }
     searchers = {
         "Shazam": ShazamSearch,
+        "Landmark": LandmarkSearch,
+        "ShazamProgressive": ProgressiveShazamSearch,
     }
 
     hash_names = list(hashers.keys())
     search_names = list(searchers.keys())
+    opt_in_search_names = ["Landmark", "ShazamProgressive"]  # not in --search all, Landmark needs pre_search_process.py --landmarks
 
     parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
     parser.add_argument("--hash", help="hash function to use", choices=hash_names + ["all"], default="all")
-    parser.add_argument("--search", help="search algorithm to use", choices=search_names + ["all"], default="all")
+    parser.add_argument(
+        "--search", help=f"search algorithm to use, all - except {', '.join(opt_in_search_names)}", choices=search_names + ["all"], default="all"
+    )
     parser.add_argument("-i", "--input", help="input directory of results", type=str, required=True)
     parser.add_argument("-o", "--output", help="output directory to store quality plots", type=str, required=True)
     parser.add_argument("-B", "--buckets", help="number of buckets (default: %(default)d)", type=int, default=1)
@@ -105,7 +112,7 @@ def main() -> None:
         return
 
     hash_names = hash_names if args.hash == "all" else [args.hash]
-    search_names = search_names if args.search == "all" else [args.search]
+    search_names = [name for name in search_names if name not in opt_in_search_names] if args.search == "all" else [args.search]
 
     # plotting
     metric_plotters = [
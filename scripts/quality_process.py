@@ -14,6 +14,8 @@ from frame_hashers.marr_hildreth_image_hasher import MarrHildrethframeHasher
 from frame_hashers.phash_image_hasher import PHashImageHasher
 from frame_hashers.radial_variance_image_hasher import RadialVarianceframeHasher
 from frame_hashers.whash_image_hasher import WHashImageHasher
+from search_algorithms.landmark_search import LandmarkSearch
+from search_algorithms.progressive_shazam_search import ProgressiveShazamSearch
 from search_algorithms.shazam_search import ShazamSearch
 
 
@@ -93,6 +95,37 @@ def calculate_metrics(
     return metrics_per_folder
 
 
+def load_ground_truth(
+    input_path: str,
+) -> Tuple[Dict[Tuple[str, str, str], List[Tuple[str, str, str]]], Dict[Tuple[str, str, str], str]]:
+    """
+    Pairs of copied fragments from annotation/*.txt: ground truth fragments of every fragment and folder (annotation file) of fragments
+    """
+    ground_truth_data = {}
+    query2folder = {}
+
+    txt_annot = glob.glob(os.path.join(input_path, "annotation", "*.txt"))
+    for txtfile in txt_annot:
+        folder_name = txtfile[txtfile.rfind("/") + 1: txtfile.rfind(".")]
+
+        with open(txtfile, "r") as list_sources:
+            for row in list_sources:
+                cells = row.split(",")
+                if cells[0] == cells[1] and cells[2] == cells[4] and cells[3] == cells[5]:
+                    continue
+
+                cells[5] = cells[5].strip()
+
+                k1 = (cells[0], cells[2], cells[3])
+                k2 = (cells[1], cells[4], cells[5])
+                ground_truth_data.setdefault(k1, []).append(k2)
+                ground_truth_data.setdefault(k2, []).append(k1)
+                query2folder[k1] = folder_name
+                query2folder[k2] = folder_name
+
+    return ground_truth_data, query2folder
+
+
 def get_logger(log_path: str, bucket: int, buckets: int) -> logging.Logger:
     logger = logging.getLogger(__name__)
     bucket += 1
@@ -139,13 +172,18 @@ def main() -> None:
     }
     searchers = {
         "Shazam": ShazamSearch,
+        "Landmark": LandmarkSearch,
+        "ShazamProgressive": ProgressiveShazamSearch,
     }
     hash_names = list(hashers.keys())
     search_names = list(searchers.keys())
+    opt_in_search_names = ["Landmark", "ShazamProgressive"]  # not in --search all, Landmark needs pre_search_process.py --landmarks
 
     parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
     parser.add_argument("--hash", help="hash function to use", choices=hash_names + ["all"], default="all")
-    parser.add_argument("--search", help="search algorithm to use", choices=search_names + ["all"], default="all")
+    parser.add_argument(
+        "--search", help=f"search algorithm to use, all - except {', '.join(opt_in_search_names)}", choices=search_names + ["all"], default="all"
+    )
     parser.add_argument("-i", "--input", help="input directory of results", type=str, required=True)
     parser.add_argument("-o", "--output", help="output directory to store quality results", type=str, required=True)
     parser.add_argument("-B", "--buckets", help="number of buckets (default: %(default)d)", type=int, default=1)
@@ -168,30 +206,10 @@ def main() -> None:
         return
 
     hash_names = hash_names if args.hash == "all" else [args.hash]
-    search_names = search_names if args.search == "all" else [args.search]
+    search_names = [name for name in search_names if name not in opt_in_search_names] if args.search == "all" else [args.search]
 
     # setup ground true data for quality tests
-    ground_truth_data = {}
-    query2folder = {}
-
-    txt_annot = glob.glob(os.path.join(input_path, "annotation", "*.txt"))
-    for txtfile in txt_annot:
-        folder_name = txtfile[txtfile.rfind("/") + 1: txtfile.rfind(".")]
-
-        with open(txtfile, "r") as list_sources:
-            for row in list_sources:
-                cells = row.split(",")
-                if cells[0] == cells[1] and cells[2] == cells[4] and cells[3] == cells[5]:
-                    continue
-
-                cells[5] = cells[5].strip()
-
-                k1 = (cells[0], cells[2], cells[3])
-                k2 = (cells[1], cells[4], cells[5])
-                ground_truth_data.setdefault(k1, []).append(k2)
-                ground_truth_data.setdefault(k2, []).append(k1)
-                query2folder[k1] = folder_name
-                query2folder[k2] = folder_name
+    ground_truth_data, query2folder = load_ground_truth(input_path)
 
     # start of quality metrics calculation
     final_results: List[QualityResult] = []
@@ -199,9 +217,9 @@ def main() -> None:
     for hash_name in hash_names:
         for search_name in search_names:
             experiments_dir = os.path.join(output_path, search_name, hash_name)
-            metrics_per_folder = calculate_metrics(experiments_dir, ground_truth_data, query2folder)
+            metrics_per_folder = calculate_metrics(experiments_dir, ground_truth_data, query2folder, logger)
 
-            save_search_results(save_dir=experiments_dir, metrics=list(metrics_per_folder.values()), metric_class=QualityResultFolder, logger=logger)
+            save_search_results(save_dir=experiments_dir, metrics=list(metrics_per_folder.values()), metric_class=QualityResultFolder)
             final_results.append(QualityResult(search_name, hash_name, list(metrics_per_folder.values())))
 
     save_search_results(save_dir=output_path, metrics=final_results, metric_class=QualityResult)
@@ -0,0 +1,143 @@
+import argparse
+import csv
+import glob
+import logging
+import os
+import time
+from typing import List, Tuple
+
+import numpy as np
+from data_structures.resolution_benchmark_result import ResolutionBenchmarkResult
+from entities.video_processor import VideoProcessor
+from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
+from frame_hashers.block_mean_image_hasher import BlockMeanframeHasher
+from frame_hashers.dhash_image_hasher import DHashImageHasher
+from frame_hashers.marr_hildreth_image_hasher import MarrHildrethframeHasher
+from frame_hashers.phash_image_hasher import PHashImageHasher
+from frame_hashers.radial_variance_image_hasher import RadialVarianceframeHasher
+from frame_hashers.whash_image_hasher import WHashImageHasher
+
+
+def get_logger(log_path: str) -> logging.Logger:
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] - %(message)s",
+        handlers=[
+            logging.FileHandler(log_path, mode="w"),
+            logging.StreamHandler(),
+        ],
+    )
+
+    return logging.getLogger(__name__)
+
+
+def get_hashers() -> List[AbstractFrameHasher]:
+    return [
+        MarrHildrethframeHasher(),
+        BlockMeanframeHasher(mode=0),
+        BlockMeanframeHasher(mode=1),
+        RadialVarianceframeHasher(),
+        PHashImageHasher(),
+        WHashImageHasher(),
+        DHashImageHasher(),
+    ]
+
+
+def changed_bits(hasher: AbstractFrameHasher, full: np.ndarray, reduced: np.ndarray) -> Tuple[int, int, float]:
+    """
+    Changed and all bits of hashes and sum of distances between them in the metric of the hasher.
+    opencv hamming hashes are packed bits, components are compared for euclidean hashes
+    """
+    if hasher.metric == "hamming" and not hasher.binary:
+        changed = int(np.unpackbits(full ^ reduced).sum())
+        return changed, full.size * 8, float(changed)
+
+    changed = int((full != reduced).sum())
+    if hasher.metric == "hamming":
+        return changed, full.size, float(changed)
+
+    return changed, full.size, float(np.linalg.norm(full.astype(np.float64) - reduced, axis=1).sum())
+
+
+def main() -> None:
+    description = "\n".join([
+        "Check the effect of downscaled keyframes (--resolution of scripts/video_process.py) on hash bits and compare speed",
+        "with full size keyframes. Metrics of search are compared by quality_process.py on datasets processed with both resolutions. Try:",
+        "PYTHONPATH=. python scripts/resolution_benchmark.py -i /home/superustam/jam/light_video_copy_detection/data/core_dataset/ -o core_dataset -n 20",
+    ])
+
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("-i", "--input", help="input directory with videos db", type=str, required=True)
+    parser.add_argument("-o", "--output", help="output directory to store benchmark results (resolution_benchmark.csv)", type=str, required=True)
+    parser.add_argument("-n", "--limit", help="number of videos to benchmark (default: all)", type=int, default=None)
+    parser.add_argument("--resolution", help="short side of downscaled keyframes in pixels (default: %(default)d)", type=int, default=256)
+    parser.add_argument("--sparse", help="decode only sampled frames, as --sparse of scripts/video_process.py", action="store_true")
+    parser.add_argument("-t", "--threads", help="threads of ffmpeg (default: %(default)d)", type=int, default=1)
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    logger = get_logger(f"{args.output}/resolution_benchmark.log")
+
+    if not os.path.exists(args.input):
+        logger.error(f"--input={args.input} doesn't exist")
+        return
+
+    hashers = get_hashers()
+    processors = [
+        VideoProcessor(hashers=hashers, logger=logger, bucket=0, threads=args.threads, sparse=args.sparse, resolution=resolution)
+        for resolution in (0, args.resolution)
+    ]
+    results = {hasher.name: ResolutionBenchmarkResult(hasher.name, args.resolution, 0, 0, 0, 0, 0.0, 0.0, 0.0) for hasher in hashers}
+    process_time = [0.0, 0.0]
+    keyframe_bytes = [0, 0]
+
+    for i, video_path in enumerate(glob.glob(f"{args.input}/*/*")[: args.limit]):
+        logger.info(f"{i=} {video_path=}")
+
+        processed = []
+        for j, video_processor in enumerate(processors):
+            start_timer = time.perf_counter()
+            processed.append(video_processor.process(video_path))
+            process_time[j] += time.perf_counter() - start_timer
+
+        if not processed[0] or not processed[1]:
+            logger.error(f"{video_path=}")
+            continue
+
+        (metadata, full_hashes), (_, reduced_hashes) = processed
+        for hasher in hashers:
+            full, reduced, result = full_hashes[hasher.name], reduced_hashes[hasher.name], results[hasher.name]
+            changed, bits, distance = changed_bits(hasher, full.vecs, reduced.vecs)
+
+            result.keyframes += len(full.vecs)
+            result.changed_keyframes += int(np.any(full.vecs != reduced.vecs, axis=1).sum())
+            result.changed_bits += changed
+            result.bits += bits
+            result.distance += distance
+            result.full_time += full.elapsed_time
+            result.reduced_time += reduced.elapsed_time
+
+        keyframes = len(full_hashes[hashers[0].name].vecs)
+        for j, resolution in enumerate((0, args.resolution)):
+            width, height = metadata.keyframe_size(resolution)
+            keyframe_bytes[j] += keyframes * width * height * 3
+
+    with open(os.path.join(args.output, "resolution_benchmark.csv"), "w", newline="") as f:
+        csv_writer = csv.writer(f, delimiter=",")
+        csv_writer.writerow(ResolutionBenchmarkResult.to_csv_header())
+        for result in results.values():
+            csv_writer.writerow(result.to_csv())
+            logger.info(
+                f"{result.hash_name}: changed keyframes {result.changed_keyframes}/{result.keyframes}, "
+                f"bit flip rate {result.changed_bits / max(result.bits, 1):.4f}, mean distance {result.distance / max(result.keyframes, 1):.3f}"
+            )
+
+    keyframes = max(1, results[hashers[0].name].keyframes)
+    logger.info(
+        f"Done full_time={process_time[0]:.2f}s reduced_time={process_time[1]:.2f}s speedup={process_time[0] / max(process_time[1], 1e-9):.2f}x "
+        f"bytes per keyframe {keyframe_bytes[0] // keyframes} -> {keyframe_bytes[1] // keyframes}"
+    )
+
+
+if __name__ == "__main__":
+    main()
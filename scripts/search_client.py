@@ -0,0 +1,113 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+from entities.hash_store import HashStore
+
+
+def get_logger(log_path: str) -> logging.Logger:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] - %(message)s",
+        handlers=[
+            logging.FileHandler(log_path, mode="w"),
+            logging.StreamHandler(),
+        ],
+    )
+
+    return logging.getLogger(__name__)
+
+
+def post(url: str, request: dict) -> Tuple[int, dict]:
+    http_request = urllib.request.Request(url, data=json.dumps(request).encode("utf-8"), headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(http_request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}")
+
+
+def prepare_requests(query_hashes_dir: str, hash_names: List[str], search_name: str, topk: int) -> List[Dict]:
+    requests = []
+    for hash_name in hash_names:
+        for name, frames in HashStore.load_frames(os.path.join(query_hashes_dir, hash_name)).items():
+            frames = [{"vec": np.asarray(frame["vec"], dtype=np.uint8).tolist(), "timecode": frame["timecode"]} for frame in frames]
+            requests.append({"hash": hash_name, "search": search_name, "frames": frames, "topk": topk, "name": name})
+
+    return requests
+
+
+def main() -> None:
+    description = "\n".join([
+        "Load test of scripts/search_server.py: precomputed query hashes are sent by concurrent clients on the same machine.",
+        "Per-request latencies are saved to search_client.csv. Try:",
+        "PYTHONPATH=. python scripts/search_client.py -i core_dataset --url http://127.0.0.1:8000 -c 8 -n 1000",
+    ])
+
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("-i", "--input", help="directory of processed dataset with query hashes (query_hashes/)", type=str, required=True)
+    parser.add_argument("--url", help="search server url (default: %(default)s)", type=str, default="http://127.0.0.1:8000")
+    parser.add_argument("--hash", help="hash functions to query, comma separated (default: all in query_hashes/)", type=str, default=None)
+    parser.add_argument("--search", help="search algorithm (default: %(default)s)", type=str, default="Shazam")
+    parser.add_argument("--topk", help="number of results per query (default: %(default)d)", type=int, default=10)
+    parser.add_argument("-c", "--concurrency", help="number of concurrent clients (default: %(default)d)", type=int, default=4)
+    parser.add_argument("-n", "--requests", help="number of requests, queries are repeated in a loop (default: one per query)", type=int, default=None)
+    args = parser.parse_args()
+
+    logger = get_logger(f"{args.input}/search_client.log")
+
+    query_hashes_dir = os.path.join(args.input, "query_hashes")
+    if not os.path.exists(query_hashes_dir):
+        logger.error(f"{query_hashes_dir} doesn't exist")
+        return
+
+    hash_names = args.hash.split(",") if args.hash else sorted(os.listdir(query_hashes_dir))
+    requests = prepare_requests(query_hashes_dir, hash_names, args.search, args.topk)
+    if not requests:
+        logger.error(f"No query hashes in {query_hashes_dir}")
+        return
+
+    n_requests = args.requests or len(requests)
+    logger.info(f"queries={len(requests)} {n_requests=} concurrency={args.concurrency} url={args.url}")
+
+    def send(i: int) -> list:
+        request = requests[i % len(requests)]
+        start_timer = time.perf_counter()
+        status, response = post(f"{args.url}/search", request)
+        latency = time.perf_counter() - start_timer
+
+        return [request["name"], request["hash"], status, latency, response.get("elapsed_time"), response.get("error", "")]
+
+    start_timer = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        rows = list(executor.map(send, range(n_requests)))
+
+    elapsed_time = time.perf_counter() - start_timer
+
+    with open(os.path.join(args.input, "search_client.csv"), "w", newline="") as f:
+        csv_writer = csv.writer(f, delimiter=",")
+        csv_writer.writerow(["name", "hash", "status", "latency", "server_elapsed_time", "error"])
+        csv_writer.writerows(rows)
+
+    latencies = np.array([row[3] for row in rows])
+    errors = sum(row[2] != 200 for row in rows)
+    logger.info(
+        f"Done requests={n_requests} {errors=} throughput={n_requests / elapsed_time:.1f} req/s "
+        f"latency p50={np.percentile(latencies, 50) * 1e3:.1f}ms p95={np.percentile(latencies, 95) * 1e3:.1f}ms "
+        f"p99={np.percentile(latencies, 99) * 1e3:.1f}ms max={latencies.max() * 1e3:.1f}ms"
+    )
+
+    with urllib.request.urlopen(f"{args.url}/metrics") as response:
+        logger.info(f"Server metrics: {json.loads(response.read())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,45 @@
 import argparse
 import csv
-import glob
 import json
 import logging
 import math
 import os
 import sys
 import time
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Tuple, Union
 
+from data_structures.annoy_config import AnnoyConfig
+from data_structures.search_item_result import SearchItemResult
 from data_structures.search_result import SearchResult
 from entities.annoy_processor import AnnoyProcessor
+from entities.hash_store import HashStore
+from entities.index_registry import IndexRegistry
+from entities.landmark_processor import LandmarkProcessor
+from entities.shard_coordinator import ShardCoordinator
+from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
 from frame_hashers.block_mean_image_hasher import BlockMeanframeHasher
 from frame_hashers.dhash_image_hasher import DHashImageHasher
 from frame_hashers.marr_hildreth_image_hasher import MarrHildrethframeHasher
 from frame_hashers.phash_image_hasher import PHashImageHasher
 from frame_hashers.radial_variance_image_hasher import RadialVarianceframeHasher
 from frame_hashers.whash_image_hasher import WHashImageHasher
+from search_algorithms.landmark_search import LandmarkSearch
+from search_algorithms.progressive_shazam_search import ProgressiveShazamSearch
 from search_algorithms.shazam_search import ShazamSearch
 
 
+def get_hashers() -> Dict[str, AbstractFrameHasher]:
+    return {
+        "Marr-Hildreth": MarrHildrethframeHasher(),
+        "BlockMean0": BlockMeanframeHasher(mode=0),
+        "BlockMean1": BlockMeanframeHasher(mode=1),
+        "RadialVariance": RadialVarianceframeHasher(),
+        "phash": PHashImageHasher(),
+        "whash": WHashImageHasher(),
+        "dhash": DHashImageHasher(),
+    }
+
+
 def get_logger(log_path: str, bucket: int, buckets: int) -> logging.Logger:
     logger = logging.getLogger(__name__)
     bucket += 1
@@ -59,15 +79,137 @@ def save_search_results(name2search: Dict[str, SearchResult], bucket: int) -> No
             csv_writer.writerow(search_result.to_csv())
 
 
-def check_corectly_number_across_hash_function(hash_names: List, queries: Dict, output_path: str, logger: logging.Logger) -> None:
-    len_query_paths = -1
+def check_corectly_number_across_hash_function(hash_names: List, queries: Dict, logger: logging.Logger) -> None:
+    query_names = set(queries[hash_names[0]])
     for hash_name in hash_names:
-        queries[hash_name] = glob.glob(os.path.join(output_path, "query_hashes", hash_name, "*.json"))
-        if len_query_paths > len(queries[hash_name]):
-            logger.error("The number of query videos is not the same for all hash functions")
+        if set(queries[hash_name]) != query_names:
+            logger.error("The query videos are not the same for all hash functions")
             sys.exit()
-        else:
-            len_query_paths = len(queries[hash_name])
+
+
+def start_shard_coordinators(
+    args: argparse.Namespace, hash_names: List[str], configs: Dict[str, AnnoyConfig], logger: logging.Logger
+) -> Dict[str, ShardCoordinator]:
+    if args.shard_servers and len(hash_names) != 1:
+        logger.error("--shard-servers serve shards of one hash function, set --hash")
+        sys.exit()
+
+    coordinators = {}
+    for hash_name in hash_names:
+        if args.shard_servers:
+            addresses = [(address.rsplit(":", 1)[0], int(address.rsplit(":", 1)[1])) for address in args.shard_servers.split(",")]
+            coordinators[hash_name] = ShardCoordinator.connect(
+                addresses, authkey=args.authkey.encode("utf-8"), logger=logger, k=configs.get(hash_name, AnnoyConfig()).k
+            )
+        elif args.sharded:
+            coordinators[hash_name] = ShardCoordinator.start_local(
+                hashers_factory=get_hashers,
+                hash_name=hash_name,
+                shard_paths=AnnoyProcessor.shard_paths(os.path.join(args.output, "hashes", hash_name)),
+                logger=logger,
+                threads=max(1, int(os.cpu_count() / args.buckets)),
+                config=configs.get(hash_name),
+            )
+
+    return coordinators
+
+
+def create_search_engine(
+    search_name: str,
+    hash_name: str,
+    args: argparse.Namespace,
+    index_registry: IndexRegistry,
+    coordinators: Dict[str, ShardCoordinator],
+    configs: Dict[str, AnnoyConfig],
+    logger: logging.Logger,
+) -> Optional[Union[ShazamSearch, ShardCoordinator, LandmarkSearch]]:
+    threads = max(1, int(os.cpu_count() / args.buckets))
+
+    if search_name == "Landmark":  # inverted index of landmarks, annoy index isn't loaded
+        hasher = index_registry.hashers[hash_name]
+        landmark_processor = LandmarkProcessor(hasher=hasher, logger=logger, bucket=args.bucket)
+        landmark_db = landmark_processor.load_landmark_db_from_disk(os.path.join(args.output, "hashes", hash_name))
+        if landmark_db is None:
+            return None
+
+        return LandmarkSearch(landmark_db=landmark_db, hasher=hasher, logger=logger, bucket=args.bucket, threads=threads)
+
+    if hash_name not in coordinators and not index_registry.check(hash_name):
+        return None
+
+    if search_name == "ShazamProgressive":  # shards are searched only by Shazam
+        return ProgressiveShazamSearch(
+            annoy_db=index_registry.get(hash_name),
+            logger=logger,
+            bucket=args.bucket,
+            threads=threads,
+            k=configs.get(hash_name, AnnoyConfig()).k,
+            chunk_size=args.chunk_size,
+            confidence=args.confidence,
+        )
+
+    # coordinators of shards rank as ShazamSearch
+    return coordinators.get(hash_name) or ShazamSearch(
+        annoy_db=index_registry.get(hash_name),
+        logger=logger,
+        bucket=args.bucket,
+        threads=threads,
+        k=configs.get(hash_name, AnnoyConfig()).k,
+    )
+
+
+def search_frames(
+    search_engine: Union[ShazamSearch, ShardCoordinator, LandmarkSearch], frames: List[Dict[str, Any]]
+) -> Tuple[List[SearchItemResult], int]:
+    """
+    Search results and number of searched query frames
+    """
+    if isinstance(search_engine, ProgressiveShazamSearch):
+        return search_engine.process_frames_progressive(frames)
+
+    return search_engine.process_frames(frames), len(frames)
+
+
+def create_search_engines(
+    hash_names: List[str],
+    search_names: List[str],
+    args: argparse.Namespace,
+    index_registry: IndexRegistry,
+    coordinators: Dict[str, ShardCoordinator],
+    configs: Dict[str, AnnoyConfig],
+    logger: logging.Logger,
+) -> Optional[Dict[str, Dict[str, Union[ShazamSearch, ShardCoordinator, LandmarkSearch]]]]:
+    """
+    Search engines by search and hash names, None if some of them can't be created (index or landmark index isn't built)
+    """
+    search_engines = {}
+    for hash_name in hash_names:
+        for search_name in search_names:
+            os.makedirs(os.path.join(args.output, search_name, hash_name), exist_ok=True)
+
+            search_engine = create_search_engine(search_name, hash_name, args, index_registry, coordinators, configs, logger)
+            if search_engine is None:
+                return None
+
+            search_engines.setdefault(search_name, {})[hash_name] = search_engine
+
+    return search_engines
+
+
+def check_args(args: argparse.Namespace, logger: logging.Logger) -> bool:
+    if not os.path.exists(args.input):
+        logger.error(f"--input={args.input} doesn't exist")
+        return False
+
+    if 0 > args.bucket or args.bucket >= args.buckets:
+        logger.error(f"The --bucket={args.bucket} must be 0 < --bucket < --buckets={args.buckets}")
+        return False
+
+    if not 0 < args.confidence < 1:
+        logger.error(f"The --confidence={args.confidence} must be 0 < --confidence < 1")
+        return False
+
+    return True
 
 
 def main() -> None:
@@ -76,108 +218,116 @@ def main() -> None:
         "PYTHONPATH=. python scripts/search_process.py -i core_dataset -o core_dataset",
     ])
 
-    hashers = {
-        "Marr-Hildreth": MarrHildrethframeHasher(),
-        "BlockMean0": BlockMeanframeHasher(mode=0),
-        "BlockMean1": BlockMeanframeHasher(mode=1),
-        "RadialVariance": RadialVarianceframeHasher(),
-        "phash": PHashImageHasher(),
-        "whash": WHashImageHasher(),
-        "dhash": DHashImageHasher(),
-    }
+    hashers = get_hashers()
     searchers = {
         "Shazam": ShazamSearch,
+        "Landmark": LandmarkSearch,
+        "ShazamProgressive": ProgressiveShazamSearch,
     }
     hash_names = list(hashers.keys())
     search_names = list(searchers.keys())
+    opt_in_search_names = ["Landmark", "ShazamProgressive"]  # not in --search all, Landmark needs pre_search_process.py --landmarks
 
     parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
     parser.add_argument("--hash", help="hash function to use", choices=hash_names + ["all"], default="all")
-    parser.add_argument("--search", help="search algorithm to use", choices=search_names + ["all"], default="all")
+    parser.add_argument(
+        "--search", help=f"search algorithm to use, all - except {', '.join(opt_in_search_names)}", choices=search_names + ["all"], default="all"
+    )
     parser.add_argument("-i", "--input", help="input directory of video", type=str, required=True)
     parser.add_argument("-o", "--output", help="output directory to store results", type=str, required=True)
     parser.add_argument("-B", "--buckets", help="number of buckets (default: %(default)d)", type=int, default=1)
     parser.add_argument("-b", "--bucket", help="index of bucket (0...buckets-1, default: %(default)d)", type=int, default=0)
+    parser.add_argument("--incremental", help="search segments and new videos not indexed yet too", action="store_true")
+    parser.add_argument("--annoy-config", help="n_trees, search_k, k per hash function (default: <output>/annoy_config.json)", type=str, default=None)
+    parser.add_argument("--backend", help="annoy, exact or mih search (default: from config, annoy)", choices=["annoy", "exact", "mih"], default=None)
+    parser.add_argument(
+        "--metric", help="index metric of bit hashes, RadialVariance is euclidean (default: config, hamming)", choices=["hamming", "euclidean"], default=None
+    )
+    parser.add_argument("--chunk-size", help="query frames searched at once by ShazamProgressive (default: %(default)d)", type=int, default=16)
+    parser.add_argument(
+        "--confidence", help="ShazamProgressive stops when the best file is safe with it, 0 < confidence < 1 (default: %(default)s)", type=float, default=0.99
+    )
+    parser.add_argument("--sharded", help="search shards (pre_search_process.py --shards) by a worker process per shard", action="store_true")
+    parser.add_argument("--shard-servers", help="search shards of scripts/shard_server.py, comma separated host:port (one --hash)", type=str, default=None)
+    parser.add_argument("--authkey", help="authentication key of shard servers (default: %(default)s)", type=str, default="frame_video_search")
     args = parser.parse_args()
 
-    input_path = args.input
     output_path = args.output
 
     logger = get_logger(f"{output_path}/search_process_{args.bucket}.log", args.bucket, args.buckets)
 
-    if not os.path.exists(input_path):
-        logger.error(f"--input={input_path} doesn't exist")
+    if not check_args(args, logger):
         return
 
     os.makedirs(output_path, exist_ok=True)
 
-    if 0 > args.bucket or args.bucket >= args.buckets:
-        logger.error(f"The --bucket={args.bucket} must be 0 < --bucket < --buckets={args.buckets}")
-        return
-
     hash_names = hash_names if args.hash == "all" else [args.hash]
-    search_names = search_names if args.search == "all" else [args.search]
+    search_names = [name for name in search_names if name not in opt_in_search_names] if args.search == "all" else [args.search]
 
-    search_engines = {}
+    configs = AnnoyConfig.load(args.annoy_config or os.path.join(output_path, "annoy_config.json"), args.backend, hash_names, args.metric)
 
     # setup db, prepare search algorithms
-    for hash_name in hash_names:
-        annoy_processor = AnnoyProcessor(
-            hasher=hashers[hash_name],
-            logger=logger,
-            bucket=args.bucket,
-            threads=max(1, int(os.cpu_count() / args.buckets)),
-        )
+    index_registry = IndexRegistry(
+        hashers=hashers,
+        hashes_dir=os.path.join(output_path, "hashes"),
+        logger=logger,
+        bucket=args.bucket,
+        threads=max(1, int(os.cpu_count() / args.buckets)),
+        incremental=args.incremental,
+        configs=configs,
+    )
 
-        for search_name in search_names:
-            os.makedirs(os.path.join(output_path, search_name, hash_name), exist_ok=True)
+    coordinators = start_shard_coordinators(args, hash_names, configs, logger)
 
-            search_engines.setdefault(search_name, {})[hash_name] = searchers[search_name](
-                annoy_db=annoy_processor.load_annoy_db_from_disk(os.path.join(output_path, "hashes", hash_name)),
-                logger=logger,
-                bucket=args.bucket,
-                threads=max(1, int(os.cpu_count() / args.buckets)),
-            )
+    search_engines = create_search_engines(hash_names, search_names, args, index_registry, coordinators, configs, logger)
+    if search_engines is None:
+        for coordinator in coordinators.values():
+            coordinator.close()
 
-        logger.info(f'Annoy index successfully loaded: {os.path.join(output_path, "hashes", hash_name)}')
+        return
+
+    for stats in index_registry.report():
+        logger.info(f"{stats}")
 
     # prepare query videos
-    queries = {}
-    queries[hash_names[0]] = glob.glob(os.path.join(output_path, "query_hashes", hash_names[0], "*.json"))
-    len_query_paths = len(queries[hash_names[0]])
-    check_corectly_number_across_hash_function(hash_names=hash_names, queries=queries, output_path=output_path, logger=logger)
+    queries = {hash_name: HashStore.load_frames(os.path.join(output_path, "query_hashes", hash_name)) for hash_name in hash_names}
+    check_corectly_number_across_hash_function(hash_names=hash_names, queries=queries, logger=logger)
+
+    query_names = sorted(queries[hash_names[0]])
+    len_query_paths = len(query_names)
 
     start_with_video = math.ceil(len_query_paths * args.bucket / args.buckets)
     end_with_video = min(len_query_paths, math.ceil(len_query_paths * (args.bucket + 1) / args.buckets))
 
     # search
     for index_video in range(start_with_video, end_with_video):
+        query_name = query_names[index_video]
+
         for hash_name in hash_names:
             name2search = {}
+            frames = queries[hash_name][query_name]
 
-            query = queries[hash_name][index_video]
-            query_name = os.path.basename(query)
-
-            logger.info(f"i={index_video} {hash_name=} {query=}")
-
-            with open(query, "r") as f:
-                data = json.load(f)
-                frames = data["frames"]
+            logger.info(f"i={index_video} {hash_name=} {query_name=}")
 
             for search_name in search_names:
                 start_timer = time.perf_counter()
-                search_result = search_engines[search_name][hash_name].process_frames(frames)
+                search_result, searched_frames = search_frames(search_engines[search_name][hash_name], frames)
 
                 elapsed_time = time.perf_counter() - start_timer
 
-                name2search[os.path.join(output_path, search_name, hash_name, query_name)] = SearchResult(
-                    filename_timestamp=query_name[:-5],
+                name2search[os.path.join(output_path, search_name, hash_name, f"{query_name}.json")] = SearchResult(
+                    filename_timestamp=query_name,
                     results=search_result,
                     elapsed_time=elapsed_time,
+                    frames=len(frames),
+                    searched_frames=searched_frames,
                 )
 
             save_search_results(name2search=name2search, bucket=args.bucket)
 
+    for coordinator in coordinators.values():
+        coordinator.close()
+
     logger.info(f"Done threads={max(1, int(os.cpu_count() / args.buckets))}")
 
 
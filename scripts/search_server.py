@@ -0,0 +1,98 @@
+import argparse
+import logging
+import os
+
+from data_structures.annoy_config import AnnoyConfig
+from entities.annoy_processor import AnnoyProcessor
+from entities.search_server import SearchServer
+from frame_hashers.block_mean_image_hasher import BlockMeanframeHasher
+from frame_hashers.dhash_image_hasher import DHashImageHasher
+from frame_hashers.marr_hildreth_image_hasher import MarrHildrethframeHasher
+from frame_hashers.phash_image_hasher import PHashImageHasher
+from frame_hashers.radial_variance_image_hasher import RadialVarianceframeHasher
+from frame_hashers.whash_image_hasher import WHashImageHasher
+from search_algorithms.shazam_search import ShazamSearch
+
+
+def get_logger(log_path: str) -> logging.Logger:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] - %(message)s",
+        handlers=[
+            logging.FileHandler(log_path, mode="w"),
+            logging.StreamHandler(),
+        ],
+    )
+
+    return logging.getLogger(__name__)
+
+
+def main() -> None:
+    description = "\n".join([
+        "Search server: annoy indexes are loaded once and kept in memory, queries are answered over HTTP.",
+        "Run scripts/pre_search_process.py before. Try:",
+        "PYTHONPATH=. python scripts/search_server.py -i core_dataset --port 8000",
+        "Load test: PYTHONPATH=. python scripts/search_client.py -i core_dataset --url http://127.0.0.1:8000",
+    ])
+
+    hashers = {
+        "Marr-Hildreth": MarrHildrethframeHasher(),
+        "BlockMean0": BlockMeanframeHasher(mode=0),
+        "BlockMean1": BlockMeanframeHasher(mode=1),
+        "RadialVariance": RadialVarianceframeHasher(),
+        "phash": PHashImageHasher(),
+        "whash": WHashImageHasher(),
+        "dhash": DHashImageHasher(),
+    }
+    searchers = {
+        "Shazam": ShazamSearch,
+    }
+    hash_names = list(hashers.keys())
+
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--hash", help="hash function to load", choices=hash_names + ["all"], default="all")
+    parser.add_argument("-i", "--input", help="directory of processed dataset with indexes (hashes/)", type=str, required=True)
+    parser.add_argument("--host", help="host to listen (default: %(default)s)", type=str, default="127.0.0.1")
+    parser.add_argument("--port", help="port to listen (default: %(default)d)", type=int, default=8000)
+    parser.add_argument("-t", "--threads", help="threads of batched annoy search (default: cpu count)", type=int, default=os.cpu_count())
+    parser.add_argument("--sparse", help="decode only sampled keyframes of query clips", action="store_true")
+    parser.add_argument("--resolution", help="downscale keyframes of query clips, as --resolution of video_process.py (default: 0)", type=int, default=0)
+    parser.add_argument("--incremental", help="search segments and new videos, POST /merge indexes new videos", action="store_true")
+    parser.add_argument("--annoy-config", help="n_trees, search_k, k per hash function (default: <input>/annoy_config.json)", type=str, default=None)
+    parser.add_argument("--backend", help="annoy, exact or mih search (default: from config, annoy)", choices=["annoy", "exact", "mih"], default=None)
+    parser.add_argument(
+        "--metric", help="index metric of bit hashes, RadialVariance is euclidean (default: config, hamming)", choices=["hamming", "euclidean"], default=None
+    )
+    parser.add_argument("--max-segments", help="merge segments when there are more (default: %(default)d)", type=int, default=8)
+    args = parser.parse_args()
+
+    logger = get_logger(f"{args.input}/search_server.log")
+
+    if not os.path.exists(args.input):
+        logger.error(f"--input={args.input} doesn't exist")
+        return
+
+    hash_names = hash_names if args.hash == "all" else [args.hash]
+    configs = AnnoyConfig.load(args.annoy_config or os.path.join(args.input, "annoy_config.json"), args.backend, hash_names, args.metric)
+    for hash_name in hash_names if not args.incremental else []:
+        annoy_processor = AnnoyProcessor(hasher=hashers[hash_name], logger=logger, bucket=0, threads=args.threads, config=configs.get(hash_name))
+        if not annoy_processor.check_index(os.path.join(args.input, "hashes", hash_name)):
+            return
+
+    search_server = SearchServer(
+        hashers={hash_name: hashers[hash_name] for hash_name in hash_names},
+        searchers=searchers,
+        hashes_dir=os.path.join(args.input, "hashes"),
+        logger=logger,
+        threads=args.threads,
+        sparse=args.sparse,
+        resolution=args.resolution,
+        incremental=args.incremental,
+        max_segments=args.max_segments,
+        configs=configs,
+    )
+    search_server.serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
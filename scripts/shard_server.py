@@ -0,0 +1,78 @@
+import argparse
+import logging
+import os
+
+from data_structures.annoy_config import AnnoyConfig
+from entities.annoy_processor import AnnoyProcessor
+from entities.shard_worker import ShardWorker
+from frame_hashers.block_mean_image_hasher import BlockMeanframeHasher
+from frame_hashers.dhash_image_hasher import DHashImageHasher
+from frame_hashers.marr_hildreth_image_hasher import MarrHildrethframeHasher
+from frame_hashers.phash_image_hasher import PHashImageHasher
+from frame_hashers.radial_variance_image_hasher import RadialVarianceframeHasher
+from frame_hashers.whash_image_hasher import WHashImageHasher
+
+
+def get_logger(log_path: str) -> logging.Logger:
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] - %(message)s",
+        handlers=[
+            logging.FileHandler(log_path, mode="w"),
+            logging.StreamHandler(),
+        ],
+    )
+
+    return logging.getLogger(__name__)
+
+
+def main() -> None:
+    description = "\n".join([
+        "Serve one shard of a hash function (pre_search_process.py --shards) to search_process.py --shard-servers on other nodes. Try:",
+        "PYTHONPATH=. python scripts/shard_server.py -i core_dataset --hash phash --shard 0 --port 9100",
+    ])
+
+    hashers = {
+        "Marr-Hildreth": MarrHildrethframeHasher(),
+        "BlockMean0": BlockMeanframeHasher(mode=0),
+        "BlockMean1": BlockMeanframeHasher(mode=1),
+        "RadialVariance": RadialVarianceframeHasher(),
+        "phash": PHashImageHasher(),
+        "whash": WHashImageHasher(),
+        "dhash": DHashImageHasher(),
+    }
+
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--hash", help="hash function of the shard", choices=list(hashers), required=True)
+    parser.add_argument("-i", "--input", help="directory of processed dataset (with hashes/)", type=str, required=True)
+    parser.add_argument("--shard", help="index of the shard in hashes/<hash>/shards (default: %(default)d)", type=int, default=0)
+    parser.add_argument("--host", help="host to listen (default: %(default)s)", type=str, default="0.0.0.0")
+    parser.add_argument("--port", help="port to listen (default: %(default)d)", type=int, default=9100)
+    parser.add_argument("--authkey", help="authentication key of coordinators (default: %(default)s)", type=str, default="frame_video_search")
+    parser.add_argument("--annoy-config", help="n_trees, search_k, k per hash function (default: <input>/annoy_config.json)", type=str, default=None)
+    parser.add_argument("--backend", help="annoy, exact or mih search (default: from config, annoy)", choices=["annoy", "exact", "mih"], default=None)
+    parser.add_argument(
+        "--metric", help="index metric of bit hashes, RadialVariance is euclidean (default: config, hamming)", choices=["hamming", "euclidean"], default=None
+    )
+    parser.add_argument("-t", "--threads", help="threads of batched search (default: number of cpus)", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    logger = get_logger(f"{args.input}/shard_server_{args.hash}_{args.shard}.log")
+
+    shard_paths = AnnoyProcessor.shard_paths(os.path.join(args.input, "hashes", args.hash))
+    shard_path = next((path for path in shard_paths if path.endswith(f"shard_{args.shard:03d}")), None)
+    if shard_path is None:
+        logger.error(f"Shard {args.shard} doesn't exist, shards: {shard_paths}")
+        return
+
+    config = AnnoyConfig.load(args.annoy_config or os.path.join(args.input, "annoy_config.json"), args.backend, [args.hash], args.metric).get(args.hash)
+    shard_worker = ShardWorker(hasher=hashers[args.hash], shard_path=shard_path, logger=logger, bucket=0, threads=args.threads, config=config)
+
+    try:
+        shard_worker.listen(args.host, args.port, authkey=args.authkey.encode("utf-8"))
+    except KeyboardInterrupt:
+        logger.info("Shard server is stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from typing import Deque
+
+import numpy as np
+from data_structures.annoy_config import AnnoyConfig
+from entities.annoy_processor import AnnoyProcessor
+from entities.frame_preprocessor import FramePreprocessor
+from entities.frame_stream_reader import FrameStreamReader
+from frame_hashers.block_mean_image_hasher import BlockMeanframeHasher
+from frame_hashers.dhash_image_hasher import DHashImageHasher
+from frame_hashers.marr_hildreth_image_hasher import MarrHildrethframeHasher
+from frame_hashers.phash_image_hasher import PHashImageHasher
+from frame_hashers.radial_variance_image_hasher import RadialVarianceframeHasher
+from frame_hashers.whash_image_hasher import WHashImageHasher
+from search_algorithms.stream_shazam_search import StreamShazamSearch
+
+
+def get_logger(log_path: str) -> logging.Logger:
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] - %(message)s",
+        handlers=[
+            logging.FileHandler(log_path, mode="w"),
+            logging.StreamHandler(),
+        ],
+    )
+
+    return logging.getLogger(__name__)
+
+
+def latency_stats(frames: int, total_latency: float, max_latency: float, recent: Deque[float]) -> str:
+    """
+    Mean and max of all frames, percentiles of recent frames (bounded memory)
+    """
+    if not frames:
+        return "frames=0"
+
+    p50, p95 = np.percentile(recent, [50, 95])
+    return f"{frames=} mean={total_latency / frames:.4f}s max={max_latency:.4f}s recent p50={p50:.4f}s p95={p95:.4f}s"
+
+
+def main() -> None:
+    description = "\n".join([
+        "Search a live stream of frames in db: frames are hashed and searched one by one, match events are written",
+        "as soon as the best video of the sliding window is confident. Try:",
+        "PYTHONPATH=. python scripts/stream_process.py -i core_dataset -o core_dataset --source video.mp4 --realtime",
+        "ffmpeg -i rtsp://camera -f rawvideo -pix_fmt bgr24 -s 640x360 -r 25 - | "
+        "PYTHONPATH=. python scripts/stream_process.py -i core_dataset -o core_dataset --source - --width 640 --height 360 --fps 25",
+    ])
+
+    hashers = {
+        "Marr-Hildreth": MarrHildrethframeHasher(),
+        "BlockMean0": BlockMeanframeHasher(mode=0),
+        "BlockMean1": BlockMeanframeHasher(mode=1),
+        "RadialVariance": RadialVarianceframeHasher(),
+        "phash": PHashImageHasher(),
+        "whash": WHashImageHasher(),
+        "dhash": DHashImageHasher(),
+    }
+
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--hash", help="hash function to use (default: %(default)s)", choices=list(hashers), default="phash")
+    parser.add_argument("-i", "--input", help="directory of processed dataset with indexes (hashes/)", type=str, required=True)
+    parser.add_argument("-o", "--output", help="output directory to store match events (stream_events.jsonl)", type=str, required=True)
+    parser.add_argument("--source", help="video file or url opened by opencv, - is raw bgr24 frames from stdin", type=str, required=True)
+    parser.add_argument("--width", help="width of raw frames", type=int, default=None)
+    parser.add_argument("--height", help="height of raw frames", type=int, default=None)
+    parser.add_argument("--fps", help="frame rate of raw frames (default: %(default)s)", type=float, default=25.0)
+    parser.add_argument("--realtime", help="read a file source not faster than its frame rate, as a live feed", action="store_true")
+    parser.add_argument("--window", help="seconds of the stream in the offset histogram (default: %(default)s)", type=float, default=10.0)
+    parser.add_argument("--threshold", help="confidence of a match event (default: %(default)s)", type=float, default=0.5)
+    parser.add_argument("--min-weight", help="weight of the best video of a match event (default: %(default)s)", type=float, default=3.0)
+    parser.add_argument("--report-every", help="log latency statistics every n frames (default: %(default)d)", type=int, default=100)
+    parser.add_argument("--annoy-config", help="n_trees, search_k, k per hash function (default: <input>/annoy_config.json)", type=str, default=None)
+    parser.add_argument("--backend", help="annoy, exact or mih search (default: from config, annoy)", choices=["annoy", "exact", "mih"], default=None)
+    parser.add_argument(
+        "--metric", help="index metric of bit hashes, RadialVariance is euclidean (default: config, hamming)", choices=["hamming", "euclidean"], default=None
+    )
+    parser.add_argument("-t", "--threads", help="threads of search (default: %(default)d)", type=int, default=1)
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    logger = get_logger(f"{args.output}/stream_process.log")
+
+    if not os.path.exists(args.input):
+        logger.error(f"--input={args.input} doesn't exist")
+        return
+
+    if args.source == "-" and (not args.width or not args.height):
+        logger.error("--width and --height of raw frames are required with --source -")
+        return
+
+    hasher = hashers[args.hash]
+    config = AnnoyConfig.load(args.annoy_config or os.path.join(args.input, "annoy_config.json"), args.backend, [args.hash], args.metric).get(args.hash)
+    annoy_processor = AnnoyProcessor(hasher=hasher, logger=logger, bucket=0, threads=args.threads, config=config)
+    if not annoy_processor.check_index(os.path.join(args.input, "hashes", args.hash)):
+        return
+
+    search = StreamShazamSearch(
+        annoy_db=annoy_processor.load_annoy_db_from_disk(os.path.join(args.input, "hashes", args.hash)),
+        logger=logger,
+        bucket=0,
+        threads=args.threads,
+        k=(config or AnnoyConfig()).k,
+        window=args.window,
+        threshold=args.threshold,
+        min_weight=args.min_weight,
+    )
+
+    reader = FrameStreamReader(logger=logger)
+    keyframes = reader.read_raw(sys.stdin.buffer, args.width, args.height, args.fps) if args.source == "-" else reader.read_capture(args.source, args.realtime)
+    preprocessor = FramePreprocessor()
+
+    frames, events, total_latency, max_latency = 0, 0, 0.0, 0.0
+    recent: Deque[float] = deque(maxlen=1000)
+
+    with open(os.path.join(args.output, "stream_events.jsonl"), "w", encoding="utf-8") as f:
+        for keyframe in keyframes:
+            arrived = time.perf_counter()
+            vec = hasher.process(preprocessor.process(keyframe)).vec
+            event = search.push({"vec": vec, "timecode": keyframe.timecode}, arrived)
+
+            latency = time.perf_counter() - arrived
+            frames, total_latency, max_latency = frames + 1, total_latency + latency, max(max_latency, latency)
+            recent.append(latency)
+
+            if event is not None:
+                events += 1
+                f.write(json.dumps(event.to_json()) + "\n")
+                f.flush()
+                logger.info(f"{event}")
+
+            if frames % args.report_every == 0:
+                logger.info(latency_stats(frames, total_latency, max_latency, recent))
+
+    logger.info(f"Done {events=} {latency_stats(frames, total_latency, max_latency, recent)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import shutil
+import time
+from dataclasses import replace
+from typing import Dict, List, Tuple
+
+import numpy as np
+from data_structures.annoy_config import AnnoyConfig
+from data_structures.annoy_db import AnnoyDB
+from data_structures.quality_result import QualityResult
+from data_structures.search_result import SearchResult
+from data_structures.tuning_result import TuningResult
+from entities.annoy_processor import AnnoyProcessor
+from entities.hash_store import HashStore
+from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
+from frame_hashers.block_mean_image_hasher import BlockMeanframeHasher
+from frame_hashers.dhash_image_hasher import DHashImageHasher
+from frame_hashers.marr_hildreth_image_hasher import MarrHildrethframeHasher
+from frame_hashers.phash_image_hasher import PHashImageHasher
+from frame_hashers.radial_variance_image_hasher import RadialVarianceframeHasher
+from frame_hashers.whash_image_hasher import WHashImageHasher
+from scripts.quality_process import calculate_metrics, load_ground_truth
+from search_algorithms.shazam_search import ShazamSearch
+
+
+def get_logger(log_path: str) -> logging.Logger:
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s %(levelname)s [%(filename)s:%(lineno)d] - %(message)s",
+        handlers=[
+            logging.FileHandler(log_path, mode="w"),
+            logging.StreamHandler(),
+        ],
+    )
+
+    return logging.getLogger(__name__)
+
+
+def search_queries(search: ShazamSearch, queries: Dict[str, List[Dict]], results_dir: str) -> List[float]:
+    """
+    Search every query video, save results as search_process.py does and return latencies
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    latencies = []
+
+    for query_name, frames in sorted(queries.items()):
+        start_timer = time.perf_counter()
+        results = search.process_frames(frames)
+        latencies.append(time.perf_counter() - start_timer)
+
+        with open(os.path.join(results_dir, f"{query_name}.json"), "w", encoding="utf-8") as f:
+            json.dump(SearchResult(filename_timestamp=query_name, results=results, elapsed_time=latencies[-1]).to_json(), f)
+
+    return latencies
+
+
+def build_index(
+    hasher: AbstractFrameHasher, hashes_path: str, save_dir: str, config: AnnoyConfig, n_trees: int, logger: logging.Logger, threads: int
+) -> Tuple[AnnoyDB, float]:
+    """
+    Index of the configured backend and metric with n_trees
+    """
+    annoy_processor = AnnoyProcessor(hasher=hasher, logger=logger, bucket=0, threads=threads, config=replace(config, n_trees=n_trees))
+
+    start_timer = time.perf_counter()
+    annoy_processor.annoy_init()
+    annoy_processor.json_indexing(hashes_path, annoy_indexing=True)
+    annoy_processor.build_and_save_annoy_index(save_dir)
+    build_time = time.perf_counter() - start_timer
+
+    db_index, filenames = annoy_processor.db_index_array()
+    return AnnoyDB(db_index=db_index, filenames=filenames, frame_index=annoy_processor.frame_index), build_time
+
+
+def sweep(
+    hash_name: str,
+    hasher: AbstractFrameHasher,
+    config: AnnoyConfig,
+    args: argparse.Namespace,
+    ground_truth: Tuple[Dict, Dict],
+    logger: logging.Logger,
+) -> List[TuningResult]:
+    """
+    Every n_trees is built once with the backend and metric of config, search_k and k are changed on the built index
+    """
+    queries = HashStore.load_frames(os.path.join(args.output, "query_hashes", hash_name))
+    tuning_dir = os.path.join(args.output, "tuning", hash_name)
+    results = []
+
+    for n_trees in args.n_trees:
+        index_dir = os.path.join(tuning_dir, f"n_trees_{n_trees}")
+        os.makedirs(index_dir, exist_ok=True)
+        annoy_db, build_time = build_index(hasher, os.path.join(args.output, "hashes", hash_name), index_dir, config, n_trees, logger, args.threads)
+
+        for search_k in args.search_k:
+            annoy_db.frame_index.search_k = search_k
+
+            for k in args.k:
+                search = ShazamSearch(annoy_db=annoy_db, logger=logger, bucket=0, threads=args.threads, k=k)
+                results_dir = os.path.join(index_dir, f"search_k_{search_k}_k_{k}")
+                latencies = search_queries(search, queries, results_dir)
+
+                metrics_per_folder = calculate_metrics(results_dir, ground_truth[0], ground_truth[1], logger)
+                _, _, mrr, mp, recall, _ = QualityResult("Shazam", hash_name, list(metrics_per_folder.values())).to_csv()
+
+                results.append(TuningResult(
+                    hash_name=hash_name,
+                    n_trees=n_trees,
+                    search_k=search_k,
+                    k=k,
+                    mrr=mrr,
+                    mp=mp,
+                    recall=recall,
+                    build_time=build_time,
+                    index_bytes=annoy_db.frame_index.size(),
+                    mean_latency=float(np.mean(latencies)),
+                    p95_latency=float(np.percentile(latencies, 95)),
+                ))
+                logger.info(f"{results[-1]}")
+
+        if not args.keep:
+            shutil.rmtree(index_dir)
+
+    return results
+
+
+def mark_pareto(results: List[TuningResult]) -> None:
+    """
+    Settings are Pareto-optimal if no other settings have better or equal MRR, mAP, latency and index size and at least one is strictly better
+    """
+
+    def dominates(a: TuningResult, b: TuningResult) -> bool:
+        not_worse = a.mrr >= b.mrr and a.mp >= b.mp and a.mean_latency <= b.mean_latency and a.index_bytes <= b.index_bytes
+        better = a.mrr > b.mrr or a.mp > b.mp or a.mean_latency < b.mean_latency or a.index_bytes < b.index_bytes
+        return not_worse and better
+
+    for result in results:
+        result.pareto = not any(dominates(other, result) for other in results)
+
+
+def choose(results: List[TuningResult], tolerance: float) -> TuningResult:
+    """
+    The fastest (then the smallest) Pareto-optimal settings which lose at most tolerance of the best MRR and mAP
+    """
+    best_mrr = max(result.mrr for result in results)
+    best_mp = max(result.mp for result in results)
+    candidates = [result for result in results if result.pareto and result.mrr >= best_mrr - tolerance and result.mp >= best_mp - tolerance]
+
+    return min(candidates, key=lambda result: (result.mean_latency, result.index_bytes))
+
+
+def main() -> None:
+    description = "\n".join([
+        "Sweep annoy n_trees, search_k and k over query videos, measure quality (as scripts/quality_process.py),",
+        "latency and index size and write Pareto-optimal settings of every hash function to annoy_config.json. Try:",
+        "PYTHONPATH=. python scripts/tune_annoy.py -i /home/superustam/jam/light_video_copy_detection/data/ -o core_dataset --hash phash",
+    ])
+
+    hashers = {
+        "Marr-Hildreth": MarrHildrethframeHasher(),
+        "BlockMean0": BlockMeanframeHasher(mode=0),
+        "BlockMean1": BlockMeanframeHasher(mode=1),
+        "RadialVariance": RadialVarianceframeHasher(),
+        "phash": PHashImageHasher(),
+        "whash": WHashImageHasher(),
+        "dhash": DHashImageHasher(),
+    }
+    hash_names = list(hashers.keys())
+
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--hash", help="hash function to tune", choices=hash_names + ["all"], default="all")
+    parser.add_argument("-i", "--input", help="input directory of dataset with annotation/", type=str, required=True)
+    parser.add_argument("-o", "--output", help="directory of processed dataset (hashes/, query_hashes/)", type=str, required=True)
+    parser.add_argument("--n-trees", help="values of n_trees (default: %(default)s)", type=int, nargs="+", default=[10, 50, 100, 300, 1000])
+    parser.add_argument("--search-k", help="values of search_k, -1 is n_trees * k (default: %(default)s)", type=int, nargs="+", default=[-1, 1000, 10000])
+    parser.add_argument("--k", help="values of k (default: %(default)s)", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--tolerance", help="allowed loss of MRR and mAP of chosen settings (default: %(default)s)", type=float, default=0.005)
+    parser.add_argument("--annoy-config", help="config to update (default: <output>/annoy_config.json)", type=str, default=None)
+    parser.add_argument("--keep", help="keep built indexes and search results of every settings", action="store_true")
+    parser.add_argument("-t", "--threads", help="threads of build and batched search (default: number of cpus)", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    os.makedirs(os.path.join(args.output, "tuning"), exist_ok=True)
+    logger = get_logger(f"{args.output}/tune_annoy.log")
+
+    if not os.path.exists(args.input):
+        logger.error(f"--input={args.input} doesn't exist")
+        return
+
+    ground_truth = load_ground_truth(args.input)
+    config_path = args.annoy_config or os.path.join(args.output, "annoy_config.json")
+    configs = AnnoyConfig.load(config_path)
+    all_results: List[TuningResult] = []
+
+    for hash_name in hash_names if args.hash == "all" else [args.hash]:
+        results = sweep(hash_name, hashers[hash_name], configs.get(hash_name, AnnoyConfig()), args, ground_truth, logger)
+        mark_pareto(results)
+        chosen = choose(results, args.tolerance)
+        configs[hash_name] = replace(configs.get(hash_name, AnnoyConfig()), n_trees=chosen.n_trees, search_k=chosen.search_k, k=chosen.k)
+        all_results.extend(results)
+        logger.info(f"{hash_name}: chosen {chosen}")
+
+    with open(os.path.join(args.output, "tuning", "tuning.csv"), "w", encoding="utf-8") as f:
+        csv_writer = csv.writer(f, delimiter=",")
+        csv_writer.writerow(TuningResult.to_csv_header())
+        for result in all_results:
+            csv_writer.writerow(result.to_csv())
+
+    AnnoyConfig.save(configs, config_path)
+    logger.info(f"Done {config_path=}, rebuild indexes with scripts/pre_search_process.py to apply n_trees")
+
+
+if __name__ == "__main__":
+    main()
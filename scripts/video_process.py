@@ -1,15 +1,17 @@
 import argparse
 import csv
 import glob
-import json
 import logging
 import math
 import os
-from typing import Dict
+from typing import Dict, List
 
 from data_structures.video_hash import VideoHash
 from data_structures.video_metadata import VideoMetadata
-from entities.video_processor import VideoProcessor
+from entities.hash_cache import HashCache
+from entities.hash_store import HashStore
+from entities.video_process_pool import VideoProcessPool
+from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
 from frame_hashers.block_mean_image_hasher import BlockMeanframeHasher
 from frame_hashers.dhash_image_hasher import DHashImageHasher
 from frame_hashers.marr_hildreth_image_hasher import MarrHildrethframeHasher
@@ -38,12 +40,23 @@ def get_logger(log_path: str, bucket: int, buckets: int) -> logging.Logger:
     return logger
 
 
-def save_hashes(name2hash: Dict[str, VideoHash], hashes_dir: str, video_name: str, bucket: int) -> None:
+def get_hashers() -> List[AbstractFrameHasher]:
+    return [
+        MarrHildrethframeHasher(),
+        BlockMeanframeHasher(mode=0),
+        BlockMeanframeHasher(mode=1),
+        RadialVarianceframeHasher(),
+        PHashImageHasher(),
+        WHashImageHasher(),
+        DHashImageHasher(),
+    ]
+
+
+def save_hashes(name2hash: Dict[str, VideoHash], stores: Dict[str, HashStore], hashes_dir: str, video_name: str, time_filename: str) -> None:
     for hash_name, video_hash in name2hash.items():
-        with open(os.path.join(hashes_dir, hash_name, f"{video_name}.json"), "w", encoding="utf-8") as f:
-            json.dump(video_hash.to_json(), f)
+        stores[hash_name].append(key=video_name, video_hash=video_hash)
 
-        csv_filepath = os.path.join(hashes_dir, hash_name, f"time_{bucket}.csv")
+        csv_filepath = os.path.join(hashes_dir, hash_name, time_filename)
         if not os.path.exists(csv_filepath) or os.path.getsize(csv_filepath) == 0:
             with open(csv_filepath, "w", encoding="utf-8") as f:
                 csv_writer = csv.writer(f, delimiter=",")
@@ -56,6 +69,13 @@ def save_hashes(name2hash: Dict[str, VideoHash], hashes_dir: str, video_name: st
             csv_writer.writerow(video_hash.to_csv())
 
 
+def compact_stores(stores: Dict[str, HashStore], logger: logging.Logger) -> None:
+    for store in stores.values():
+        dropped = store.compact()
+        if dropped:
+            logger.info(f"Hash store {store.path} is compacted, {dropped=} older records of re-run videos")
+
+
 def main() -> None:
     description = "\n".join([
         "Upload all videos to db. Hashing included.",
@@ -67,6 +87,17 @@ def main() -> None:
     parser.add_argument("-o", "--output", help="output directory to store processed dataset", type=str, required=True)
     parser.add_argument("-B", "--buckets", help="number of buckets (default: %(default)d)", type=int, default=1)
     parser.add_argument("-b", "--bucket", help="index of bucket (0...buckets-1, default: %(default)d)", type=int, default=0)
+    parser.add_argument("--sparse", help="decode only sampled keyframes, skipped frames are grabbed without decoding", action="store_true")
+    parser.add_argument("--batch-size", help="number of keyframes hashed at once (default: %(default)d)", type=int, default=8)
+    parser.add_argument(
+        "--resolution", help="downscale keyframes to this short side in pixels, the same for videos and queries (default: 0, original)", type=int, default=0
+    )
+    parser.add_argument("-w", "--workers", help="number of worker processes, results go to single csv files (default: %(default)d)", type=int, default=1)
+    parser.add_argument("--retries", help="retries of videos of a crashed worker process, --workers > 1 (default: %(default)d)", type=int, default=1)
+    parser.add_argument("--cache-dir", help="cache of hashes by video content, shared by runs (default: <output>/hash_cache)", type=str, default=None)
+    parser.add_argument(
+        "--cache-size", help="size of the cache in MB, least recently used videos are evicted, 0 - no cache (default: %(default)d)", type=int, default=1024
+    )
     args = parser.parse_args()
 
     # output_path = "core_dataset"
@@ -75,18 +106,10 @@ def main() -> None:
     videos_dir = args.input
     output_path = args.output
 
-    hashers = [
-        MarrHildrethframeHasher(),
-        BlockMeanframeHasher(mode=0),
-        BlockMeanframeHasher(mode=1),
-        RadialVarianceframeHasher(),
-        PHashImageHasher(),
-        WHashImageHasher(),
-        DHashImageHasher(),
-    ]
+    hashers = get_hashers()
+    threads = max(1, int(os.cpu_count() / (args.buckets * args.workers)))
 
     os.makedirs(output_path, exist_ok=True)
-    os.makedirs("cash", exist_ok=True)
     logger = get_logger(f"{output_path}/video_process_{args.bucket}.log", args.bucket, args.buckets)
 
     if not os.path.exists(videos_dir):
@@ -97,15 +120,30 @@ def main() -> None:
         logger.error(f"The --bucket={args.bucket} must be 0 < --bucket < --buckets={args.buckets}")
         return
 
+    if args.workers > 1 and args.buckets > 1:
+        logger.error(f"--workers={args.workers} replaces manual sharding, --buckets={args.buckets} must be 1")
+        return
+
     hashes_dir = os.path.join(output_path, "hashes")
     for hasher in hashers:
         os.makedirs(os.path.join(hashes_dir, hasher.name), exist_ok=True)
 
-    video_processor = VideoProcessor(
-        hashers=hashers,
+    cache = None
+    if args.cache_size > 0:
+        cache_dir = args.cache_dir or os.path.join(output_path, "hash_cache")
+        cache = HashCache(cache_dir=cache_dir, logger=logger, hashers=hashers, max_bytes=args.cache_size << 20, resolution=args.resolution)
+
+    video_process_pool = VideoProcessPool(
+        hashers_factory=get_hashers,
         logger=logger,
         bucket=args.bucket,
-        threads=max(1, int(os.cpu_count() / args.buckets)),
+        workers=args.workers,
+        threads=threads,
+        retries=args.retries,
+        sparse=args.sparse,
+        batch_size=args.batch_size,
+        resolution=args.resolution,
+        cache=cache,
     )
     video_paths = glob.glob(f"{videos_dir}/*/*")
 
@@ -114,13 +152,17 @@ def main() -> None:
     start_with_video = math.ceil(len_video_paths * args.bucket / args.buckets)
     end_with_video = min(len_video_paths, math.ceil(len_video_paths * (args.bucket + 1) / args.buckets))
 
-    with open(os.path.join(output_path, f"metadata_{args.bucket}.csv"), "w", newline="") as f:
+    suffix = "" if args.workers > 1 else f"_{args.bucket}"  # workers write merged results, buckets are merged by post_processing_video.sh
+    tasks = [(video_path, None, None) for video_path in video_paths[start_with_video:end_with_video]]
+    stores = {hasher.name: HashStore(os.path.join(hashes_dir, hasher.name), hasher.vector_size, hasher.binary, suffix) for hasher in hashers}
+
+    with open(os.path.join(output_path, f"metadata{suffix}.csv"), "w", newline="") as f:
         csv_writer = csv.writer(f, delimiter=",")
         csv_writer.writerow(VideoMetadata.to_csv_header())
 
-        for i, video_path in enumerate(video_paths[start_with_video:end_with_video]):
+        for i, (task, result) in enumerate(video_process_pool.process(tasks)):
+            video_path = task[0]
             logger.info(f"i={start_with_video + i} {video_path=}")
-            result = video_processor.process(video_path=video_path)
             if not result:
                 logger.error(f"{video_path=}")
                 continue
@@ -128,13 +170,22 @@ def main() -> None:
             metadata, name2hash = result
             save_hashes(
                 name2hash=name2hash,
+                stores=stores,
                 hashes_dir=hashes_dir,
                 video_name=os.path.basename(video_path),
-                bucket=args.bucket,
+                time_filename=f"time{suffix}.csv",
             )
             csv_writer.writerow(metadata.to_csv())
 
-    logger.info(f"Done {args.bucket=} threads={max(1, int(os.cpu_count() / args.buckets))}")
+    compact_stores(stores, logger)
+
+    if cache is not None:
+        for stats in cache.report(os.path.join(output_path, f"hash_cache{suffix}.csv")):
+            logger.info(f"Hash cache {stats.hash_name}: hits={stats.hits} misses={stats.misses}")
+
+        logger.info(f"Hash cache size={cache.size >> 20}MB evictions={cache.evictions}")
+
+    logger.info(f"Done {args.bucket=} {args.workers=} {threads=}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+import logging
+from typing import Any, Dict, List
+
+import numpy as np
+from data_structures.landmark_db import LandmarkDB
+from data_structures.search_item_result import SearchItemResult
+from entities.landmark_processor import LandmarkProcessor
+from frame_hashers.abstract_frame_hasher import AbstractFrameHasher
+from search_algorithms.shazam_search import ShazamSearch
+
+
+class LandmarkSearch:
+    """
+    Search by landmarks of the query (see LandmarkProcessor) without nearest neighbour search:
+    every posting of a query key votes for its file with offset = timecode of the posting - timecode of the query anchor frame
+    """
+
+    def __init__(
+        self,
+        landmark_db: LandmarkDB,
+        hasher: AbstractFrameHasher,
+        logger: logging.Logger,
+        bucket: int,
+        threads: int,
+    ) -> None:
+        self.logger = logger
+        self.bucket = bucket
+        self.threads = threads
+        self.hasher = hasher
+        self.landmark_db = landmark_db
+
+    def process_frames(self, frames: List[Dict[str, Any]], topk: int = 10) -> List[SearchItemResult]:
+        """
+        Process a list of frames ({"vec", "timecode"} as ShazamSearch) and return a list of search item results.
+        """
+        if not frames:
+            return []
+
+        vecs = np.array([frame["vec"] for frame in frames], dtype=np.uint8)
+        timecodes = np.array([frame["timecode"] for frame in frames], dtype=np.float64)
+        keys, anchors = LandmarkProcessor.landmarks(
+            LandmarkProcessor.to_bits(self.hasher, vecs), timecodes, np.array([0, len(frames)]), self.landmark_db.config
+        )
+
+        # posting lists of all query keys at once
+        left = np.searchsorted(self.landmark_db.keys, keys, side="left")
+        counts = np.searchsorted(self.landmark_db.keys, keys, side="right") - left
+        positions = np.repeat(left - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        found = self.landmark_db.db_index[np.asarray(self.landmark_db.items[positions])]
+
+        deltas = found["timecode"] - np.repeat(timecodes[anchors], counts)
+        keep = deltas >= -1.5  # skip frames which can't be found in the video, as ShazamSearch.rank
+
+        # equal votes are counted before the histogram, a file with one offset gets all its votes (vote takes the first weight then)
+        votes = np.zeros(keep.sum(), dtype=[("filename_id", "<i8"), ("delta", "<f8")])
+        votes["filename_id"], votes["delta"] = found["filename_id"][keep], deltas[keep]
+        votes, first_index, counts = np.unique(votes, return_index=True, return_counts=True)
+        appearance = np.argsort(first_index, kind="stable")  # vote keeps order of appearance for equal weights
+        votes, counts = votes[appearance], counts[appearance]
+
+        top_ids, top_deltas, top_weights = ShazamSearch.vote(votes["filename_id"], votes["delta"], counts.astype(np.float64), topk)
+
+        return [
+            SearchItemResult(filename=self.landmark_db.filenames[file_id], timestamp_delta=float(delta), weight=float(weight))
+            for file_id, delta, weight in zip(top_ids, top_deltas, top_weights)
+        ]
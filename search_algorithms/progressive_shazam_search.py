@@ -0,0 +1,86 @@
+import logging
+import math
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from data_structures.annoy_db import AnnoyDB
+from data_structures.search_item_result import SearchItemResult
+from search_algorithms.shazam_search import ShazamSearch
+
+
+class ProgressiveShazamSearch(ShazamSearch):
+    """
+    ShazamSearch over chunks of query frames which stops when the best file can't be overtaken with probability confidence.
+
+    Every query frame adds at most its total weight b (sum of 1 / distance of its neighbours) to any file,
+    b is estimated as the maximum over searched frames. If the remaining m frames favour the runner-up no more than
+    the searched ones favoured it by chance, by Hoeffding inequality the margin D of the best file is safe when
+    D^2 >= 2 m b^2 ln(1 / (1 - confidence)). Only the best file is guaranteed, the rest of topk are from searched frames
+    """
+
+    def __init__(
+        self,
+        annoy_db: AnnoyDB,
+        logger: logging.Logger,
+        bucket: int,
+        threads: int,
+        k: int = 10,
+        chunk_size: int = 16,
+        min_frames: int = 16,
+        confidence: float = 0.99,
+    ) -> None:
+        if not 0 < confidence < 1:
+            raise ValueError(f"Confidence must be 0 < confidence < 1, got {confidence}")
+
+        super().__init__(annoy_db=annoy_db, logger=logger, bucket=bucket, threads=threads, k=k)
+        self.chunk_size = chunk_size  # query frames searched at once
+        self.min_frames = min_frames  # query frames searched before the first check
+        self.confidence = confidence
+
+    def process_frames(self, frames: List[Dict[str, Any]], topk: int = 10) -> List[SearchItemResult]:
+        return self.process_frames_progressive(frames, topk)[0]
+
+    def process_frames_progressive(self, frames: List[Dict[str, Any]], topk: int = 10) -> Tuple[List[SearchItemResult], int]:
+        """
+        Search results and number of searched query frames
+        """
+        if not frames:
+            return [], 0
+
+        vecs = np.array([frame["vec"] for frame in frames], dtype=np.uint8)
+        found_parts, ids_parts, distances_parts = [], [], []
+        frame_bound = 0.0
+
+        for start in range(0, len(frames), self.chunk_size):
+            ids, distances = self.annoy_db.frame_index.search_batch(vecs[start: start + self.chunk_size], k=self.k)
+            found = ids >= 0
+            found_parts.append(found)
+            ids_parts.append(ids[found])
+            distances_parts.append(distances[found])
+
+            rev_dists = np.divide(1, distances, out=np.ones_like(distances), where=distances != 0)
+            frame_bound = max(frame_bound, float(np.where(found, rev_dists, 0).sum(axis=1).max()))
+
+            searched = min(len(frames), start + self.chunk_size)
+            found_metadata = self.annoy_db.db_index[np.concatenate(ids_parts)]
+            results = self.rank(
+                frames=frames[:searched],
+                found=np.concatenate(found_parts),
+                file_ids=found_metadata["filename_id"],
+                timecodes=found_metadata["timecode"],
+                distances=np.concatenate(distances_parts),
+                filenames=self.annoy_db.filenames,
+                topk=topk,
+            )
+
+            if searched >= self.min_frames and self.is_safe(results, frame_bound, len(frames) - searched):
+                break
+
+        return results, searched
+
+    def is_safe(self, results: List[SearchItemResult], frame_bound: float, remaining: int) -> bool:
+        if not results:
+            return False
+
+        margin = results[0].weight - (results[1].weight if len(results) > 1 else 0.0)
+        return margin**2 >= 2 * remaining * frame_bound**2 * math.log(1 / (1 - self.confidence))
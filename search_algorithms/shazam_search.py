@@ -1,12 +1,13 @@
 import logging
-from collections import defaultdict
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 import numpy as np
 from data_structures.annoy_db import AnnoyDB
 from data_structures.distance_item_result import DistanceItemResult
 from data_structures.search_item_result import SearchItemResult
 
+WEIGHT_DECIMALS = 9  # summed weights are rounded, so the order of summation doesn't break ties
+
 
 class ShazamSearch:
     def __init__(
@@ -15,8 +16,10 @@ class ShazamSearch:
         logger: logging.Logger,
         bucket: int,
         threads: int,
+        k: int = 10,
     ) -> None:
         self.logger = logger
+        self.k = k  # nearest frames of every query frame
         self.bucket = bucket
         self.threads = threads
         self.annoy_db = annoy_db
@@ -25,7 +28,7 @@ class ShazamSearch:
         """
         Search a frame and return a list of distance item results.
         """
-        results = self.annoy_db.annoy_index.get_nns_by_vector(frame["vec"], k, search_k=-1, include_distances=True)
+        results = self.annoy_db.frame_index.search(frame["vec"], k)
 
         results = tuple(zip(results[0], results[1]))
 
@@ -34,8 +37,8 @@ class ShazamSearch:
             frame_metadata = self.annoy_db.db_index[result[0]]
             ans.append(
                 DistanceItemResult(
-                    filename=frame_metadata[0],
-                    timestamp_delta=frame_metadata[2],
+                    filename=self.annoy_db.filenames[frame_metadata["filename_id"]],
+                    timestamp_delta=float(frame_metadata["timecode"]),
                     distance=result[1],
                 )
             )
@@ -58,38 +61,117 @@ class ShazamSearch:
         ```
         """
 
-        frames_result = [self.search_frame(frame, k=10) for frame in frames]
-
-        filename4hst = defaultdict(list)
-
-        for frame, frame_result in zip(frames, frames_result):
-            for item in frame_result:
-                if item.timestamp_delta - frame["timecode"] >= -1.5:  # skip frames which can't be found in the video
-                    rev_dist = 1 if item.distance == 0 else 1 / item.distance
-
-                    filename4hst[item.filename].append([item.timestamp_delta - frame["timecode"], rev_dist])
-
-        for k, v in filename4hst.items():
-            filename4hst[k] = list(zip(*v))
+        if not frames:
+            return []
+
+        vecs = np.array([frame["vec"] for frame in frames], dtype=np.uint8)
+        ids, distances = self.annoy_db.frame_index.search_batch(vecs, k=self.k)
+
+        # flat arrays of all found neighbours, ordered by query frame and then by distance
+        found = ids >= 0
+        found_metadata = self.annoy_db.db_index[ids[found]]
+
+        return self.rank(
+            frames=frames,
+            found=found,
+            file_ids=found_metadata["filename_id"],
+            timecodes=found_metadata["timecode"],
+            distances=distances[found],
+            filenames=self.annoy_db.filenames,
+            topk=topk,
+        )
+
+    @staticmethod
+    def rank(
+        frames: List[Dict[str, Any]],
+        found: np.ndarray,
+        file_ids: np.ndarray,
+        timecodes: np.ndarray,
+        distances: np.ndarray,
+        filenames: List[str],
+        topk: int,
+    ) -> List[SearchItemResult]:
+        """
+        Vote for files by found neighbours: found is (frames, k) mask of found neighbours,
+        file_ids, timecodes and distances are flat arrays of found neighbours ordered by query frame and then by distance
+        """
+        query_timecodes = np.repeat([frame["timecode"] for frame in frames], found.sum(axis=1))
 
-        results = []
+        deltas = timecodes - query_timecodes
+        keep = deltas >= -1.5  # skip frames which can't be found in the video
+        deltas = deltas[keep]
+        file_ids = file_ids[keep]
+        distances = distances[keep]
+        rev_dists = np.divide(1, distances, out=np.ones_like(distances), where=distances != 0)
 
-        for k, v in filename4hst.items():
-            bin_min = np.floor(min(v[0]))
-            bin_max = np.ceil(max(v[0]))
-            bins = np.arange(bin_min, bin_max + 1, 1)
+        top_ids, top_deltas, top_weights = ShazamSearch.vote(file_ids, deltas, rev_dists, topk)
 
-            hst, hst_delta = np.histogram(v[0], bins=bins, weights=v[1])
+        return [
+            SearchItemResult(filename=filenames[file_id], timestamp_delta=float(delta), weight=float(weight))
+            for file_id, delta, weight in zip(top_ids, top_deltas, top_weights)
+        ]
 
-            if len(hst) == 0:
-                item = SearchItemResult(filename=k, timestamp_delta=float(v[0][0]), weight=float(v[1][0]))
-            else:
-                top_idx = np.argmax(hst)
-                top_coef = hst[top_idx]
-                item = SearchItemResult(filename=k, timestamp_delta=float(hst_delta[top_idx]), weight=float(top_coef))
+    @staticmethod
+    def vote(file_ids: np.ndarray, deltas: np.ndarray, weights: np.ndarray, topk: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Histogram voting of all found files at once. Every file has 1 second bins from floor(min delta) to ceil(max delta),
+        the last bin includes its right edge (as np.histogram). Weights of all (file, bin) pairs are summed by one bincount
+        and rounded to WEIGHT_DECIMALS, so equal sums tie exactly whatever order they are summed in.
+        If all deltas of a file are the same integer, the file has no bins and gets its first delta and weight.
 
-            results.append(item)
+        Returns file ids, best deltas and weights of topk files sorted by weight, equal weights keep order of appearance
+        """
+        if len(file_ids) == 0 or topk <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+
+        # number files in order of appearance
+        unique_ids, first_index, inverse = np.unique(file_ids, return_index=True, return_inverse=True)
+        appearance = np.argsort(first_index)
+        file_number = np.empty_like(appearance)
+        file_number[appearance] = np.arange(len(appearance))
+        file_number = file_number[inverse.ravel()]
+        first_index = first_index[appearance]
+
+        bin_min = np.full(len(unique_ids), np.inf)
+        np.minimum.at(bin_min, file_number, deltas)
+        bin_min = np.floor(bin_min)
+        bin_max = np.full(len(unique_ids), -np.inf)
+        np.maximum.at(bin_max, file_number, deltas)
+        bins_count = (np.ceil(bin_max) - bin_min).astype(np.int64)
+        bins_offset = np.cumsum(bins_count) - bins_count
+
+        with_bins = bins_count[file_number] > 0
+        bin_index = np.minimum(np.floor(deltas) - bin_min[file_number], bins_count[file_number] - 1).astype(np.int64)
+        hst = np.bincount((bins_offset[file_number] + bin_index)[with_bins], weights=weights[with_bins], minlength=bins_count.sum())
+        hst = np.round(hst, WEIGHT_DECIMALS)
+
+        best_deltas = deltas[first_index]
+        best_weights = np.round(weights[first_index], WEIGHT_DECIMALS)
+        has_bins = bins_count > 0
+        if has_bins.any():
+            top_bin = ShazamSearch.argmax_segments(hst, bins_count[has_bins])  # files without bins have no space in hst
+            best_deltas[has_bins] = bin_min[has_bins] + top_bin
+            best_weights[has_bins] = hst[bins_offset[has_bins] + top_bin]
+
+        candidates = np.arange(len(best_weights))
+        if len(best_weights) > topk:
+            kth_weight = best_weights[np.argpartition(-best_weights, topk - 1)[topk - 1]]
+            candidates = np.flatnonzero(best_weights >= kth_weight)
+
+        top = candidates[np.argsort(-best_weights[candidates], kind="stable")][:topk]
+
+        return unique_ids[appearance][top], best_deltas[top], best_weights[top]
+
+    @staticmethod
+    def argmax_segments(values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """
+        np.argmax of every segment, values are split to consecutive non-empty segments of lengths counts
+        """
+        starts = np.cumsum(counts) - counts
+        segment = np.repeat(np.arange(len(counts)), counts)
+        segment_max = np.maximum.reduceat(values, starts)
 
-        results = sorted(results, key=lambda x: x.weight, reverse=True)
+        is_max = np.flatnonzero(values == segment_max[segment])
+        _, first_max = np.unique(segment[is_max], return_index=True)
 
-        return results[: min(topk, len(results))]
+        return is_max[first_max] - starts
@@ -0,0 +1,83 @@
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import numpy as np
+from data_structures.annoy_db import AnnoyDB
+from data_structures.match_event import MatchEvent
+from data_structures.search_item_result import SearchItemResult
+from search_algorithms.shazam_search import ShazamSearch
+
+
+class StreamShazamSearch(ShazamSearch):
+    """
+    ShazamSearch over a sliding window of the last window seconds of an unbounded stream.
+    Offsets are timecodes of found frames - stream timecodes, so timecode of the matched video is stream time + offset.
+    Every pushed frame is searched at once, neighbours of frames older than the window are dropped, so memory is bounded.
+    A match event is made when the best file of the window has at least min_weight and
+    confidence = 1 - weight of the second file / weight of the best file reaches threshold.
+    The same file and offset are not reported again until another match is made
+    """
+
+    def __init__(
+        self,
+        annoy_db: AnnoyDB,
+        logger: logging.Logger,
+        bucket: int,
+        threads: int,
+        k: int = 10,
+        window: float = 10.0,
+        threshold: float = 0.5,
+        min_weight: float = 3.0,
+    ) -> None:
+        super().__init__(annoy_db=annoy_db, logger=logger, bucket=bucket, threads=threads, k=k)
+        self.window = window
+        self.threshold = threshold
+        self.min_weight = min_weight
+        # (stream timecode, file ids, timecodes, distances) of found neighbours of frames in the window
+        self.history: Deque[Tuple[float, np.ndarray, np.ndarray, np.ndarray]] = deque()
+        self.last_match: Optional[Tuple[str, float]] = None
+
+    def push(self, frame: Dict[str, Any], arrived: float) -> Optional[MatchEvent]:
+        """
+        Search a stream frame ({"vec", "timecode"}), arrived is time.perf_counter() when the frame was read
+        """
+        ids, distances = self.annoy_db.frame_index.search_batch(np.asarray(frame["vec"], dtype=np.uint8)[np.newaxis], k=self.k)
+        found = ids[0] >= 0
+        found_metadata = self.annoy_db.db_index[ids[0][found]]
+        self.history.append((frame["timecode"], found_metadata["filename_id"], found_metadata["timecode"], distances[0][found]))
+
+        while self.history[0][0] < frame["timecode"] - self.window:
+            self.history.popleft()
+
+        # offsets are not filtered as in ShazamSearch.rank: the stream may show a video from any position
+        stream_timecodes, file_ids, timecodes, window_distances = zip(*self.history)
+        deltas = np.concatenate(timecodes) - np.repeat(stream_timecodes, [len(frame_ids) for frame_ids in file_ids])
+        distances = np.concatenate(window_distances)
+        rev_dists = np.divide(1, distances, out=np.ones_like(distances), where=distances != 0)
+
+        top_ids, top_deltas, top_weights = self.vote(np.concatenate(file_ids), deltas, rev_dists, topk=2)
+        results = [
+            SearchItemResult(filename=self.annoy_db.filenames[file_id], timestamp_delta=float(delta), weight=float(weight))
+            for file_id, delta, weight in zip(top_ids, top_deltas, top_weights)
+        ]
+
+        if not results or results[0].weight < self.min_weight:
+            return None
+
+        confidence = 1 - (results[1].weight / results[0].weight if len(results) > 1 else 0.0)
+        match = (results[0].filename, results[0].timestamp_delta)
+        if confidence < self.threshold or match == self.last_match:
+            return None
+
+        self.last_match = match
+        return MatchEvent(
+            stream_time=frame["timecode"],
+            filename=results[0].filename,
+            timestamp_delta=results[0].timestamp_delta,
+            weight=results[0].weight,
+            confidence=confidence,
+            window_frames=len(self.history),
+            latency=time.perf_counter() - arrived,
+        )